@@ -1,37 +1,159 @@
-from flask import Flask, redirect, render_template, request
-from flask_sqlalchemy import SQLAlchemy
+import json
+import os
+import threading
+import time
+from itertools import groupby
 
-from directions_between_places_handler import create_map_with_directions
-from distance_calculator import find_nearest_neighbors
-from get_data import get_data
-from map_handler import create_map_with_stations
+from flask import (Flask, Response, g, jsonify, make_response, redirect, render_template, request,
+                   stream_with_context, url_for)
+
+from directions_between_places_handler import create_map_with_directions, create_map_with_directions_async
+from directions_to_stations_handler import (find_nearest_stations_by_walking_time,
+                                            get_route_coordinates_to_nearest_stations_async,
+                                            get_routes_to_nearest_stations_async)
+from distance_calculator import find_nearest_neighbors, find_nearest_stations_batch
+from get_data import get_snapshot_sample, station_snapshot_cache
+from history_store import HistoryStore
+from map_handler import create_map_with_stations, create_stations_overlay, create_stations_status, get_base_map
+from map_store import directions_map_store, stations_map_store, stations_overlay_store
+from metrics import (finish_request_spans, get_server_timing, render_metrics, request_durations, span,
+                     start_request_spans)
+from openrouteservice_client import route_cache
+from station_database import db, init_station_database, load_snapshot, save_snapshot  # db is used by reset_db_python_command.txt
+from system_registry import system_registry
 
 app = Flask(__name__)  # reference to this file
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///database.db'  # Use a local SQLite database file
-db = SQLAlchemy(app)
-
-
-class Station(db.Model):
-    id_db = db.Column(db.Integer, primary_key=True)
-    station_id = db.Column(db.Integer)
-    latitude = db.Column(db.Float)
-    longitude = db.Column(db.Float)
-    address = db.Column(db.String(100))
-    capacity = db.Column(db.Integer)
-    is_charging_station_x = db.Column(db.Boolean)
-    nearby_distance = db.Column(db.Integer)
-    num_bikes_available = db.Column(db.Integer)
-    num_bikes_disabled = db.Column(db.Integer)
-    num_docks_available = db.Column(db.Integer)
-    num_docks_disabled = db.Column(db.Integer)
-    is_charging_station_y = db.Column(db.Boolean)
-    is_renting = db.Column(db.Boolean)
-    is_returning = db.Column(db.Boolean)
-    num_bikes_available_types_mechanical = db.Column(db.Integer)
-    num_bikes_available_types_ebike = db.Column(db.Integer)
-
-    def __repr__(self):
-        return '<Station >'.format(self.station_id)
+app.config['FEED_REFRESH_INTERVAL'] = 10  # seconds between downloads of the station status
+app.config['FEED_REFRESH_MAX_BACKOFF'] = 300  # maximum delay between downloads after failures
+app.config['BATCH_MAX_ORIGINS'] = 10000  # maximum number of origins in one request to /api/nearest_stations
+app.config['BATCH_MAX_K'] = 50  # maximum number of nearest stations per origin in /api/nearest_stations
+# 'full' - the whole map with all stations is rendered for each search
+# 'overlay' - a cached base map with all stations, only the search results are sent for each search
+app.config['STATIONS_MAP_MODE'] = 'full'
+# way of adding the stations to the map in the 'full' mode - 'markers', 'cluster' or 'fast_cluster'
+app.config['STATIONS_MAP_MARKERS'] = 'markers'
+# only the stations within this radius (in kilometers) from the source location are shown, None shows all stations
+app.config['STATIONS_MAP_RADIUS'] = None
+# number of stations with bikes and stations with docks combined by the trip planner in /search_directions
+app.config['TRIP_CANDIDATES'] = 10
+# compare the trips using travel times from openrouteservice instead of the estimates from distances
+app.config['TRIP_USE_DURATIONS'] = False
+# the search views await the routes from openrouteservice at the same time, in the threads of the request's event loop,
+# False requests them with call_concurrently
+app.config['ASYNC_ROUTES'] = True
+# bike-share systems served by the application - identifier of the system and url of its gbfs.json auto-discovery file
+app.config['GBFS_SYSTEMS'] = {'toronto': 'https://tor.publicbikesystem.net/ube/gbfs/v1/'}
+# system serving the locations outside of all systems, its snapshot is saved in the database and the history
+app.config['DEFAULT_SYSTEM'] = 'toronto'
+app.config['HISTORY_PATH'] = 'history'  # directory with the history of the station status
+# add the Server-Timing header with the duration of each stage of the request, e.g. knn or map_render
+app.config['SERVER_TIMING'] = True
+# debugging endpoints, e.g. /api/diagnostics/snapshot_sample, are enabled with BIKES_DIAGNOSTICS=1
+app.config['DIAGNOSTICS'] = os.environ.get('BIKES_DIAGNOSTICS') == '1'
+init_station_database(app)
+history_store = HistoryStore(app.config['HISTORY_PATH'])
+
+
+def save_snapshot_in_database(snapshot, status):
+    """
+    Save each new snapshot, so the application can start with the last known stations when the feeds are not available.
+    """
+    with app.app_context():
+        save_snapshot(snapshot)
+
+
+def save_status_in_history(snapshot, status):
+    """
+    Add the new reports of the stations to the history of the station status.
+    """
+    history_store.append(status.stations)
+
+
+# serve the last saved snapshot until the feeds are downloaded
+with app.app_context():
+    saved_snapshot = load_snapshot()
+if saved_snapshot is not None:
+    station_snapshot_cache.set_snapshot(saved_snapshot)
+station_snapshot_cache.add_listener(save_snapshot_in_database)
+station_snapshot_cache.add_listener(save_status_in_history)
+
+# each system has its own snapshot - the default one starts with the feeds of Toronto until its feeds are discovered
+for system_id, discovery_url in app.config['GBFS_SYSTEMS'].items():
+    is_default = system_id == app.config['DEFAULT_SYSTEM']
+    system_registry.add_system(system_id, discovery_url, station_snapshot_cache if is_default else None,
+                               default=is_default)
+
+
+# the background work is started once, by the first request or by python app.py
+_background_work_lock = threading.Lock()
+_background_work_started = False
+
+
+def start_background_work():
+    """
+    Keep the stations' snapshots up to date in the background, so the requests never wait for the feeds.
+    Started by the process serving the requests - importing the application does not start any threads,
+    e.g. in reset_db_python_command.txt. Calling it again does nothing.
+    """
+    global _background_work_started
+    with _background_work_lock:
+        if not _background_work_started:
+            system_registry.start(interval=app.config['FEED_REFRESH_INTERVAL'],
+                                  max_backoff=app.config['FEED_REFRESH_MAX_BACKOFF'])
+            _background_work_started = True
+
+
+@app.before_request
+def start_background_work_on_first_request():
+    # under flask run, gunicorn or any other WSGI server, only the processes serving the requests start the work -
+    # with the reloader, the watching process never handles a request
+    if not _background_work_started:
+        start_background_work()
+
+
+# response of the endpoints when the stations of the system are not known yet, e.g. before its feeds are discovered
+STATIONS_UNAVAILABLE = 'the stations of the bike-share system are not available yet, try again later'
+
+
+def get_requested_system():
+    """
+    Get the system chosen with the "system" query parameter, the default system if the parameter is missing.
+
+    Returns:
+        system: the BikeShareSystem, None if there is no such system
+    """
+    return system_registry.systems.get(request.args.get('system', system_registry.default_system_id))
+
+
+@app.context_processor
+def add_service_areas():
+    # the search form accepts the locations within the areas of all systems
+    return {'service_areas': system_registry.get_service_areas()}
+
+
+@app.before_request
+def start_request_timing():
+    """
+    Start measuring the request and collecting the durations of its stages.
+    """
+    g.request_start = time.perf_counter()
+    start_request_spans()
+
+
+@app.after_request
+def finish_request_timing(response):
+    """
+    Record the duration of the request in the metrics and add the durations of its stages to the response.
+    """
+    spans = finish_request_spans()
+    request_start = g.pop('request_start', None)
+    if request_start is not None:
+        duration = time.perf_counter() - request_start
+        request_durations.observe(request.endpoint or 'not_found', duration)
+        if app.config['SERVER_TIMING']:
+            response.headers['Server-Timing'] = get_server_timing(spans, duration)
+    return response
 
 
 @app.errorhandler(404)
@@ -41,19 +163,6 @@ def invalid_route(e):
 
 @app.route('/')
 def index():
-    model_object = Station(station_id=1,
-                           latitude=123.123,
-                           longitude=123.123,
-                           address="address",
-                           capacity=1
-                           )
-
-    # Add the object to the session
-    db.session.add(model_object)
-
-    # Commit the session to the database
-    db.session.commit()
-
     return redirect('/search_available')
 
 
@@ -68,7 +177,7 @@ def about_project():
 
 
 @app.route('/search_available', methods=['POST', 'GET'])
-def search_available():
+async def search_available():
     """
     Load page responsible for handling search for available bikes and docks.
     """
@@ -80,23 +189,111 @@ def search_available():
         k_value = int(request.form['k_value'])  # Number of nearest neighbors to find
         search_for_type = request.form['search_for']
 
-        # get the data from JSON
-        df_stations = get_data()
+        # get the data from JSON - the stations and their index come from the same snapshot
+        # of the system serving the source location
+        system = system_registry.find_system(source_latitude, source_longitude)
+        snapshot = system.get_snapshot()
+        if snapshot is None:
+            return jsonify(error=STATIONS_UNAVAILABLE), 503
+        df_stations = snapshot.stations
 
         # get the K nearest neighbours from the source location
-        nearest_neighbors = find_nearest_neighbors(source_latitude, source_longitude, df_stations, k_value, search_for_type)
+        if request.form.get('rank_by_walking_time'):
+            nearest_neighbors = find_nearest_stations_by_walking_time(source_latitude, source_longitude, df_stations,
+                                                                      k_value, search_for_type,
+                                                                      snapshot.spatial_index, snapshot.availability)
+        else:
+            nearest_neighbors = find_nearest_neighbors(source_latitude, source_longitude, df_stations, k_value,
+                                                       search_for_type, snapshot.spatial_index, snapshot.availability)
+
+        if app.config['STATIONS_MAP_MODE'] == 'overlay':
+            # keep only the search results, the base map is loaded by the page separately
+            routes = None
+            if app.config['ASYNC_ROUTES']:
+                with span('routes'):
+                    routes = await get_route_coordinates_to_nearest_stations_async(source_latitude, source_longitude,
+                                                                                   nearest_neighbors)
+            overlay = create_stations_overlay(nearest_neighbors, source_latitude, source_longitude, routes)
+            with span('map_store'):
+                token = stations_overlay_store.put(overlay)
+            return redirect(url_for('search_available', overlay=token, system=system.system_id))
+
+        routes = None
+        if app.config['ASYNC_ROUTES']:
+            with span('routes'):
+                routes = await get_routes_to_nearest_stations_async(source_latitude, source_longitude,
+                                                                    nearest_neighbors)
 
-        # create and save the map
-        create_map_with_stations(df_stations, nearest_neighbors, source_latitude, source_longitude)
+        # create the map and keep it in memory until the page displays it
+        map_as_html = create_map_with_stations(df_stations, nearest_neighbors, source_latitude, source_longitude,
+                                               app.config['STATIONS_MAP_MARKERS'], app.config['STATIONS_MAP_RADIUS'],
+                                               snapshot.spatial_index, routes)
+        with span('map_store'):
+            token = stations_map_store.put(map_as_html)
 
-        return redirect('/search_available')
-    # use the already generated map
+        return redirect(url_for('search_available', map=token))
+    # use the already generated map, or the default one if there is no map for the token
     else:
-        return render_template('stations_view.html')
+        if app.config['STATIONS_MAP_MODE'] == 'overlay':
+            return render_template('stations_view.html', overlay_mode=True,
+                                   overlay_token=request.args.get('overlay', ''),
+                                   overlay_system=request.args.get('system'))
+        map_as_html = stations_map_store.get(request.args.get('map'))
+        return render_template('stations_view.html', map_html=map_as_html)
+
+
+@app.route('/stations_base_map')
+def stations_base_map():
+    """
+    Load the map with all stations used in the 'overlay' mode of the search for available bikes and docks.
+    The stations of the system from the "system" query parameter are shown, by default of the default system.
+    """
+    system = get_requested_system()
+    if system is None:
+        return jsonify(error='unknown bike-share system'), 404
+    snapshot = system.get_snapshot()
+    if snapshot is None:
+        return jsonify(error=STATIONS_UNAVAILABLE), 503
+    # the page appends the token of the search to the url of the overlay
+    map_as_html = get_base_map(snapshot.stations, snapshot.spatial_index,
+                               url_for('static', filename='js/stations_map_functions.js'),
+                               url_for('stations_status', system=system.system_id),
+                               url_for('stations_overlay', token=''))
+
+    # the browser downloads the map again only if it has changed
+    response = make_response(map_as_html)
+    response.add_etag()
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
+@app.route('/api/stations_status')
+def stations_status():
+    """
+    Get the current status of all stations of one system, shown in the popups of the base map.
+    """
+    system = get_requested_system()
+    if system is None:
+        return jsonify(error='unknown bike-share system'), 404
+    snapshot = system.get_snapshot()
+    if snapshot is None:
+        return jsonify(error=STATIONS_UNAVAILABLE), 503
+    return jsonify(create_stations_status(snapshot.stations))
+
+
+@app.route('/api/stations_overlay/<token>')
+def stations_overlay(token):
+    """
+    Get the GeoJSON with the results of one search for available bikes and docks.
+    """
+    overlay = stations_overlay_store.get(token)
+    if overlay is None:
+        return jsonify(error='no search results for this token'), 404
+    return jsonify(overlay)
 
 
 @app.route('/search_directions', methods=['POST', 'GET'])
-def search_directions():
+async def search_directions():
     """
     Load page responsible for handling search for directions
     """
@@ -108,17 +305,186 @@ def search_directions():
         destination_latitude = float(request.form['dest_lat'])
         destination_longitude = float(request.form['dest_lon'])
 
-        # get the data from JSON
-        df_stations = get_data()
+        # get the data from JSON - the stations and their index come from the same snapshot
+        # of the system serving the source location
+        snapshot = system_registry.get_snapshot(source_latitude, source_longitude)
+        if snapshot is None:
+            return jsonify(error=STATIONS_UNAVAILABLE), 503
 
-        # create and save the map
-        create_map_with_directions(source_latitude, source_longitude, destination_latitude, destination_longitude, df_stations)
+        # create the map and keep it in memory until the page displays it
+        if app.config['ASYNC_ROUTES']:
+            map_as_html = await create_map_with_directions_async(source_latitude, source_longitude,
+                                                                 destination_latitude, destination_longitude,
+                                                                 snapshot.stations, snapshot.spatial_index,
+                                                                 snapshot.availability, app.config['TRIP_CANDIDATES'],
+                                                                 app.config['TRIP_USE_DURATIONS'])
+        else:
+            map_as_html = create_map_with_directions(source_latitude, source_longitude,
+                                                     destination_latitude, destination_longitude,
+                                                     snapshot.stations, snapshot.spatial_index, snapshot.availability,
+                                                     app.config['TRIP_CANDIDATES'], app.config['TRIP_USE_DURATIONS'])
+        with span('map_store'):
+            token = directions_map_store.put(map_as_html)
 
-        return redirect('/search_directions')
-    # use the already generated map
+        return redirect(url_for('search_directions', map=token))
+    # use the already generated map, or the default one if there is no map for the token
     else:
-        return render_template('directions_view.html')
+        map_as_html = directions_map_store.get(request.args.get('map'))
+        return render_template('directions_view.html', map_html=map_as_html)
+
+
+@app.route('/metrics')
+def metrics():
+    """
+    Show the latency histograms of the requests and their stages in the Prometheus text format.
+    """
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/systems')
+def bike_share_systems():
+    """
+    List the bike-share systems with the number of their stations and the bounding box used to route the queries.
+    """
+    systems = []
+    for system in system_registry.systems.values():
+        snapshot = system.snapshot_cache.get_last_snapshot()
+        systems.append({'system_id': system.system_id,
+                        'default': system.system_id == system_registry.default_system_id,
+                        'feeds_discovered': system.feeds_discovered,
+                        'stations': 0 if snapshot is None else len(snapshot.stations),
+                        'bounds': system.get_bounds()})
+    return jsonify(systems)
+
+
+@app.route('/api/route_cache_statistics')
+def route_cache_statistics():
+    """
+    Show the hit and miss counters of the route cache.
+    """
+    return jsonify(route_cache.get_statistics())
+
+
+@app.route('/api/diagnostics/snapshot_sample')
+def snapshot_sample():
+    """
+    Show the columns and the first rows of the current snapshot, only in the diagnostics mode.
+    The number of rows is set with the "rows" query parameter, the system with the "system" query parameter.
+    """
+    if not app.config['DIAGNOSTICS']:
+        return jsonify(error='diagnostics are disabled, set BIKES_DIAGNOSTICS=1 to enable them'), 404
+    system = get_requested_system()
+    if system is None:
+        return jsonify(error='unknown bike-share system'), 404
+    number_of_rows = min(max(request.args.get('rows', 3, type=int), 0), 100)
+    snapshot = system.get_snapshot()
+    if snapshot is None:
+        return jsonify(error=STATIONS_UNAVAILABLE), 503
+    return jsonify(get_snapshot_sample(snapshot, number_of_rows))
+
+
+@app.route('/api/stations/<station_id>/history')
+def station_history(station_id):
+    """
+    Get the history of the status of one station.
+
+    The query parameters "start" and "end" are POSIX timestamps, by default the last 24 hours are returned.
+    The response has one list of values for each column, ordered by the time of the report (last_reported).
+    """
+    end = request.args.get('end', time.time(), type=float)
+    start = request.args.get('start', end - 24 * 3600, type=float)
+    df_history = history_store.get_station_history(station_id, start, end)
+    return jsonify(station_id=station_id, **{column: df_history[column].tolist() for column in df_history.columns})
+
+
+# columns of the station returned by /api/nearest_stations
+BATCH_STATION_COLUMNS = ['station_id', 'lat', 'lon', 'address', 'num_bikes_available',
+                         'num_bikes_available_types_ebike', 'num_docks_available']
+
+
+def parse_origins(origins):
+    """
+    Read the origins sent to /api/nearest_stations.
+
+    Args:
+        origins: list of [latitude, longitude] pairs or of objects with "lat" and "lon" keys
+
+    Returns:
+        latitudes: list with latitudes of the origins
+        longitudes: list with longitudes of the origins
+    """
+    latitudes, longitudes = [], []
+    for origin in origins:
+        if isinstance(origin, dict):
+            latitude, longitude = origin['lat'], origin['lon']
+        else:
+            latitude, longitude = origin
+        latitudes.append(float(latitude))
+        longitudes.append(float(longitude))
+    return latitudes, longitudes
+
+
+@app.route('/api/nearest_stations', methods=['POST'])
+def nearest_stations_batch():
+    """
+    Find the K nearest stations with bikes or docks for many origins at once.
+
+    The request body is JSON: {"origins": [[lat, lon], ...], "k": 3, "search_for": "Bikes"}.
+    The response is streamed as NDJSON - one line with the origin, its system and its nearest stations per origin.
+    """
+    body = request.get_json(silent=True) or {}
+    try:
+        latitudes, longitudes = parse_origins(body.get('origins', []))
+        k_value = int(body.get('k', 3))
+    except (KeyError, TypeError, ValueError):
+        return jsonify(error='origins must be a list of [lat, lon] pairs and k must be an integer'), 400
+    search_for_type = str(body.get('search_for', 'Bikes'))
+    if search_for_type.lower() not in ('bikes', 'docks'):
+        return jsonify(error='search_for must be "Bikes" or "Docks"'), 400
+    # NaN is rejected by the comparisons as well
+    if not (all(-90 <= latitude <= 90 for latitude in latitudes)
+            and all(-180 <= longitude <= 180 for longitude in longitudes)):
+        return jsonify(error='latitudes must be between -90 and 90 and longitudes between -180 and 180'), 400
+
+    if not 0 < len(latitudes) <= app.config['BATCH_MAX_ORIGINS']:
+        return jsonify(error='number of origins must be between 1 and {}'.format(app.config['BATCH_MAX_ORIGINS'])), 400
+    if not 0 < k_value <= app.config['BATCH_MAX_K']:
+        return jsonify(error='k must be between 1 and {}'.format(app.config['BATCH_MAX_K'])), 400
+
+    # the origins are routed to the systems by location, all origins of one system are answered from the same snapshot
+    systems, system_positions = system_registry.find_systems(latitudes, longitudes)
+    system_positions = system_positions.tolist()
+    snapshots = {position: systems[position].get_snapshot() for position in set(system_positions)}
+    if any(snapshot is None for snapshot in snapshots.values()):
+        return jsonify(error=STATIONS_UNAVAILABLE), 503
+
+    def generate_lines():
+        origin_number = 0
+        # consecutive origins of the same system are searched together, so the lines keep the order of the origins
+        for position, origins in groupby(system_positions):
+            end = origin_number + len(list(origins))
+            snapshot = snapshots[position]
+            df_stations = snapshot.stations
+            columns = {column: df_stations[column].to_numpy() for column in BATCH_STATION_COLUMNS}
+            for positions, distances in find_nearest_stations_batch(latitudes[origin_number:end],
+                                                                    longitudes[origin_number:end], df_stations,
+                                                                    k_value, search_for_type, snapshot.availability):
+                for origin_positions, origin_distances in zip(positions, distances):
+                    stations = {column: values[origin_positions].tolist() for column, values in columns.items()}
+                    stations['distance'] = origin_distances.tolist()
+                    line = {'origin': [latitudes[origin_number], longitudes[origin_number]],
+                            'system': systems[position].system_id,
+                            'stations': [dict(zip(stations, values)) for values in zip(*stations.values())]}
+                    origin_number += 1
+                    yield json.dumps(line) + '\n'
+
+    return Response(stream_with_context(generate_lines()), mimetype='application/x-ndjson')
 
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    app.debug = True
+    # with the reloader, this module is run by the watching process and again by the serving process -
+    # only the serving process refreshes the feeds and writes the database and the history, before the first request
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_work()
+    app.run()
@@ -0,0 +1,2 @@
+# Benchmarks of the hot paths of the application.
+# Run a benchmark from the flask_app/ directory, for example: python -m benchmarks.bench_nearest_neighbors
@@ -0,0 +1,148 @@
+import asyncio
+import json
+import platform
+import sys
+import time
+
+import folium
+import numpy as np
+import pandas as pd
+
+import get_data
+import openrouteservice_client
+from directions_between_places_handler import create_map_with_directions, create_map_with_directions_async
+from distance_calculator import find_nearest_neighbors
+from get_data import StationSnapshotCache
+from map_handler import create_map_with_stations
+from route_cache import RouteCache
+from benchmarks.fixtures import DATASETS, load_feeds
+from benchmarks.stub_servers import get_url, start_feed_server, start_openrouteservice_server
+from benchmarks.synthetic_stations import create_random_locations
+from benchmarks.timing import measure
+
+# delay of each response of the stub of openrouteservice (in seconds)
+ORS_LATENCY = 0.05
+NUMBER_OF_SEARCHES = 50
+K = 5
+# the maps with one marker for each station are built only for the datasets up to this number of stations
+MARKERS_MAX_STATIONS = 1_000
+# file with the results, can be changed with the first argument
+RESULTS_PATH = 'benchmark_results.json'
+
+
+def get_repeat(number_of_stations, small, large):
+    """
+    Get the number of repetitions, smaller for the large datasets.
+    """
+    return large if number_of_stations >= 100_000 else small
+
+
+def create_result(benchmark, dataset, number_of_stations, timing, **parameters):
+    """
+    Create one record of the results. The records are compared by (benchmark, dataset, parameters).
+    """
+    return {'benchmark': benchmark, 'dataset': str(dataset), 'stations': number_of_stations, **parameters,
+            'mean_ms': round(timing['mean_ms'], 3), 'min_ms': round(timing['min_ms'], 3)}
+
+
+def benchmark_dataset(dataset):
+    """
+    Run all benchmarks on one dataset, with the feeds served by a local feed server.
+
+    Args:
+        dataset: 'recorded' or the number of stations of the synthetic feeds, see fixtures.load_feeds
+
+    Returns:
+        results: list of records, see create_result
+    """
+    feed_server = start_feed_server(load_feeds(dataset))
+    url = get_url(feed_server)
+
+    # get_data with empty caches - download, parsing and building of the snapshot
+    def get_data_from_feeds():
+        get_data.station_snapshot_cache = StationSnapshotCache(url + '/station_information', url + '/station_status')
+        return get_data.get_data()
+
+    number_of_stations = len(get_data_from_feeds())
+    results = [create_result('get_data', dataset, number_of_stations,
+                             measure(get_data_from_feeds, get_repeat(number_of_stations, 10, 3)), cache='cold'),
+               create_result('get_data', dataset, number_of_stations, measure(get_data.get_data, 100), cache='warm')]
+    feed_server.shutdown()
+    feed_server.server_close()
+
+    snapshot = get_data.get_snapshot()
+    df_stations = snapshot.stations
+    sources = create_random_locations(NUMBER_OF_SEARCHES, seed=1)
+    destinations = create_random_locations(NUMBER_OF_SEARCHES, seed=2)
+
+    def find_all_nearest_neighbors():
+        for latitude, longitude in sources:
+            find_nearest_neighbors(latitude, longitude, df_stations, K, 'Bikes', snapshot.spatial_index,
+                                   snapshot.availability)
+
+    timing = measure(find_all_nearest_neighbors, 5)
+    results.append(create_result('find_nearest_neighbors', dataset, number_of_stations,
+                                 {name: value / NUMBER_OF_SEARCHES for name, value in timing.items()}, k=K))
+
+    # each map is built with an empty route cache, so the routes are requested from the stub of openrouteservice
+    source_latitude, source_longitude = sources[0]
+    destination_latitude, destination_longitude = destinations[0]
+    nearest_neighbors = find_nearest_neighbors(source_latitude, source_longitude, df_stations, K, 'Bikes',
+                                               snapshot.spatial_index, snapshot.availability)
+    marker_modes = ['markers', 'fast_cluster'] if number_of_stations <= MARKERS_MAX_STATIONS else ['fast_cluster']
+    for marker_mode in marker_modes:
+        def build_map_with_stations():
+            openrouteservice_client.route_cache = RouteCache(None)
+            return create_map_with_stations(df_stations, nearest_neighbors, source_latitude, source_longitude,
+                                            marker_mode, None, snapshot.spatial_index)
+
+        timing = measure(build_map_with_stations, get_repeat(number_of_stations, 3, 1))
+        results.append(create_result('create_map_with_stations', dataset, number_of_stations, timing,
+                                     marker_mode=marker_mode, k=K))
+
+    def build_map_with_directions():
+        openrouteservice_client.route_cache = RouteCache(None)
+        return create_map_with_directions(source_latitude, source_longitude,
+                                          destination_latitude, destination_longitude, df_stations,
+                                          snapshot.spatial_index, snapshot.availability)
+
+    def build_map_with_directions_async():
+        openrouteservice_client.route_cache = RouteCache(None)
+        return asyncio.run(create_map_with_directions_async(source_latitude, source_longitude,
+                                                            destination_latitude, destination_longitude, df_stations,
+                                                            snapshot.spatial_index, snapshot.availability))
+
+    results.append(create_result('create_map_with_directions', dataset, number_of_stations,
+                                 measure(build_map_with_directions, 10), routes='threads'))
+    results.append(create_result('create_map_with_directions', dataset, number_of_stations,
+                                 measure(build_map_with_directions_async, 10), routes='async'))
+    return results
+
+
+def get_metadata():
+    """
+    Describe the environment of the run, so only comparable results are compared.
+    """
+    return {'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'python': platform.python_version(),
+            'platform': platform.platform(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'folium': folium.__version__, 'ors_latency_s': ORS_LATENCY}
+
+
+def run():
+    openrouteservice_server = start_openrouteservice_server(ORS_LATENCY)
+    openrouteservice_client.ORS_BASE_URL = get_url(openrouteservice_server)
+
+    results = []
+    for dataset in DATASETS:
+        results.extend(benchmark_dataset(dataset))
+    return {'metadata': get_metadata(), 'results': results}
+
+
+if __name__ == "__main__":
+    report = run()
+    for result in report['results']:
+        print(result)
+    path = sys.argv[1] if len(sys.argv) > 1 else RESULTS_PATH
+    with open(path, 'w') as file:
+        json.dump(report, file, indent=2)
+    print('The results were saved in', path)
@@ -0,0 +1,66 @@
+import json
+import tracemalloc
+
+import pandas as pd
+
+import feed_parser
+from feed_parser import STATION_INFORMATION_FIELDS, STATION_STATUS_FIELDS, parse_feed
+from benchmarks.synthetic_feeds import create_station_information_feed, create_station_status_feed, to_bytes
+from benchmarks.timing import measure
+
+DATASET_SIZES = [1_000, 10_000, 100_000]
+
+
+def parse_feed_baseline(content):
+    """
+    Previous parsing of the feeds - the body decoded to text, then to a dictionary, and flattened with json_normalize.
+    """
+    json_data = json.loads(content.decode('utf-8'))
+    return pd.json_normalize(json_data, record_path=['data', 'stations'])
+
+
+def measure_memory(function):
+    """
+    Measure the memory used while parsing and the size of the resulting Dataframe (in kilobytes).
+    """
+    tracemalloc.start()
+    df = function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if isinstance(df, tuple):
+        df = df[0]
+    return round(peak / 1024), round(df.memory_usage(deep=True).sum() / 1024)
+
+
+def run():
+    decoders = {'orjson': feed_parser.loads, 'json': json.loads} if feed_parser.loads is not json.loads \
+        else {'json': json.loads}
+
+    results = []
+    for number_of_stations in DATASET_SIZES:
+        repeat = 3 if number_of_stations >= 100_000 else 10
+        for name, feed, fields in [('station_information', create_station_information_feed(number_of_stations),
+                                    STATION_INFORMATION_FIELDS),
+                                   ('station_status', create_station_status_feed(number_of_stations),
+                                    STATION_STATUS_FIELDS)]:
+            content = to_bytes(feed)
+            baseline = measure(lambda: parse_feed_baseline(content), repeat)
+            peak, size = measure_memory(lambda: parse_feed_baseline(content))
+            result = {'feed': name, 'stations': number_of_stations,
+                      'baseline_ms': round(baseline['mean_ms'], 1), 'baseline_peak_kb': peak,
+                      'baseline_frame_kb': size}
+
+            for decoder_name, decoder in decoders.items():
+                feed_parser.loads = decoder
+                timing = measure(lambda: parse_feed(content, fields), repeat)
+                peak, size = measure_memory(lambda: parse_feed(content, fields))
+                result.update({decoder_name + '_ms': round(timing['mean_ms'], 1), decoder_name + '_peak_kb': peak,
+                               decoder_name + '_frame_kb': size})
+            feed_parser.loads = decoders[next(iter(decoders))]
+            results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    for result in run():
+        print(result)
@@ -0,0 +1,56 @@
+import openrouteservice_client
+from distance_calculator import find_nearest_neighbors
+from map_handler import create_map_with_stations
+from route_cache import RouteCache
+from spatial_index import StationIndex
+from benchmarks.synthetic_stations import create_random_locations, create_straight_routes, create_synthetic_stations
+from benchmarks.timing import measure
+
+NUMBER_OF_STATIONS = 700
+K_VALUES = [1, 5, 20]
+# number of calls for each marker mode - the maps with one marker per station are much slower
+REPEAT = {'markers': 2, 'fast_cluster': 10}
+
+
+def find_nearest_station_colors_baseline(df_stations, nearest_neighbors):
+    """
+    Previous matching of the stations with the nearest stations - a loop over all nearest stations for each row
+    of iterrows, kept as the baseline.
+    """
+    colors = []
+    for index, station in df_stations.iterrows():
+        color = 'blue'
+        for iteration, nearest_neighbor in enumerate(nearest_neighbors):
+            if nearest_neighbor['station_id'] == station['station_id']:
+                color = 'green'
+        colors.append(color)
+    return colors
+
+
+def run():
+    # the routes are served from memory, so only building the map is measured
+    openrouteservice_client.route_cache = RouteCache(None)
+    source_latitude, source_longitude = create_random_locations(1)[0]
+    df_stations = create_synthetic_stations(NUMBER_OF_STATIONS)
+    spatial_index = StationIndex(df_stations['lat'].to_numpy(), df_stations['lon'].to_numpy())
+
+    results = []
+    for k in K_VALUES:
+        nearest_neighbors = find_nearest_neighbors(source_latitude, source_longitude, df_stations, k, 'Bikes',
+                                                   spatial_index)
+        create_straight_routes(source_latitude, source_longitude, nearest_neighbors,
+                               openrouteservice_client.route_cache)
+
+        baseline = measure(lambda: find_nearest_station_colors_baseline(df_stations, nearest_neighbors), 3)
+        result = {'stations': NUMBER_OF_STATIONS, 'k': k, 'baseline_matching_ms': round(baseline['mean_ms'], 1)}
+        for marker_mode, repeat in REPEAT.items():
+            timing = measure(lambda: create_map_with_stations(df_stations, nearest_neighbors, source_latitude,
+                                                              source_longitude, marker_mode), repeat)
+            result[marker_mode + '_ms'] = round(timing['mean_ms'], 1)
+        results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    for result in run():
+        print(result)
@@ -0,0 +1,64 @@
+from distance_calculator import filter_stations, find_nearest_stations, haversine_distance
+from spatial_index import StationIndex
+from benchmarks.synthetic_stations import create_synthetic_stations, create_random_locations
+from benchmarks.timing import measure
+
+DATASET_SIZES = [700, 100_000]
+K_VALUES = [3, 20]
+
+
+def find_nearest_neighbors_iterrows(source_latitude, source_longitude, df_stations, k, search_for_type):
+    """
+    Previous implementation of find_nearest_neighbors - a loop over iterrows with a full sort, kept as the baseline.
+    """
+    stations_to_analyse = filter_stations(df_stations, search_for_type)
+
+    distances = []
+    for index, location in stations_to_analyse.iterrows():
+        distance = haversine_distance(source_latitude, source_longitude, location['lat'], location['lon'])
+        distances.append((location, distance))
+
+    distances.sort(key=lambda x: x[1])
+    return [distances[i][0] for i in range(k)]
+
+
+def check_results(df_stations, spatial_index, locations, k):
+    """
+    Check that the vectorized and the indexed search return the same stations as the baseline.
+    """
+    for source_latitude, source_longitude in locations:
+        expected = find_nearest_neighbors_iterrows(source_latitude, source_longitude, df_stations, k, 'Bikes')
+        expected = [station['station_id'] for station in expected]
+        nearest_stations, _ = find_nearest_stations(source_latitude, source_longitude, df_stations, k, 'Bikes')
+        assert expected == nearest_stations['station_id'].tolist()
+        nearest_stations, _ = find_nearest_stations(source_latitude, source_longitude, df_stations, k, 'Bikes',
+                                                    spatial_index)
+        assert expected == nearest_stations['station_id'].tolist()
+
+
+def run():
+    locations = create_random_locations(5)
+    results = []
+    for number_of_stations in DATASET_SIZES:
+        df_stations = create_synthetic_stations(number_of_stations)
+        spatial_index = StationIndex(df_stations['lat'].to_numpy(), df_stations['lon'].to_numpy())
+        repeat_baseline = 3 if number_of_stations > 10_000 else 20
+        for k in K_VALUES:
+            check_results(df_stations, spatial_index, locations[:2], k)
+            source_latitude, source_longitude = locations[0]
+            baseline = measure(lambda: find_nearest_neighbors_iterrows(source_latitude, source_longitude,
+                                                                       df_stations, k, 'Bikes'), repeat_baseline)
+            vectorized = measure(lambda: find_nearest_stations(source_latitude, source_longitude,
+                                                               df_stations, k, 'Bikes'), 50)
+            indexed = measure(lambda: find_nearest_stations(source_latitude, source_longitude,
+                                                            df_stations, k, 'Bikes', spatial_index), 50)
+            results.append({'stations': number_of_stations, 'k': k,
+                            'iterrows_ms': round(baseline['mean_ms'], 3),
+                            'vectorized_ms': round(vectorized['mean_ms'], 3),
+                            'indexed_ms': round(indexed['mean_ms'], 3)})
+    return results
+
+
+if __name__ == "__main__":
+    for result in run():
+        print(result)
@@ -0,0 +1,45 @@
+import openrouteservice_client
+from distance_calculator import find_nearest_neighbors
+from map_handler import MARKER_MODES, create_map_with_stations
+from route_cache import RouteCache
+from spatial_index import StationIndex
+from benchmarks.synthetic_stations import create_random_locations, create_straight_routes, create_synthetic_stations
+from benchmarks.timing import measure
+
+DATASET_SIZES = [700, 5000]
+# radius (in kilometers) of the viewport-limited map, None shows all stations
+RADIUS_VALUES = [None, 2]
+K = 3
+
+
+def run():
+    # the routes are served from memory, so only the rendering is measured
+    openrouteservice_client.route_cache = RouteCache(None)
+    source_latitude, source_longitude = create_random_locations(1)[0]
+
+    results = []
+    for number_of_stations in DATASET_SIZES:
+        df_stations = create_synthetic_stations(number_of_stations)
+        spatial_index = StationIndex(df_stations['lat'].to_numpy(), df_stations['lon'].to_numpy())
+        nearest_neighbors = find_nearest_neighbors(source_latitude, source_longitude, df_stations, K, 'Bikes',
+                                                   spatial_index)
+        create_straight_routes(source_latitude, source_longitude, nearest_neighbors,
+                               openrouteservice_client.route_cache)
+
+        for radius in RADIUS_VALUES:
+            for marker_mode in MARKER_MODES:
+                def create_map():
+                    return create_map_with_stations(df_stations, nearest_neighbors, source_latitude, source_longitude,
+                                                    marker_mode, radius, spatial_index)
+
+                repeat = 1 if radius is None else 5
+                timing = measure(create_map, repeat)
+                results.append({'stations': number_of_stations, 'radius_km': radius, 'marker_mode': marker_mode,
+                                'render_ms': round(timing['mean_ms'], 1),
+                                'html_kb': round(len(create_map().encode('utf-8')) / 1024, 1)})
+    return results
+
+
+if __name__ == "__main__":
+    for result in run():
+        print(result)
@@ -0,0 +1,37 @@
+from spatial_index import StationIndex
+from trip_planner import plan_trip
+from benchmarks.synthetic_stations import create_random_locations, create_synthetic_stations
+from benchmarks.timing import measure
+
+DATASET_SIZES = [700, 100_000]
+CANDIDATE_VALUES = [1, 5, 10, 20, 50]
+NUMBER_OF_TRIPS = 20
+
+
+def run():
+    sources = create_random_locations(NUMBER_OF_TRIPS, seed=1)
+    destinations = create_random_locations(NUMBER_OF_TRIPS, seed=2)
+
+    results = []
+    for number_of_stations in DATASET_SIZES:
+        df_stations = create_synthetic_stations(number_of_stations)
+        spatial_index = StationIndex(df_stations['lat'].to_numpy(), df_stations['lon'].to_numpy())
+        for number_of_candidates in CANDIDATE_VALUES:
+            def plan_trips():
+                return [plan_trip(source[0], source[1], destination[0], destination[1], df_stations,
+                                  spatial_index, number_of_candidates=number_of_candidates)
+                        for source, destination in zip(sources, destinations)]
+
+            timing = measure(plan_trips, 5)
+            trips = plan_trips()
+            results.append({'stations': number_of_stations, 'candidates': number_of_candidates,
+                            'plan_ms': round(timing['mean_ms'] / NUMBER_OF_TRIPS, 3),
+                            'mean_trip_min': round(sum(trip.duration for trip in trips) / len(trips) / 60, 2),
+                            'mean_walking_min': round(sum(trip.durations[0] + trip.durations[2]
+                                                          for trip in trips) / len(trips) / 60, 2)})
+    return results
+
+
+if __name__ == "__main__":
+    for result in run():
+        print(result)
@@ -0,0 +1,48 @@
+import json
+import sys
+
+# a benchmark is reported as a regression if its mean time grew by more than this fraction
+REGRESSION_THRESHOLD = 0.2
+# columns of the records which are measurements, the other columns identify the benchmark
+MEASUREMENT_COLUMNS = ('stations', 'mean_ms', 'min_ms')
+
+
+def get_key(result):
+    """
+    Get the columns identifying the benchmark of one record, e.g. the benchmark, the dataset and the marker mode.
+    """
+    return tuple(sorted((column, value) for column, value in result.items() if column not in MEASUREMENT_COLUMNS))
+
+
+def compare_results(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """
+    Compare two reports of bench_end_to_end.
+
+    Args:
+        baseline: report used as the reference
+        current: report of the new run
+        threshold: fraction by which the mean time can grow before it is reported
+
+    Returns:
+        regressions: list of (benchmark key, baseline mean time, current mean time) for the slower benchmarks
+    """
+    baseline_times = {get_key(result): result['mean_ms'] for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        baseline_time = baseline_times.get(get_key(result))
+        if baseline_time is not None and result['mean_ms'] > baseline_time * (1 + threshold):
+            regressions.append((dict(get_key(result)), baseline_time, result['mean_ms']))
+    return regressions
+
+
+if __name__ == "__main__":
+    # usage: python -m benchmarks.compare_results baseline.json current.json
+    with open(sys.argv[1]) as file:
+        baseline_report = json.load(file)
+    with open(sys.argv[2]) as file:
+        current_report = json.load(file)
+
+    found_regressions = compare_results(baseline_report, current_report)
+    for key, baseline_mean, current_mean in found_regressions:
+        print('Regression: {} - {:.3f} ms -> {:.3f} ms'.format(key, baseline_mean, current_mean))
+    sys.exit(1 if found_regressions else 0)
@@ -0,0 +1,70 @@
+import os
+
+import requests
+
+from get_data import FEED_REQUEST_TIMEOUT, URL_STATION_INFORMATION, URL_STATION_STATUS
+from benchmarks.synthetic_feeds import create_station_information_feed, create_station_status_feed, to_bytes
+
+# directory with the pinned feeds of Toronto, committed so the results of all machines can be compared
+RECORDED_FEEDS_PATH = os.path.join(os.path.dirname(__file__), 'fixtures')
+# feeds served by the stub feed server - (path on the server, url of the live feed)
+FEEDS = [('station_information', URL_STATION_INFORMATION), ('station_status', URL_STATION_STATUS)]
+# datasets of the benchmarks - the recorded feeds of Toronto and the synthetic feeds with this number of stations
+DATASETS = ['recorded', 1_000, 10_000, 100_000]
+
+
+def record_feeds(path=RECORDED_FEEDS_PATH):
+    """
+    Download the live feeds and save them, so the benchmarks can replay them without the network.
+    This replaces the pinned feeds, so the results are no longer comparable with the earlier reports.
+
+    Args:
+        path: directory where the feeds are saved
+    """
+    os.makedirs(path, exist_ok=True)
+    for name, url in FEEDS:
+        response = requests.get(url, timeout=FEED_REQUEST_TIMEOUT)
+        response.raise_for_status()
+        with open(os.path.join(path, name + '.json'), 'wb') as file:
+            file.write(response.content)
+
+
+def get_missing_feeds(path=RECORDED_FEEDS_PATH):
+    """
+    Get the files of the recorded feeds which are missing.
+    """
+    return [os.path.join(path, name + '.json') for name, _ in FEEDS
+            if not os.path.exists(os.path.join(path, name + '.json'))]
+
+
+def load_feeds(dataset, path=RECORDED_FEEDS_PATH):
+    """
+    Load the feeds of one dataset.
+
+    Args:
+        dataset: 'recorded' to replay the recorded feeds, or the number of stations of the synthetic feeds
+        path: directory with the recorded feeds
+
+    Returns:
+        feeds: dictionary with the body of each feed by its path on the feed server, e.g. '/station_status'
+
+    Raises:
+        FileNotFoundError: if the recorded feeds are missing
+    """
+    if dataset == 'recorded':
+        missing_feeds = get_missing_feeds(path)
+        if missing_feeds:
+            raise FileNotFoundError('The recorded feeds are missing: {} - restore them from the repository'
+                                    .format(', '.join(missing_feeds)))
+        feeds = {}
+        for name, _ in FEEDS:
+            with open(os.path.join(path, name + '.json'), 'rb') as file:
+                feeds['/' + name] = file.read()
+        return feeds
+    return {'/station_information': to_bytes(create_station_information_feed(dataset)),
+            '/station_status': to_bytes(create_station_status_feed(dataset))}
+
+
+if __name__ == "__main__":
+    record_feeds()
+    print('The feeds were saved in', RECORDED_FEEDS_PATH)
@@ -0,0 +1,142 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from werkzeug.serving import BaseWSGIServer
+
+import get_data
+import openrouteservice_client
+from route_cache import RouteCache
+from benchmarks.fixtures import load_feeds
+from benchmarks.stub_servers import get_url, start_feed_server, start_openrouteservice_server
+from benchmarks.synthetic_stations import create_random_locations
+
+NUMBER_OF_STATIONS = 700
+# delay of each response of the stub of openrouteservice (in seconds)
+ORS_LATENCY = 0.2
+# number of threads handling the requests in the application, like the threads of a gunicorn worker
+APP_WORKERS = 4
+# number of clients sending requests at the same time
+CONCURRENCY_VALUES = [1, 8, 32]
+NUMBER_OF_REQUESTS = 64
+K = 5
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    WSGI server handling the requests with a fixed number of threads, so slow requests wait for a free worker.
+    """
+
+    def __init__(self, host, port, app, workers):
+        super().__init__(host, port, app)
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def start_application(workers):
+    """
+    Start the application with the feeds and openrouteservice replaced by stubs.
+
+    Args:
+        workers: number of threads handling the requests
+
+    Returns:
+        app: the Flask application
+        url: base url of the running application
+    """
+    feed_server = start_feed_server(load_feeds(NUMBER_OF_STATIONS))
+    openrouteservice_server = start_openrouteservice_server(ORS_LATENCY)
+    get_data.station_snapshot_cache.information.url = get_url(feed_server) + '/station_information'
+    get_data.station_snapshot_cache.status.url = get_url(feed_server) + '/station_status'
+    openrouteservice_client.ORS_BASE_URL = get_url(openrouteservice_server)
+    # the database and the history of the application are written to a temporary directory
+    os.chdir(tempfile.mkdtemp())
+    from app import app
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = PooledWSGIServer('127.0.0.1', 0, app, workers)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return app, 'http://127.0.0.1:{}'.format(server.server_address[1])
+
+
+def create_requests(number_of_requests):
+    """
+    Create the forms of the searches sent to /search_available and /search_directions, one after another.
+    """
+    sources = create_random_locations(number_of_requests, seed=1)
+    destinations = create_random_locations(number_of_requests, seed=2)
+    forms = []
+    for number, (source, destination) in enumerate(zip(sources, destinations)):
+        if number % 2 == 0:
+            forms.append(('/search_available', {'lat': source[0], 'lon': source[1], 'k_value': K,
+                                                'search_for': 'Bikes'}))
+        else:
+            forms.append(('/search_directions', {'source_lat': source[0], 'source_lon': source[1],
+                                                 'dest_lat': destination[0], 'dest_lon': destination[1]}))
+    return forms
+
+
+def send_requests(url, forms, concurrency):
+    """
+    Send the searches with the given number of clients at the same time.
+
+    Returns:
+        result: dictionary with the number of requests per second, latency percentiles and number of errors
+    """
+    def send(form):
+        path, data = form
+        start = time.perf_counter()
+        response = requests.post(url + path, data=data, allow_redirects=False, timeout=60)
+        return (time.perf_counter() - start) * 1000, response.status_code == 302
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        responses = list(executor.map(send, forms))
+    duration = time.perf_counter() - start
+
+    latencies = np.array([latency for latency, _ in responses])
+    return {'requests_per_s': round(len(forms) / duration, 2),
+            'p50_ms': round(float(np.percentile(latencies, 50)), 1),
+            'p95_ms': round(float(np.percentile(latencies, 95)), 1),
+            'p99_ms': round(float(np.percentile(latencies, 99)), 1),
+            'errors': sum(not success for _, success in responses)}
+
+
+def run():
+    app, url = start_application(APP_WORKERS)
+    app.config['STATIONS_MAP_MARKERS'] = 'fast_cluster'
+    forms = create_requests(NUMBER_OF_REQUESTS)
+
+    # the first search waits for the feeds
+    send_requests(url, forms[:2], 1)
+
+    results = []
+    for async_routes in [False, True]:
+        app.config['ASYNC_ROUTES'] = async_routes
+        for concurrency in CONCURRENCY_VALUES:
+            # the routes are kept only in memory and each run starts with no routes, so every route is requested
+            openrouteservice_client.route_cache = RouteCache(None)
+            result = send_requests(url, forms, concurrency)
+            results.append({'async_routes': async_routes, 'workers': APP_WORKERS, 'concurrency': concurrency,
+                            **result})
+    return results
+
+
+if __name__ == "__main__":
+    for result in run():
+        print(result)
@@ -0,0 +1,140 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# number of points along the straight routes returned by the stub of openrouteservice
+ROUTE_POINTS = 20
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    HTTP server handling each request in its own thread.
+    """
+    daemon_threads = True
+    # the connections of many concurrent searches are accepted at once - with the default queue of 5 connections,
+    # the other clients would connect again after about a second
+    request_queue_size = 128
+
+
+def start_server(handler_class, port=0):
+    """
+    Start a HTTP server in a daemon thread, each request is handled in its own thread.
+
+    Args:
+        handler_class: subclass of BaseHTTPRequestHandler
+        port: port of the server, 0 to use any free port
+
+    Returns:
+        server: the running server, its address is in server.server_address
+    """
+    server = StubServer(('127.0.0.1', port), handler_class)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def get_url(server):
+    """
+    Get the base url of a server started by start_server.
+    """
+    return 'http://{}:{}'.format(*server.server_address)
+
+
+def start_feed_server(feeds, latency=0.0, port=0):
+    """
+    Start a server with the feeds, e.g. the station information feed at /station_information.
+
+    Args:
+        feeds: dictionary with the body of each feed by its path, see fixtures.load_feeds
+        latency: delay of each response (in seconds)
+        port: port of the server, 0 to use any free port
+
+    Returns:
+        server: the running server
+    """
+    class FeedHandler(BaseHTTPRequestHandler):
+        def log_message(self, *arguments):
+            pass
+
+        def do_GET(self):
+            time.sleep(latency)
+            body = feeds.get(self.path)
+            if body is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return start_server(FeedHandler, port)
+
+
+def create_straight_route(source_coordinates, destination_coordinates):
+    """
+    Create the GeoJSON response of the directions endpoint with a straight route.
+
+    Args:
+        source_coordinates: [longitude, latitude] pair of the source location
+        destination_coordinates: [longitude, latitude] pair of the destination location
+
+    Returns:
+        response: dictionary with the GeoJSON FeatureCollection
+    """
+    fractions = [step / (ROUTE_POINTS - 1) for step in range(ROUTE_POINTS)]
+    coordinates = [[source_coordinates[0] + (destination_coordinates[0] - source_coordinates[0]) * fraction,
+                    source_coordinates[1] + (destination_coordinates[1] - source_coordinates[1]) * fraction]
+                   for fraction in fractions]
+    return {'type': 'FeatureCollection',
+            'features': [{'type': 'Feature', 'geometry': {'type': 'LineString', 'coordinates': coordinates},
+                          'properties': {'summary': {'distance': 0.0, 'duration': 0.0}}}]}
+
+
+def create_duration_matrix(locations, sources, destinations):
+    """
+    Create the response of the matrix endpoint with travel times proportional to the distances in degrees.
+    """
+    distances = [[abs(locations[source][0] - locations[destination][0]) * 80000 +
+                  abs(locations[source][1] - locations[destination][1]) * 111000
+                  for destination in destinations] for source in sources]
+    return {'durations': [[distance / 1.4 for distance in row] for row in distances], 'distances': distances}
+
+
+def start_openrouteservice_server(latency=0.2, port=0):
+    """
+    Start a stub of openrouteservice with the directions and matrix endpoints, so the benchmarks need
+    neither the API key nor the network. The directions endpoint returns a straight route,
+    the matrix endpoint travel times estimated from the distances.
+
+    Args:
+        latency: delay of each response (in seconds)
+        port: port of the server, 0 to use any free port
+
+    Returns:
+        server: the running server
+    """
+    class OpenrouteserviceHandler(BaseHTTPRequestHandler):
+        def log_message(self, *arguments):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            time.sleep(latency)
+            if self.path.startswith('/v2/matrix/'):
+                locations = body['locations']
+                response = create_duration_matrix(locations, body.get('sources', range(len(locations))),
+                                                  body.get('destinations', range(len(locations))))
+            elif self.path.startswith('/v2/directions/'):
+                response = create_straight_route(*body['coordinates'][:2])
+            else:
+                self.send_error(404)
+                return
+            data = json.dumps(response).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return start_server(OpenrouteserviceHandler, port)
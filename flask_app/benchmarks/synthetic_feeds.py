@@ -0,0 +1,67 @@
+import json
+import time
+
+import numpy as np
+
+from benchmarks.synthetic_stations import MAX_LATITUDE, MAX_LONGITUDE, MIN_LATITUDE, MIN_LONGITUDE
+
+
+def create_station_information_feed(number_of_stations, seed=0):
+    """
+    Create the station information feed with random stations, with the same fields as the feed of Toronto.
+
+    Args:
+        number_of_stations: number of stations in the feed
+        seed: seed of the random number generator
+
+    Returns:
+        feed: dictionary with the GBFS document
+    """
+    generator = np.random.default_rng(seed)
+    latitudes = generator.uniform(MIN_LATITUDE, MAX_LATITUDE, number_of_stations).tolist()
+    longitudes = generator.uniform(MIN_LONGITUDE, MAX_LONGITUDE, number_of_stations).tolist()
+    capacities = generator.integers(10, 40, number_of_stations).tolist()
+
+    stations = [{'station_id': str(7000 + number), 'name': 'Station {}'.format(number),
+                 'physical_configuration': 'REGULAR', 'lat': latitude, 'lon': longitude, 'altitude': 0.0,
+                 'address': 'Street {}'.format(number), 'cross_street': '', 'post_code': 'M5V',
+                 'capacity': capacity, 'is_charging_station': number % 10 == 0,
+                 'rental_methods': ['KEY', 'TRANSITCARD', 'CREDITCARD', 'PHONE'], 'groups': [], 'obcn': '647-643-9607',
+                 'nearby_distance': 500.0, '_ride_code_support': True, 'rental_uris': {}, 'is_valet_station': False}
+                for number, (latitude, longitude, capacity) in enumerate(zip(latitudes, longitudes, capacities))]
+    return {'last_updated': int(time.time()), 'ttl': 30, 'data': {'stations': stations}}
+
+
+def create_station_status_feed(number_of_stations, seed=0):
+    """
+    Create the station status feed for the stations from create_station_information_feed.
+
+    Args:
+        number_of_stations: number of stations in the feed
+        seed: seed of the random number generator
+
+    Returns:
+        feed: dictionary with the GBFS document
+    """
+    generator = np.random.default_rng(seed + 1)
+    now = int(time.time())
+    capacities = np.random.default_rng(seed).integers(10, 40, number_of_stations)
+    bikes = generator.integers(0, capacities + 1)
+    ebikes = generator.integers(0, bikes + 1)
+    last_reported = (now - generator.integers(0, 600, number_of_stations)).tolist()
+
+    stations = [{'station_id': str(7000 + number), 'num_bikes_available': bike,
+                 'num_bikes_available_types': {'mechanical': bike - ebike, 'ebike': ebike},
+                 'num_bikes_disabled': 0, 'num_docks_available': capacity - bike, 'num_docks_disabled': 0,
+                 'last_reported': reported, 'is_charging_station': number % 10 == 0, 'status': 'IN_SERVICE',
+                 'is_installed': 1, 'is_renting': 1, 'is_returning': 1, 'traffic': None}
+                for number, (capacity, bike, ebike, reported) in enumerate(zip(capacities.tolist(), bikes.tolist(),
+                                                                               ebikes.tolist(), last_reported))]
+    return {'last_updated': now, 'ttl': 5, 'data': {'stations': stations}}
+
+
+def to_bytes(feed):
+    """
+    Encode the feed as the body of the response.
+    """
+    return json.dumps(feed).encode('utf-8')
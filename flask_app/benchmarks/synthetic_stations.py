@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+from openrouteservice_client import AVOID_FEATURES
+from route_cache import get_route_key
+
+# area covered by the synthetic stations - the same rectangle as the accepted area of Toronto
+MIN_LATITUDE, MAX_LATITUDE = 43.52626, 43.91049
+MIN_LONGITUDE, MAX_LONGITUDE = -79.70796, -78.96952
+
+
+def create_synthetic_stations(number_of_stations, seed=0):
+    """
+    Create a Pandas Dataframe with random stations in the same format as returned by get_data.
+
+    Args:
+        number_of_stations: number of stations to create
+        seed: seed of the random number generator
+
+    Returns:
+        df_stations: Pandas dataframe with stations' information and status
+    """
+    generator = np.random.default_rng(seed)
+    capacity = generator.integers(10, 40, number_of_stations)
+    num_bikes_available = generator.integers(0, capacity + 1)
+    num_bikes_available_types_ebike = generator.integers(0, num_bikes_available + 1)
+    is_charging_station = generator.random(number_of_stations) < 0.1
+
+    return pd.DataFrame({
+        'station_id': (7000 + np.arange(number_of_stations)).astype(str),
+        'lat': generator.uniform(MIN_LATITUDE, MAX_LATITUDE, number_of_stations),
+        'lon': generator.uniform(MIN_LONGITUDE, MAX_LONGITUDE, number_of_stations),
+        'address': ['Street {}'.format(number) for number in range(number_of_stations)],
+        'capacity': capacity,
+        'is_charging_station_x': is_charging_station,
+        'nearby_distance': 500.0,
+        'num_bikes_available': num_bikes_available,
+        'num_bikes_disabled': 0,
+        'num_docks_available': capacity - num_bikes_available,
+        'num_docks_disabled': 0,
+        'is_charging_station_y': is_charging_station,
+        'is_renting': (generator.random(number_of_stations) < 0.95).astype(np.int64),
+        'is_returning': (generator.random(number_of_stations) < 0.95).astype(np.int64),
+        'num_bikes_available_types_mechanical': num_bikes_available - num_bikes_available_types_ebike,
+        'num_bikes_available_types_ebike': num_bikes_available_types_ebike,
+    })
+
+
+def create_random_locations(number_of_locations, seed=1):
+    """
+    Create random locations in the area covered by the synthetic stations.
+
+    Args:
+        number_of_locations: number of locations to create
+        seed: seed of the random number generator
+
+    Returns:
+        locations: list of (latitude, longitude) pairs
+    """
+    generator = np.random.default_rng(seed)
+    latitudes = generator.uniform(MIN_LATITUDE, MAX_LATITUDE, number_of_locations)
+    longitudes = generator.uniform(MIN_LONGITUDE, MAX_LONGITUDE, number_of_locations)
+    return list(zip(latitudes.tolist(), longitudes.tolist()))
+
+
+def create_straight_routes(source_latitude, source_longitude, nearest_neighbors, route_cache, number_of_points=50):
+    """
+    Put straight routes from the source location to the nearest stations in the route cache,
+    so the benchmarks of the maps do not send requests to openrouteservice.
+
+    Args:
+        source_latitude: source location - latitude
+        source_longitude: source location - longitude
+        nearest_neighbors: list of station which are the nearest to the source location
+        route_cache: RouteCache used by openrouteservice_client
+        number_of_points: number of points along each route
+    """
+    for station in nearest_neighbors:
+        source_coordinates = [source_longitude, source_latitude]
+        destination_coordinates = [station['lon'], station['lat']]
+        steps = np.linspace(0, 1, number_of_points)
+        route = [[source_longitude + step * (station['lon'] - source_longitude),
+                  source_latitude + step * (station['lat'] - source_latitude)] for step in steps.tolist()]
+        route_cache.put(get_route_key('foot-walking', source_coordinates, destination_coordinates, AVOID_FEATURES),
+                        route)
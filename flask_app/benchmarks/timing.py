@@ -0,0 +1,20 @@
+import time
+
+
+def measure(function, repeat):
+    """
+    Measure the execution time of a function.
+
+    Args:
+        function: function without arguments to measure
+        repeat: number of calls
+
+    Returns:
+        times: dictionary with the mean and minimum time of one call (in milliseconds)
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+    return {'mean_ms': sum(times) / len(times), 'min_ms': min(times)}
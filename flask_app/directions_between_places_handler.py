@@ -1,12 +1,14 @@
-import openrouteservice
 import folium
-from openrouteservice_api_key import api_key
-from distance_calculator import find_nearest_neighbors
+from metrics import span
+from openrouteservice_client import call_concurrently, get_route_coordinates, run_concurrently
+from trip_planner import TRIP_CANDIDATES, plan_trip
 
 
-def create_map_with_directions(source_latitude, source_longitude, destination_latitude, destination_longitude, df_stations):
+def create_map_with_directions(source_latitude, source_longitude, destination_latitude, destination_longitude, df_stations,
+                               spatial_index=None, availability=None, number_of_candidates=TRIP_CANDIDATES,
+                               use_durations=False):
     """
-    Create and save a Folium map with markers and routes connecting the source location and destination location.
+    Create a Folium map with markers and routes connecting the source location and destination location.
 
     Args:
         source_latitude: source location - latitude
@@ -14,23 +16,88 @@ def create_map_with_directions(source_latitude, source_longitude, destination_la
         destination_latitude: destination location - latitude
         destination_longitude: destination location - longitude
         df_stations: Pandas Dataframe containing the stations' information and status
+        spatial_index: optional StationIndex built from df_stations
+        availability: optional availability bitmaps of df_stations
+        number_of_candidates: number of stations with bike and stations with dock combined by the trip planner
+        use_durations: True to compare the trips using travel times from openrouteservice, see plan_trip
 
+    Returns:
+        map_as_html: the map rendered to HTML
     """
-    folium_map = folium.Map(width='70%', height='60%', location=[source_latitude, source_longitude], zoom_start=15)
+    nearest_station_with_bike, nearest_station_with_dock = find_key_locations(source_latitude, source_longitude,
+                                                                              destination_latitude, destination_longitude,
+                                                                              df_stations, spatial_index, availability,
+                                                                              number_of_candidates, use_durations)
+
+    return create_map_with_key_locations(source_latitude, source_longitude, destination_latitude, destination_longitude,
+                                         nearest_station_with_bike, nearest_station_with_dock)
+
+
+async def create_map_with_directions_async(source_latitude, source_longitude, destination_latitude,
+                                           destination_longitude, df_stations, spatial_index=None, availability=None,
+                                           number_of_candidates=TRIP_CANDIDATES, use_durations=False):
+    """
+    Asynchronous version of create_map_with_directions - the routes of the 3 legs are awaited at the same time.
+
+    Args:
+        source_latitude: source location - latitude
+        source_longitude: source location - longitude
+        destination_latitude: destination location - latitude
+        destination_longitude: destination location - longitude
+        df_stations: Pandas Dataframe containing the stations' information and status
+        spatial_index: optional StationIndex built from df_stations
+        availability: optional availability bitmaps of df_stations
+        number_of_candidates: number of stations with bike and stations with dock combined by the trip planner
+        use_durations: True to compare the trips using travel times from openrouteservice, see plan_trip
 
+    Returns:
+        map_as_html: the map rendered to HTML
+    """
     nearest_station_with_bike, nearest_station_with_dock = find_key_locations(source_latitude, source_longitude,
                                                                               destination_latitude, destination_longitude,
-                                                                              df_stations)
+                                                                              df_stations, spatial_index, availability,
+                                                                              number_of_candidates, use_durations)
+
+    legs = get_legs(source_latitude, source_longitude, destination_latitude, destination_longitude,
+                    nearest_station_with_bike, nearest_station_with_dock)
+    with span('routes'):
+        routes = await run_concurrently(get_route_coordinates, get_route_arguments_of_legs(legs))
+
+    return create_map_with_key_locations(source_latitude, source_longitude, destination_latitude, destination_longitude,
+                                         nearest_station_with_bike, nearest_station_with_dock, routes)
+
+
+def create_map_with_key_locations(source_latitude, source_longitude, destination_latitude, destination_longitude,
+                                  nearest_station_with_bike, nearest_station_with_dock, routes=None):
+    """
+    Create a Folium map with markers and routes connecting the 4 key locations.
+
+    Args:
+        source_latitude: source location - latitude
+        source_longitude: source location - longitude
+        destination_latitude: destination location - latitude
+        destination_longitude: destination location - longitude
+        nearest_station_with_bike: the station where the bike is rented
+        nearest_station_with_dock: the station where the bike is returned
+        routes: optional list with [longitude, latitude] pairs along each leg, see get_legs,
+                None to request the routes here
+
+    Returns:
+        map_as_html: the map rendered to HTML
+    """
+    folium_map = folium.Map(width='70%', height='60%', location=[source_latitude, source_longitude], zoom_start=15)
 
     add_routes_connecting_key_locations_to_map(source_latitude, source_longitude,
                                                destination_latitude, destination_longitude,
-                                               folium_map, nearest_station_with_bike, nearest_station_with_dock)
+                                               folium_map, nearest_station_with_bike, nearest_station_with_dock,
+                                               routes)
 
     add_markers_with_key_locations_to_map(source_latitude, source_longitude,
                                           destination_latitude, destination_longitude,
                                           folium_map, nearest_station_with_bike, nearest_station_with_dock)
 
-    folium_map.save('templates/directions_map.html')
+    with span('map_render'):
+        return folium_map.get_root().render()
 
 
 def add_markers_with_key_locations_to_map(source_latitude, source_longitude,
@@ -80,9 +147,36 @@ def add_markers_with_key_locations_to_map(source_latitude, source_longitude,
     destination_marker.add_to(folium_map)
 
 
+def get_legs(source_latitude, source_longitude, destination_latitude, destination_longitude,
+             nearest_station_with_bike, nearest_station_with_dock):
+    """
+    Get the 3 legs of the travel - walking to the station with bike, cycling to the station with dock
+    and walking to the destination.
+
+    Args:
+        source_latitude: source location - latitude
+        source_longitude: source location - longitude
+        destination_latitude: destination location - latitude
+        destination_longitude: destination location - longitude
+        nearest_station_with_bike: the station where the bike is rented
+        nearest_station_with_dock: the station where the bike is returned
+
+    Returns:
+        legs: list of (source latitude, source longitude, destination latitude, destination longitude,
+              directions profile, route color) for each leg
+    """
+    return [(source_latitude, source_longitude,
+             nearest_station_with_bike['lat'], nearest_station_with_bike['lon'], 'foot-walking', 'red'),
+            (nearest_station_with_bike['lat'], nearest_station_with_bike['lon'],
+             nearest_station_with_dock['lat'], nearest_station_with_dock['lon'], 'cycling-regular', 'orange'),
+            (nearest_station_with_dock['lat'], nearest_station_with_dock['lon'],
+             destination_latitude, destination_longitude, 'foot-walking', 'blue')]
+
+
 def add_routes_connecting_key_locations_to_map(source_latitude, source_longitude,
                                                destination_latitude, destination_longitude,
-                                               folium_map, nearest_station_with_bike, nearest_station_with_dock):
+                                               folium_map, nearest_station_with_bike, nearest_station_with_dock,
+                                               routes=None):
     """
     Add routes connecting the 4 key locations to the Folium map.
 
@@ -94,24 +188,44 @@ def add_routes_connecting_key_locations_to_map(source_latitude, source_longitude
         folium_map: Folium map with routes and markers
         nearest_station_with_bike: the nearest station from the source location with at least one bike available
         nearest_station_with_dock: the nearest station from the destination location with at least one dock available
+        routes: optional list with [longitude, latitude] pairs along each leg, see get_legs,
+                None to request the routes here
+    """
+    legs = get_legs(source_latitude, source_longitude, destination_latitude, destination_longitude,
+                    nearest_station_with_bike, nearest_station_with_dock)
+    # request the routes of all legs at once - a leg whose route could not be found is skipped
+    if routes is None:
+        with span('routes'):
+            routes = call_concurrently(get_route_coordinates, get_route_arguments_of_legs(legs))
+    paths = [create_path_between_points(route_coordinates, *leg)
+             for route_coordinates, leg in zip(routes, legs) if route_coordinates is not None]
+    for path in paths:
+        path.add_to(folium_map)
+
+
+def get_route_arguments_of_legs(legs):
+    """
+    Get the arguments of get_route_coordinates for each leg, so the routes of all legs can be requested at once
+    and the trip waits only for its slowest leg.
+
+    Args:
+        legs: list of legs, see get_legs
+
+    Returns:
+        list_of_arguments: list with (source coordinates, destination coordinates, profile) of each leg
     """
-    source_to_station = add_path_between_points(source_latitude, source_longitude,
-                                                nearest_station_with_bike['lat'], nearest_station_with_bike['lon'],
-                                                'foot-walking', 'red')
-    station_to_dock = add_path_between_points(nearest_station_with_bike['lat'], nearest_station_with_bike['lon'],
-                                              nearest_station_with_dock['lat'], nearest_station_with_dock['lon'],
-                                              'cycling-regular', 'orange')
-    dock_to_destination = add_path_between_points(nearest_station_with_dock['lat'], nearest_station_with_dock['lon'],
-                                                  destination_latitude, destination_longitude,
-                                                  'foot-walking', 'blue')
-    source_to_station.add_to(folium_map)
-    station_to_dock.add_to(folium_map)
-    dock_to_destination.add_to(folium_map)
+    return [([leg_source_longitude, leg_source_latitude], [leg_destination_longitude, leg_destination_latitude], profile)
+            for leg_source_latitude, leg_source_longitude,
+            leg_destination_latitude, leg_destination_longitude, profile, _ in legs]
 
 
-def find_key_locations(source_latitude, source_longitude, destination_latitude, destination_longitude, df_stations):
+def find_key_locations(source_latitude, source_longitude, destination_latitude, destination_longitude, df_stations,
+                       spatial_index=None, availability=None, number_of_candidates=TRIP_CANDIDATES,
+                       use_durations=False):
     """
     Find the key locations which will be used in the travel.
+    The stations are chosen by the trip planner, so a slightly farther station is used if it makes the whole trip
+    faster. With one candidate, the nearest stations are used.
 
     Args:
         source_latitude: source location - latitude
@@ -119,53 +233,44 @@ def find_key_locations(source_latitude, source_longitude, destination_latitude,
         destination_latitude: destination location - latitude
         destination_longitude: destination location - longitude
         df_stations: Pandas Dataframe containing the stations' information and status
+        spatial_index: optional StationIndex built from df_stations
+        availability: optional availability bitmaps of df_stations
+        number_of_candidates: number of stations with bike and stations with dock combined by the trip planner
+        use_durations: True to compare the trips using travel times from openrouteservice, see plan_trip
 
     Returns:
-        nearest_station_with_bike: the nearest station from the source location with at least one bike available
-        nearest_station_with_dock: the nearest station from the destination location with at least one dock available
+        nearest_station_with_bike: station near the source location with at least one bike available
+        nearest_station_with_dock: station near the destination location with at least one dock available
     """
-    # station nearest to source location
-    nearest_station_with_bike = find_nearest_neighbors(source_latitude, source_longitude, df_stations, 1, 'bikes')[0]
-    # station nearest to destination location
-    nearest_station_with_dock = find_nearest_neighbors(destination_latitude, destination_longitude, df_stations, 1, 'docks')[0]
-    return nearest_station_with_bike, nearest_station_with_dock
+    trip = plan_trip(source_latitude, source_longitude, destination_latitude, destination_longitude, df_stations,
+                     spatial_index, availability, number_of_candidates, use_durations)
+    return trip.station_with_bike, trip.station_with_dock
 
 
-def add_path_between_points(source_latitude, source_longitude,
-                            destination_latitude, destination_longitude, directions_profile, route_color):
+def create_path_between_points(route_coordinates, source_latitude, source_longitude,
+                               destination_latitude, destination_longitude, directions_profile, route_color):
     """
+    Create the line showing the route connecting source and destination location.
 
     Args:
+        route_coordinates: list of [longitude, latitude] pairs along the route
         source_latitude: source location - latitude
         source_longitude: source location - longitude
         destination_latitude: destination location - latitude
         destination_longitude: destination location - longitude
-        directions_profile: profile used by openrouteservice client during searching the route connecting source and destination location
+        directions_profile: profile used by openrouteservice client during searching the route
         route_color: color of the route
 
     Returns:
         directions: route connecting source and destination location
     """
-    openrouteservice_api_key = api_key
-    client = openrouteservice.Client(key=openrouteservice_api_key)  # Specify your personal API key
-
-    coordinates = [[source_longitude, source_latitude], [destination_longitude, destination_latitude]]
-
-    route = client.directions(
-        coordinates=coordinates,
-        profile=directions_profile,
-        format='geojson',
-        options={"avoid_features": ["steps"]},
-        validate=False,
-    )
-
     popup_content = "Route from ({}, {}) <br> to ({}, {}). <br> Profile: {}".format(source_latitude, source_longitude,
                                                                                     destination_latitude,
                                                                                     destination_longitude,
                                                                                     directions_profile)
     directions = folium.PolyLine(locations=[list(reversed(coord))
                                             for coord in
-                                            route['features'][0]['geometry']['coordinates']],
+                                            route_coordinates],
                                  color=route_color,
                                  weight=5,
                                  opacity=1,
@@ -1,6 +1,12 @@
-import openrouteservice
 import folium
-from openrouteservice_api_key import api_key
+import numpy as np
+import requests
+from openrouteservice.exceptions import ApiError, HTTPError, Timeout
+from distance_calculator import find_nearest_stations
+from openrouteservice_client import call_concurrently, get_durations, get_route_coordinates, run_concurrently
+
+# number of the nearest stations (by haversine distance) ranked again by walking time
+WALKING_TIME_CANDIDATES = 25
 
 
 def get_color_based_on_iteration(iteration, max_iterations):
@@ -89,27 +95,31 @@ def get_routes_between_source_location_and_station(source_latitude, source_longi
     Returns:
         directions: Folium Polyline containing the route between source and destination location
     """
-    # get the API key from imported file
-    openrouteservice_api_key = api_key
-    client = openrouteservice.Client(key=openrouteservice_api_key)
-
     # specify the source and destination location
-    coordinates = [[source_longitude, source_latitude], [station['lon'], station['lat']]]
+    route_coordinates = get_route_coordinates([source_longitude, source_latitude], [station['lon'], station['lat']],
+                                              'foot-walking')
+    return create_route_polyline(route_coordinates, station, iteration, max_iterations)
+
+
+def create_route_polyline(route_coordinates, station, iteration, max_iterations):
+    """
+    Create the line showing the route to one of the nearest stations.
 
-    route = client.directions(
-        coordinates=coordinates,
-        profile='foot-walking',
-        format='geojson',
-        options={"avoid_features": ["steps"]},
-        validate=False,
-    )
+    Args:
+        route_coordinates: list of [longitude, latitude] pairs along the route
+        station: row in the Pandas Dataframe containing information about stations' status and information
+        iteration: index of station in the sorted list of the nearest stations
+        max_iterations: number of stations in the list of the nearest stations
 
+    Returns:
+        directions: Folium Polyline containing the route between source and destination location
+    """
     color = get_color_based_on_iteration(iteration, max_iterations)
     weight = get_weight_based_on_iteration(iteration, max_iterations)
     opacity = get_opacity_based_on_iteration(iteration, max_iterations)
     directions = folium.PolyLine(locations=[list(reversed(coord))
                                             for coord in
-                                            route['features'][0]['geometry']['coordinates']],
+                                            route_coordinates],
                                  color=color,
                                  weight=weight,
                                  opacity=opacity,
@@ -117,3 +127,110 @@ def get_routes_between_source_location_and_station(source_latitude, source_longi
                                  popup="Route to station: {}".format(station['station_id'])  # showed on click
                                  )
     return directions
+
+
+def get_routes_to_nearest_stations(source_latitude, source_longitude, nearest_neighbors):
+    """
+    Get the routes between source location and each of the nearest stations.
+    The requests to openrouteservice are sent concurrently.
+
+    Args:
+        source_latitude: source location - latitude
+        source_longitude: source location - longitude
+        nearest_neighbors: list of station which are the nearest to the source location
+
+    Returns:
+        routes: list with Folium Polyline for each station in nearest_neighbors, None if the route could not be found
+    """
+    list_of_arguments = [(source_latitude, source_longitude, station, iteration, len(nearest_neighbors))
+                         for iteration, station in enumerate(nearest_neighbors)]
+    return call_concurrently(get_routes_between_source_location_and_station, list_of_arguments)
+
+
+def get_route_coordinates_to_nearest_stations(source_latitude, source_longitude, nearest_neighbors):
+    """
+    Get the coordinates of the routes between source location and each of the nearest stations.
+    The requests to openrouteservice are sent concurrently.
+
+    Args:
+        source_latitude: source location - latitude
+        source_longitude: source location - longitude
+        nearest_neighbors: list of station which are the nearest to the source location
+
+    Returns:
+        routes: list with [longitude, latitude] pairs along the route to each station, None if the route could not be found
+    """
+    list_of_arguments = [([source_longitude, source_latitude], [station['lon'], station['lat']], 'foot-walking')
+                         for station in nearest_neighbors]
+    return call_concurrently(get_route_coordinates, list_of_arguments)
+
+
+async def get_route_coordinates_to_nearest_stations_async(source_latitude, source_longitude, nearest_neighbors):
+    """
+    Asynchronous version of get_route_coordinates_to_nearest_stations - the routes are awaited at the same time.
+
+    Args:
+        source_latitude: source location - latitude
+        source_longitude: source location - longitude
+        nearest_neighbors: list of station which are the nearest to the source location
+
+    Returns:
+        routes: list with [longitude, latitude] pairs along the route to each station, None if the route could not be found
+    """
+    list_of_arguments = [([source_longitude, source_latitude], [station['lon'], station['lat']], 'foot-walking')
+                         for station in nearest_neighbors]
+    return await run_concurrently(get_route_coordinates, list_of_arguments)
+
+
+async def get_routes_to_nearest_stations_async(source_latitude, source_longitude, nearest_neighbors):
+    """
+    Asynchronous version of get_routes_to_nearest_stations - the routes are awaited at the same time.
+
+    Args:
+        source_latitude: source location - latitude
+        source_longitude: source location - longitude
+        nearest_neighbors: list of station which are the nearest to the source location
+
+    Returns:
+        routes: list with Folium Polyline for each station in nearest_neighbors, None if the route could not be found
+    """
+    routes = await get_route_coordinates_to_nearest_stations_async(source_latitude, source_longitude, nearest_neighbors)
+    return [None if route_coordinates is None else
+            create_route_polyline(route_coordinates, station, iteration, len(nearest_neighbors))
+            for iteration, (station, route_coordinates) in enumerate(zip(nearest_neighbors, routes))]
+
+
+def find_nearest_stations_by_walking_time(source_latitude, source_longitude, df_stations, k, search_for_type,
+                                          spatial_index=None, availability=None,
+                                          number_of_candidates=WALKING_TIME_CANDIDATES):
+    """
+    Find the K stations with the shortest walking time from the source location.
+    The nearest candidates by haversine distance are ranked by the walking time from a single request
+    to the openrouteservice matrix endpoint. If the request fails, the haversine order is kept.
+
+    Args:
+        source_latitude: source location - latitude
+        source_longitude: source location - longitude
+        df_stations: Pandas Dataframe containing the stations' information and status
+        k: Number of nearest neighbours to find
+        search_for_type: type of search - only "Bikes" or "Docks" are possible
+        spatial_index: optional StationIndex built from df_stations
+        availability: optional availability bitmaps of df_stations
+        number_of_candidates: number of the nearest stations by haversine distance which are ranked by walking time
+
+    Returns:
+        nearest_stations: K stations sorted by walking time from the source location
+    """
+    candidates, _ = find_nearest_stations(source_latitude, source_longitude, df_stations,
+                                          max(k, number_of_candidates), search_for_type,
+                                          spatial_index, availability)
+    try:
+        durations = get_durations([source_longitude, source_latitude],
+                                  candidates[['lon', 'lat']].values.tolist(), 'foot-walking')
+        # unreachable stations are placed at the end, equal times keep the haversine order
+        durations = np.array([np.inf if duration is None else duration for duration in durations])
+        candidates = candidates.iloc[np.argsort(durations, kind='stable')]
+    except (ApiError, HTTPError, Timeout, requests.RequestException, KeyError, IndexError) as error:
+        print("Failed to get the walking times. Error:", error)
+
+    return [station for _, station in candidates.head(k).iterrows()]
@@ -1,5 +1,12 @@
 from math import radians, sin, cos, sqrt, atan2
 
+import numpy as np
+
+from metrics import span
+
+EARTH_RADIUS = 6371  # radius of the Earth in kilometers
+BATCH_CHUNK_SIZE = 512  # number of source locations for which the distances are calculated at once
+
 
 def haversine_distance(source_latitude, source_longitude, destination_latitude, destination_longitude):
     """
@@ -31,7 +38,7 @@ def haversine_distance(source_latitude, source_longitude, destination_latitude,
         - https://community.esri.com/t5/coordinate-reference-systems-blog/distance-on-a-sphere-the-haversine-formula/ba-p/902128
         - https://stackoverflow.com/questions/37324332/how-to-find-the-nearest-neighbors-for-latitude-and-longitude-point-on-python
     """
-    R = 6371  # radius of the Earth in kilometers
+    R = EARTH_RADIUS
     dlat = radians(destination_latitude - source_latitude)
     dlon = radians(destination_longitude - source_longitude)
     a = sin(dlat / 2) * sin(dlat / 2) + cos(radians(source_latitude)) * cos(radians(destination_latitude)) * sin(dlon / 2) * sin(dlon / 2)
@@ -40,31 +47,100 @@ def haversine_distance(source_latitude, source_longitude, destination_latitude,
     return distance
 
 
+def haversine_distances(source_latitude, source_longitude, latitudes, longitudes):
+    """
+    Calculate the haversine distance between the source location and many destination locations at once.
+    The formula is the same as in haversine_distance, evaluated on NumPy arrays.
+
+    Args:
+        source_latitude: source location - latitude
+        source_longitude: source location - longitude
+        latitudes: array with latitudes of the destination locations
+        longitudes: array with longitudes of the destination locations
+
+    Returns:
+        distances: array with Haversine distances (in kilometers) between the source and each destination
+    """
+    source_latitude = np.radians(source_latitude)
+    latitudes = np.radians(np.asarray(latitudes, dtype=np.float64))
+    dlat = latitudes - source_latitude
+    dlon = np.radians(np.asarray(longitudes, dtype=np.float64) - source_longitude)
+    a = np.sin(dlat / 2) ** 2 + np.cos(source_latitude) * np.cos(latitudes) * np.sin(dlon / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return EARTH_RADIUS * c
+
+
+def select_k_smallest(distances, k):
+    """
+    Select positions of the K smallest distances without sorting the whole array.
+    Equal distances keep the order of the positions, the same as with a stable sort.
+
+    Args:
+        distances: array with distances
+        k: number of positions to select
+
+    Returns:
+        positions: positions of the K smallest distances sorted by distance
+    """
+    k = min(k, len(distances))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(distances):
+        candidates = np.argpartition(distances, k - 1)[:k]
+        # include the stations with the same distance as the K-th one, as the stable sort would consider them
+        candidates = np.flatnonzero(distances <= distances[candidates].max())
+    else:
+        candidates = np.arange(len(distances))
+    order = np.lexsort((candidates, distances[candidates]))
+    return candidates[order][:k]
+
+
+def get_availability_mask(df_stations, search_for_type, availability=None):
+    """
+    Select stations that fit the search parameters without copying the Pandas Dataframe.
+
+    Args:
+        df_stations: Pandas Dataframe containing the stations' information and status
+        search_for_type: type of search - only "Bikes" or "Docks" are possible, the case of letters is ignored
+        availability: optional availability bitmaps of df_stations, see StationStore.get_availability
+
+    Returns:
+        mask: boolean array with True value for the stations that fit the search, None if all stations fit
+    """
+    search_for_type = search_for_type.lower()
+    if availability is not None:
+        return availability.get(search_for_type)
+
+    if search_for_type == 'bikes':
+        return (df_stations['num_bikes_available'].to_numpy() != 0) & (df_stations['is_renting'].to_numpy() != 0)
+
+    elif search_for_type == 'docks':
+        return (df_stations['num_docks_available'].to_numpy() != 0) & (df_stations['is_returning'].to_numpy() != 0)
+
+    return None
+
+
 def filter_stations(df_stations, search_for_type):
     """
     Filter the Pandas Dataframe with stations' status and information to get stations that fit the search parameters.
 
     Args:
         df_stations: Pandas Dataframe containing the stations' information and status
-        search_for_type: type of search - only "Bikes" or "Docks" are possible
+        search_for_type: type of search - only "Bikes" or "Docks" are possible, the case of letters is ignored
 
     Returns:
         df_stations: filtered Pandas Dataframe containing the stations' information and status
     """
-    if search_for_type == 'Bikes':
-        df_stations = df_stations.drop(df_stations[df_stations.num_bikes_available == 0].index)
-        df_stations = df_stations.drop(df_stations[df_stations.is_renting == 0].index)
-
-    elif search_for_type == 'Docks':
-        df_stations = df_stations.drop(df_stations[df_stations.num_docks_available == 0].index)
-        df_stations = df_stations.drop(df_stations[df_stations.is_returning == 0].index)
-
-    return df_stations
+    mask = get_availability_mask(df_stations, search_for_type)
+    if mask is None:
+        return df_stations
+    return df_stations[mask]
 
 
-def find_nearest_neighbors(source_latitude, source_longitude, df_stations, k, search_for_type):
+def find_nearest_stations(source_latitude, source_longitude, df_stations, k, search_for_type, spatial_index=None,
+                          availability=None):
     """
-    Find the K nearest neighbors to the source location (latitude and longitude) from a list of locations.
+    Find the K nearest stations to the source location (latitude and longitude) together with their distances.
 
     Args:
         source_latitude: Latitude of user location (source)
@@ -72,22 +148,88 @@ def find_nearest_neighbors(source_latitude, source_longitude, df_stations, k, se
         df_stations: Pandas Dataframe containing the information about the stations
         k: Number of nearest neighbours to find
         search_for_type: type of search - only "Bikes" or "Docks" are possible
+        spatial_index: optional StationIndex built from df_stations, used instead of checking every station
+        availability: optional availability bitmaps of df_stations, used instead of checking the status columns
 
     Returns:
-         nearest_stations: K nearest neighbours to the source location
+        nearest_stations: Pandas Dataframe with the K nearest stations sorted by distance from the source location
+        distances: array with the distance (in kilometers) to each of the nearest stations
     """
-    stations_to_analyse = filter_stations(df_stations, search_for_type)
+    with span('filter'):
+        mask = get_availability_mask(df_stations, search_for_type, availability)
 
-    distances = []
-    for index, location in stations_to_analyse.iterrows():
-        lat, lon = location['lat'], location['lon']
-        distance = haversine_distance(source_latitude, source_longitude, lat, lon)
-        distances.append((location, distance))
+    with span('knn'):
+        if spatial_index is not None:
+            positions, distances = spatial_index.query_nearest(source_latitude, source_longitude, k, mask)
+        else:
+            candidates = np.arange(len(df_stations)) if mask is None else np.flatnonzero(mask)
+            distances = haversine_distances(source_latitude, source_longitude,
+                                            df_stations['lat'].to_numpy()[candidates],
+                                            df_stations['lon'].to_numpy()[candidates])
+            selected = select_k_smallest(distances, k)
+            positions, distances = candidates[selected], distances[selected]
 
-    distances.sort(key=lambda x: x[1])  # Sort distances in ascending order
+    return df_stations.iloc[positions], distances
 
-    nearest_stations = []
-    for i in range(k):
-        nearest_stations.append(distances[i][0])
 
-    return nearest_stations
+def find_nearest_stations_batch(source_latitudes, source_longitudes, df_stations, k, search_for_type,
+                                availability=None, chunk_size=BATCH_CHUNK_SIZE):
+    """
+    Find the K nearest stations to many source locations at once.
+    The distances are calculated for a chunk of source locations and all stations in one vectorized step.
+
+    Args:
+        source_latitudes: array with latitudes of the source locations
+        source_longitudes: array with longitudes of the source locations
+        df_stations: Pandas Dataframe containing the information about the stations
+        k: Number of nearest neighbours to find for each source location
+        search_for_type: type of search - only "Bikes" or "Docks" are possible, the case of letters is ignored
+        availability: optional availability bitmaps of df_stations, used instead of checking the status columns
+        chunk_size: number of source locations processed in one step
+
+    Yields:
+        positions: array of shape (number of locations in chunk, K) with positions of the nearest stations in df_stations
+        distances: array of shape (number of locations in chunk, K) with the distance (in kilometers) to each station
+    """
+    mask = get_availability_mask(df_stations, search_for_type, availability)
+    candidates = np.arange(len(df_stations)) if mask is None else np.flatnonzero(mask)
+    latitudes = df_stations['lat'].to_numpy()[candidates]
+    longitudes = df_stations['lon'].to_numpy()[candidates]
+    k = min(k, len(candidates))
+
+    source_latitudes = np.asarray(source_latitudes, dtype=np.float64)
+    source_longitudes = np.asarray(source_longitudes, dtype=np.float64)
+    for start in range(0, len(source_latitudes), chunk_size):
+        distances = haversine_distances(source_latitudes[start:start + chunk_size, np.newaxis],
+                                        source_longitudes[start:start + chunk_size, np.newaxis],
+                                        latitudes, longitudes)
+        if 0 < k < len(candidates):
+            selected = np.sort(np.argpartition(distances, k - 1, axis=1)[:, :k], axis=1)
+        else:
+            selected = np.tile(np.arange(k), (len(distances), 1))
+        selected_distances = np.take_along_axis(distances, selected, axis=1)
+        # sort by distance, equal distances keep the order of positions
+        order = np.argsort(selected_distances, axis=1, kind='stable')
+        yield candidates[np.take_along_axis(selected, order, axis=1)], np.take_along_axis(selected_distances, order, axis=1)
+
+
+def find_nearest_neighbors(source_latitude, source_longitude, df_stations, k, search_for_type, spatial_index=None,
+                           availability=None):
+    """
+    Find the K nearest neighbors to the source location (latitude and longitude) from a list of locations.
+
+    Args:
+        source_latitude: Latitude of user location (source)
+        source_longitude: Longitude of user location (source)
+        df_stations: Pandas Dataframe containing the information about the stations
+        k: Number of nearest neighbours to find
+        search_for_type: type of search - only "Bikes" or "Docks" are possible
+        spatial_index: optional StationIndex built from df_stations, used instead of checking every station
+        availability: optional availability bitmaps of df_stations, used instead of checking the status columns
+
+    Returns:
+         nearest_stations: K nearest neighbours to the source location
+    """
+    nearest_stations, _ = find_nearest_stations(source_latitude, source_longitude, df_stations, k, search_for_type,
+                                                spatial_index, availability)
+    return [station for _, station in nearest_stations.iterrows()]
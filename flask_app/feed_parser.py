@@ -0,0 +1,96 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+try:
+    # orjson decodes the bytes of the response directly and is several times faster than json
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+# fields of the station information feed - (column, path of the field in the station, type of values, default value)
+STATION_INFORMATION_FIELDS = [('station_id', ('station_id',), object, None),
+                              ('lat', ('lat',), np.float64, np.nan),
+                              ('lon', ('lon',), np.float64, np.nan),
+                              ('address', ('address',), object, None),
+                              ('capacity', ('capacity',), np.uint16, 0),
+                              ('is_charging_station', ('is_charging_station',), np.bool_, False),
+                              ('nearby_distance', ('nearby_distance',), np.float32, np.nan)]
+
+# fields of the station status feed, the nested fields are named as by pd.json_normalize
+STATION_STATUS_FIELDS = [('station_id', ('station_id',), object, None),
+                         ('last_reported', ('last_reported',), np.int64, 0),
+                         ('num_bikes_available', ('num_bikes_available',), np.uint16, 0),
+                         ('num_bikes_disabled', ('num_bikes_disabled',), np.uint16, 0),
+                         ('num_docks_available', ('num_docks_available',), np.uint16, 0),
+                         ('num_docks_disabled', ('num_docks_disabled',), np.uint16, 0),
+                         ('is_charging_station', ('is_charging_station',), np.bool_, False),
+                         ('is_renting', ('is_renting',), np.bool_, False),
+                         ('is_returning', ('is_returning',), np.bool_, False),
+                         ('is_installed', ('is_installed',), np.bool_, True),
+                         ('status', ('status',), object, None),
+                         ('num_bikes_available_types.mechanical', ('num_bikes_available_types', 'mechanical'),
+                          np.uint16, 0),
+                         ('num_bikes_available_types.ebike', ('num_bikes_available_types', 'ebike'), np.uint16, 0)]
+
+
+def get_field(station, path, default):
+    """
+    Get the value of a field of one station.
+
+    Args:
+        station: dictionary with the station from the feed
+        path: names of the nested fields, e.g. ('num_bikes_available_types', 'ebike')
+        default: value used when the field is missing or null
+
+    Returns:
+        value: value of the field
+    """
+    for name in path:
+        if not isinstance(station, dict):
+            return default
+        station = station.get(name)
+    return default if station is None else station
+
+
+def parse_stations(stations, fields):
+    """
+    Build a Pandas Dataframe with the selected fields of the stations. Other fields are skipped.
+
+    Args:
+        stations: list of dictionaries with the stations from the feed
+        fields: list of (column, path, type of values, default value), e.g. STATION_STATUS_FIELDS
+
+    Returns:
+        df: Pandas Dataframe with one column for each field
+    """
+    columns = {}
+    for column, path, dtype, default in fields:
+        if len(path) == 1:
+            name = path[0]
+            values = [station.get(name) for station in stations]
+            values = [default if value is None else value for value in values]
+        else:
+            values = [get_field(station, path, default) for station in stations]
+        columns[column] = np.array(values, dtype=dtype)
+    return pd.DataFrame(columns)
+
+
+def parse_feed(content, fields):
+    """
+    Parse a GBFS feed with stations.
+
+    Args:
+        content: bytes of the JSON document
+        fields: list of (column, path, type of values, default value), e.g. STATION_STATUS_FIELDS
+
+    Returns:
+        df: Pandas Dataframe with the stations, see parse_stations
+        last_updated: POSIX timestamp of the last update of the data in the feed, None if it is missing
+        ttl: number of seconds before the data in the feed will be updated again, None if it is missing
+    """
+    document = loads(content)
+    stations = document.get('data', {}).get('stations', [])
+    return parse_stations(stations, fields), document.get('last_updated'), document.get('ttl')
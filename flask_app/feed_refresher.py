@@ -0,0 +1,79 @@
+import threading
+
+# default time between two downloads of the station status (in seconds)
+FEED_REFRESH_INTERVAL = 10
+# upper bound of the time between two attempts after consecutive failures (in seconds)
+FEED_REFRESH_MAX_BACKOFF = 300
+
+
+class FeedRefresher(threading.Thread):
+    """
+    Background thread which downloads the station status on a schedule and replaces the snapshot
+    in StationSnapshotCache once the new one is fully built. Request handlers read the last snapshot
+    and never wait for the network.
+
+    After a failed download the next attempt is delayed exponentially, up to max_backoff seconds.
+    """
+
+    def __init__(self, snapshot_cache, interval=FEED_REFRESH_INTERVAL, max_backoff=FEED_REFRESH_MAX_BACKOFF):
+        """
+        Args:
+            snapshot_cache: StationSnapshotCache refreshed by the thread
+            interval: number of seconds between two downloads of the station status
+            max_backoff: maximum number of seconds between two attempts after failures
+        """
+        super().__init__(name='feed-refresher', daemon=True)
+        self.snapshot_cache = snapshot_cache
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.consecutive_failures = 0
+        self._stop_event = threading.Event()
+
+    def get_delay(self):
+        """
+        Calculate the number of seconds to wait before the next download.
+
+        Returns:
+            delay: the interval, multiplied by 2 for every consecutive failure and limited by max_backoff
+        """
+        if self.consecutive_failures == 0:
+            return self.interval
+        return min(self.interval * 2 ** self.consecutive_failures, self.max_backoff)
+
+    def refresh(self):
+        """
+        Download the station status once and swap in the new snapshot.
+        """
+        try:
+            self.snapshot_cache.refresh()
+            self.consecutive_failures = 0
+        except Exception as error:
+            self.consecutive_failures += 1
+            print("Failed to refresh station status. Error:", error)
+
+    def run(self):
+        self.snapshot_cache.refreshed_in_background = True
+        try:
+            self.refresh()
+            while not self._stop_event.wait(self.get_delay()):
+                self.refresh()
+        finally:
+            self.snapshot_cache.refreshed_in_background = False
+
+    def stop(self):
+        """
+        Stop the thread after the current download.
+        """
+        self._stop_event.set()
+
+    def get_stale_age(self):
+        """
+        Get the age of the data served to the requests.
+
+        Returns:
+            age: number of seconds since the station status was last updated, None if there is no data yet
+        """
+        snapshot = self.snapshot_cache.get_last_snapshot()
+        if snapshot is None:
+            return None
+        return snapshot.age()
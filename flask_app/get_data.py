@@ -1,84 +1,370 @@
+import threading
+import time
+from dataclasses import dataclass
+
 import requests
 import pandas as pd
 import json
 
+from feed_parser import STATION_INFORMATION_FIELDS, STATION_STATUS_FIELDS, parse_feed
+from metrics import span
+from spatial_index import StationIndex
+from station_store import StationStore
+
+# url with json data
+URL_STATION_INFORMATION = "https://tor.publicbikesystem.net/ube/gbfs/v1/en/station_information"
+URL_STATION_STATUS = "https://tor.publicbikesystem.net/ube/gbfs/v1/en/station_status"
+
+# station information changes rarely - it is downloaded again at most once per hour
+STATION_INFORMATION_TTL = 3600
+# lower bound of the time between two downloads of the same feed (in seconds)
+MIN_FEED_TTL = 5
+# time after which a failed download is retried, while the last good copy is still used (in seconds)
+FEED_RETRY_DELAY = 10
+# maximum time to wait for the response of the feed (in seconds)
+FEED_REQUEST_TIMEOUT = 10
+
+
+@dataclass(frozen=True)
+class Feed:
+    """
+    Content of one GBFS feed.
+
+    Attributes:
+        stations: Pandas Dataframe containing the stations from the feed
+        last_updated: POSIX timestamp of the last update of the data in the feed
+        ttl: number of seconds before the data in the feed will be updated again
+    """
+    stations: pd.DataFrame
+    last_updated: int
+    ttl: int
+
+
+@dataclass(frozen=True)
+class StationSnapshot:
+    """
+    Stations' information and status built from one version of both GBFS feeds.
+    The snapshot is shared by all requests - the Dataframe must not be modified in place.
+
+    Attributes:
+        stations: Pandas Dataframe with stations' information and status
+        information_last_updated: POSIX timestamp of the station information used in the snapshot
+        status_last_updated: POSIX timestamp of the station status used in the snapshot
+        created_at: POSIX timestamp of the moment the snapshot was built
+        spatial_index: StationIndex built from the locations of the stations in the snapshot
+        availability: dictionary with availability bitmaps of the stations, see StationStore.get_availability
+    """
+    stations: pd.DataFrame
+    information_last_updated: int
+    status_last_updated: int
+    created_at: float
+    spatial_index: StationIndex
+    availability: dict
+
+    def age(self):
+        """
+        Get the age of the stations' status in the snapshot.
+
+        Returns:
+            age: number of seconds since the station status was last updated
+        """
+        return max(time.time() - self.status_last_updated, 0.0)
 
-def get_data_from_url(url):
+
+def get_feed_from_url(url, fields):
     """
-    Parse JSON data from url.
+    Parse GBFS feed from url.
 
     Args:
         url: Link containing the JSON data
+        fields: list of fields of the stations to parse, see feed_parser.parse_feed
 
     Returns:
-        df: Pandas Dataframe containing the data from JSON
+        feed: Feed with the stations and the update time of the data, None if the request failed
     """
-    response = requests.get(url)
+    with span('feed_fetch'):
+        response = requests.get(url, timeout=FEED_REQUEST_TIMEOUT)
 
     # Check if the request was successful
     if response.status_code == 200:
-        # Parse the JSON data
-        json_data = json.loads(response.text)
-        df = pd.json_normalize(json_data, record_path=['data', 'stations'])
-        return df
+        with span('feed_parse'):
+            df, last_updated, ttl = parse_feed(response.content, fields)
+        return Feed(stations=df,
+                    last_updated=int(time.time() if last_updated is None else last_updated),
+                    ttl=int(ttl or 0))
     else:
         print("Failed to fetch data. Error:", response.status_code)
         return None
 
 
-def format_data(df):
+class FeedCache:
     """
-    Prepare the data for further analysis.
+    Process-wide cache of one GBFS feed.
 
-    Args:
-        df: Pandas dataframe with stations' information and status
+    The feed is downloaded again only when its time to live has passed. Concurrent callers which find
+    the cached feed expired wait for a single download instead of each of them fetching the feed.
+    """
 
-    Returns:
-        df: Pandas dataframe with formatted data
+    def __init__(self, url, fields, ttl=None):
+        """
+        Args:
+            url: Link containing the JSON data
+            fields: list of fields of the stations to parse, see feed_parser.parse_feed
+            ttl: number of seconds the feed is kept in cache, None to use the ttl published in the feed
+        """
+        self.url = url
+        self.ttl = ttl
+        self.fields = fields
+        self._feed = None
+        # error of the last download when there is no feed yet
+        self._error = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        Get the cached feed, download it first if it has expired.
+
+        Returns:
+            feed: the current Feed
+
+        Raises:
+            RuntimeError, requests.RequestException: if the feed was never downloaded - after a failed download,
+                                                     the next one is tried after FEED_RETRY_DELAY seconds
+        """
+        if time.time() < self._expires_at:
+            return self._get_cached_feed()
+
+        with self._lock:
+            # another thread could have downloaded the feed while this one was waiting for the lock
+            if time.time() < self._expires_at:
+                return self._get_cached_feed()
+            try:
+                return self._download()
+            except (requests.RequestException, RuntimeError) as error:
+                # keep the last correct copy of the feed, or the error if there is none, and try again later,
+                # so during an outage the requests do not download the feed one after another
+                if self._feed is None:
+                    self._error = error
+                    self._expires_at = time.time() + FEED_RETRY_DELAY
+                    raise
+                print("Failed to fetch data. Error:", error)
+                self._expires_at = time.time() + FEED_RETRY_DELAY
+                return self._feed
+
+    def _get_cached_feed(self):
+        if self._feed is None:
+            raise RuntimeError("Failed to fetch data from {}, trying again later".format(self.url)) from self._error
+        return self._feed
+
+    def refresh(self):
+        """
+        Download the feed regardless of its time to live.
+
+        Returns:
+            feed: the current Feed
+
+        Raises:
+            RuntimeError, requests.RequestException: if the feed could not be downloaded
+        """
+        with self._lock:
+            return self._download()
+
+    def _download(self):
+        feed = get_feed_from_url(self.url, self.fields)
+        if feed is None:
+            raise RuntimeError("Failed to fetch data from {}".format(self.url))
+
+        now = time.time()
+        if self.ttl is None:
+            # the data is valid until the time announced by the feed
+            expires_at = feed.last_updated + feed.ttl
+        else:
+            expires_at = now + self.ttl
+        # the feed is set first, so the callers which do not wait for the lock never see the new time without it
+        self._feed = feed
+        self._expires_at = max(expires_at, now + MIN_FEED_TTL)
+        return feed
+
+
+class StationSnapshotCache:
+    """
+    Process-wide cache of the stations' information and status.
+
+    Station information and station status are cached separately with their own time to live.
+    The station information is parsed into a StationStore once per version of the feed, and each new
+    version of the station status only updates the stations which reported since the previous one.
+    All requests in between share the same immutable StationSnapshot.
+
+    When the feeds are refreshed in the background (see FeedRefresher), get_snapshot returns
+    the last built snapshot without waiting for the network. A snapshot saved earlier can be set with
+    set_snapshot, so the requests are served before the feeds are downloaded, or when they are not available.
+    Listeners added with add_listener are called with each new snapshot, e.g. to save it.
     """
-    # drop rows with stations out of service
-    df.drop(df[df.status == 'END_OF_LIFE'].index, inplace=True)
-    df.drop(df[df.is_installed == 0].index, inplace=True)  # drop if station is not installed
 
-    # drop unneeded columns
-    columns_to_drop = ['altitude', 'rental_methods', 'obcn', 'is_valet_station', 'cross_street',
-                       '_ride_code_support',
-                       'physical_configuration', 'groups', 'post_code', 'name',
-                       'last_reported', 'last_reported',
-                       'traffic', 'is_installed', 'status']
-    df.drop(columns_to_drop, axis=1, inplace=True)
+    def __init__(self, url_station_information, url_station_status, information_ttl=STATION_INFORMATION_TTL):
+        """
+        Args:
+            url_station_information: Link containing the station information feed
+            url_station_status: Link containing the station status feed
+            information_ttl: number of seconds the station information is kept in cache
+        """
+        # only the fields used by StationStore are parsed
+        self.information = FeedCache(url_station_information, STATION_INFORMATION_FIELDS, ttl=information_ttl)
+        self.status = FeedCache(url_station_status, STATION_STATUS_FIELDS)
+        # the snapshot together with the two feeds it was built from, replaced as a whole
+        self._current = (None, None, None)
+        self._store = None
+        self._lock = threading.Lock()
+        self._listeners = []
+        self.refreshed_in_background = False
+
+    def get_snapshot(self):
+        """
+        Get the snapshot built from the current version of both feeds.
+
+        Returns:
+            snapshot: the current StationSnapshot
+        """
+        if self.refreshed_in_background:
+            snapshot = self.get_last_snapshot()
+            if snapshot is not None:
+                return snapshot
+
+        try:
+            information = self.information.get()
+            status = self.status.get()
+        except (requests.RequestException, RuntimeError):
+            # the feeds were never downloaded - use the snapshot set with set_snapshot, if there is one
+            snapshot = self.get_last_snapshot()
+            if snapshot is None:
+                raise
+            return snapshot
+
+        cached_information, cached_status, snapshot = self._current
+        if cached_information is information and cached_status is status:
+            return snapshot
+
+        return self._build_snapshot(information, status)
+
+    def get_last_snapshot(self):
+        """
+        Get the last built snapshot without checking if the feeds have expired.
+
+        Returns:
+            snapshot: the last StationSnapshot, None if no snapshot was built yet
+        """
+        return self._current[2]
+
+    def set_snapshot(self, snapshot):
+        """
+        Use the snapshot until a new one is built from the feeds, e.g. a snapshot saved before the application started.
+
+        Args:
+            snapshot: StationSnapshot to use
+        """
+        with self._lock:
+            self._current = (None, None, snapshot)
+            self._store = None
+
+    def add_listener(self, listener):
+        """
+        Add a function called with each new snapshot, after it replaced the previous one.
+        The function is called by the thread which built the snapshot, its errors are printed and ignored.
+
+        Args:
+            listener: function taking the new StationSnapshot and the station status Feed it was built from
+        """
+        self._listeners.append(listener)
 
-    # rename columns with available bikes
-    df.rename(columns={'num_bikes_available_types.mechanical': 'num_bikes_available_types_mechanical',
-                       'num_bikes_available_types.ebike': 'num_bikes_available_types_ebike'}, inplace=True)
+    def refresh(self):
+        """
+        Download the station status regardless of its time to live and build a new snapshot.
+        The new snapshot replaces the previous one only after it is fully built.
 
-    df.reset_index(drop=True, inplace=True)
-    return df
+        Returns:
+            snapshot: the current StationSnapshot
+
+        Raises:
+            RuntimeError, requests.RequestException: if the station status could not be downloaded
+        """
+        information = self.information.get()
+        status = self.status.refresh()
+        return self._build_snapshot(information, status)
+
+    def _build_snapshot(self, information, status):
+        with self._lock:
+            cached_information, cached_status, snapshot = self._current
+            is_new = cached_information is not information or cached_status is not status
+            if is_new:
+                with span('feed_merge'):
+                    if cached_information is not information:
+                        self._store = StationStore(information.stations)
+                    self._store.apply_status(status.stations)
+                    df_stations = self._store.to_frame()
+                    # the index depends only on the locations - reuse it until the set of stations changes
+                    if (snapshot is not None and cached_information is information
+                            and snapshot.stations['station_id'].equals(df_stations['station_id'])):
+                        spatial_index = snapshot.spatial_index
+                    else:
+                        spatial_index = StationIndex(df_stations['lat'].to_numpy(), df_stations['lon'].to_numpy())
+                    snapshot = StationSnapshot(stations=df_stations,
+                                               information_last_updated=information.last_updated,
+                                               status_last_updated=status.last_updated,
+                                               created_at=time.time(),
+                                               spatial_index=spatial_index,
+                                               availability=self._store.get_availability())
+                self._current = (information, status, snapshot)
+
+        if is_new:
+            for listener in self._listeners:
+                try:
+                    listener(snapshot, status)
+                except Exception as error:
+                    print("Failed to notify about the new snapshot. Error:", error)
+        return snapshot
+
+
+station_snapshot_cache = StationSnapshotCache(URL_STATION_INFORMATION, URL_STATION_STATUS)
+
+
+def get_snapshot():
+    """
+    Get the current snapshot of the stations' information and status shared by all requests.
+
+    Returns:
+        snapshot: StationSnapshot with stations' information and status
+    """
+    return station_snapshot_cache.get_snapshot()
 
 
 def get_data():
     """
     Get data about the current station information and station status.
-    The data is in JSON format.
+    The data is in JSON format. Both feeds are cached - see StationSnapshotCache.
 
     Returns:
-        df_stations: Pandas dataframe with stations' information and status
+        df_stations: Pandas dataframe with stations' information and status, it must not be modified in place
     """
-    # url with json data
-    url_station_information = "https://tor.publicbikesystem.net/ube/gbfs/v1/en/station_information"
-    url_station_status = "https://tor.publicbikesystem.net/ube/gbfs/v1/en/station_status"
+    return get_snapshot().stations
 
-    # parse the json data
-    df_information = get_data_from_url(url_station_information)
-    df_status = get_data_from_url(url_station_status)
 
-    # prepare data for further analysis
-    df_stations = pd.merge(df_information, df_status, on="station_id")
-    df_stations = format_data(df_stations)
+def get_snapshot_sample(snapshot, number_of_rows=3):
+    """
+    Describe the snapshot for debugging - the columns with their types and the first rows.
 
-    print(df_stations.columns.values)
-    first_three_rows = df_stations.head(3)
+    Args:
+        snapshot: StationSnapshot to describe
+        number_of_rows: number of rows in the sample
 
-    # Save the selected rows to a CSV file
-    first_three_rows.to_csv('first_three_rows_output.csv', index=False)
-    return df_stations
+    Returns:
+        sample: dictionary which can be converted to JSON
+    """
+    df_stations = snapshot.stations
+    return {'number_of_stations': len(df_stations),
+            'information_last_updated': snapshot.information_last_updated,
+            'status_last_updated': snapshot.status_last_updated,
+            'created_at': snapshot.created_at,
+            'age': snapshot.age(),
+            'columns': {column: str(dtype) for column, dtype in df_stations.dtypes.items()},
+            'rows': json.loads(df_stations.head(number_of_rows).to_json(orient='records'))}
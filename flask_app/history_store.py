@@ -0,0 +1,335 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# directory with the history of the station status
+HISTORY_PATH = 'history'
+
+# columns of the station status kept in the history - (column in the history, column in the feed, type of values)
+HISTORY_COLUMNS = [('num_bikes_available', 'num_bikes_available', np.int16),
+                   ('num_bikes_disabled', 'num_bikes_disabled', np.int16),
+                   ('num_docks_available', 'num_docks_available', np.int16),
+                   ('num_docks_disabled', 'num_docks_disabled', np.int16),
+                   ('is_charging_station', 'is_charging_station', np.int8),
+                   ('is_renting', 'is_renting', np.int8),
+                   ('is_returning', 'is_returning', np.int8),
+                   ('num_bikes_available_types_mechanical', 'num_bikes_available_types.mechanical', np.int16),
+                   ('num_bikes_available_types_ebike', 'num_bikes_available_types.ebike', np.int16)]
+
+# columns of the key of each row - the code of the station (see HistoryStore.station_codes) and the report time
+KEY_COLUMNS = [('station_code', np.int32), ('last_reported', np.uint32)]
+# all column files of one day - (column, type of values)
+DAY_COLUMNS = KEY_COLUMNS + [(column, dtype) for column, _, dtype in HISTORY_COLUMNS]
+
+# format of the names of the directories with one day of history
+DAY_FORMAT = '%Y-%m-%d'
+# name of the file locked while the files of a directory are read or written
+LOCK_FILE_NAME = '.lock'
+
+
+def get_day(timestamp):
+    """
+    Get the day (in UTC) of the POSIX timestamp.
+
+    Args:
+        timestamp: POSIX timestamp
+
+    Returns:
+        day: the day in DAY_FORMAT
+    """
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime(DAY_FORMAT)
+
+
+@contextmanager
+def lock_directory(path, shared=False):
+    """
+    Lock the directory for the other processes writing the history, e.g. two processes of the same application.
+    The lock is released when the with block ends.
+
+    Args:
+        path: directory to lock
+        shared: True to allow other readers at the same time - on Windows the lock is always exclusive
+    """
+    with open(os.path.join(path, LOCK_FILE_NAME), 'a+b') as file:
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        else:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def get_column_length(path, dtype):
+    """
+    Get the number of values in a column file, 0 if there is no file.
+    """
+    return os.path.getsize(path) // np.dtype(dtype).itemsize if os.path.exists(path) else 0
+
+
+def read_column(path, dtype, rows=None, length=None):
+    """
+    Read the values of a column file without loading the rest of it into memory.
+
+    Args:
+        path: file with the values of the column
+        dtype: type of values in the file
+        rows: slice or array with positions of the values to read, None to read the whole column
+        length: number of values of the column, the values after it are ignored, None to read all values
+
+    Returns:
+        values: array with the values
+    """
+    file_length = get_column_length(path, dtype)
+    length = file_length if length is None else min(length, file_length)
+    if length == 0:
+        return np.empty(0, dtype=dtype)
+    values = np.memmap(path, dtype=dtype, mode='r', shape=(length,))
+    return np.array(values if rows is None else values[rows])
+
+
+class HistoryStore:
+    """
+    Append-only history of the station status.
+
+    The history is partitioned by day of the report. Each day is a directory with one binary file
+    per column, so a query reads only the columns and days it needs, through memory maps.
+    A row is added only for a new (station_id, last_reported) pair.
+
+    A day which has ended is compacted - its rows are sorted by station and a file with the position of
+    the first row of each station is written, so the history of one station is read as a single slice.
+    The rows of the current day are found by scanning only the station_code column.
+
+    The files are written under a lock of the directory of the history, and each day under a lock of its
+    directory, so the processes sharing the history never see the columns of a day with different lengths.
+    If the process stops between the column files of a batch, the rows after the shortest column are ignored
+    by the queries and overwritten by the next batch. The stations and rows added by the other processes
+    are loaded before each batch, so each report is saved once.
+    """
+
+    def __init__(self, path=HISTORY_PATH):
+        """
+        Args:
+            path: directory with the history
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+
+        # stations get consecutive codes in the order they appear for the first time
+        self.station_codes = {}
+        # the last report saved for each station, used to skip the rows which are already saved
+        self._last_reported = np.empty(0, dtype=np.int64)
+        # number of rows of each day already included in _last_reported
+        self._day_lengths = {}
+        with lock_directory(self.path, shared=True):
+            self._load_station_codes()
+            self._load_last_reported()
+
+    def _get_station_ids_path(self):
+        return os.path.join(self.path, 'station_ids.json')
+
+    def _get_column_path(self, day, column):
+        return os.path.join(self.path, day, column + '.bin')
+
+    def _get_offsets_path(self, day):
+        return os.path.join(self.path, day, 'offsets.npy')
+
+    def _get_day_length(self, day):
+        # number of rows written to all column files of the day
+        return min(get_column_length(self._get_column_path(day, column), dtype) for column, dtype in DAY_COLUMNS)
+
+    def _load_station_codes(self):
+        # the codes are only added, so the codes added by other processes are after the known ones
+        if not os.path.exists(self._get_station_ids_path()):
+            return
+        with open(self._get_station_ids_path()) as file:
+            station_ids = json.load(file)
+        for station_id in station_ids[len(self.station_codes):]:
+            self.station_codes[station_id] = len(self.station_codes)
+        self._last_reported = np.concatenate((self._last_reported,
+                                              np.full(len(self.station_codes) - len(self._last_reported), -1,
+                                                      dtype=np.int64)))
+
+    def _load_last_reported(self):
+        # include the rows added since the last call, also by other processes, in the last report of each station -
+        # all days are checked, because a station can have its last report in any of them
+        for day in self.get_days():
+            # new rows always make the day longer, so the days with the same length are skipped without the lock
+            if self._get_day_length(day) == self._day_lengths.get(day):
+                continue
+            with lock_directory(os.path.join(self.path, day), shared=True):
+                length = self._get_day_length(day)
+                if length == self._day_lengths.get(day):
+                    continue
+                # a compaction reorders the rows, so after a change all rows of the day are read
+                codes = read_column(self._get_column_path(day, 'station_code'), np.int32, length=length)
+                last_reported = read_column(self._get_column_path(day, 'last_reported'), np.uint32, length=length)
+            np.maximum.at(self._last_reported, codes, last_reported.astype(np.int64))
+            self._day_lengths[day] = length
+
+    def get_days(self):
+        """
+        Get the days with history.
+
+        Returns:
+            days: sorted list of days in DAY_FORMAT
+        """
+        return sorted(name for name in os.listdir(self.path) if os.path.isdir(os.path.join(self.path, name)))
+
+    def _get_codes(self, station_ids):
+        new_station_ids = [station_id for station_id in dict.fromkeys(station_ids) if station_id not in self.station_codes]
+        if new_station_ids:
+            for station_id in new_station_ids:
+                self.station_codes[station_id] = len(self.station_codes)
+            with open(self._get_station_ids_path() + '.tmp', 'w') as file:
+                json.dump(list(self.station_codes), file)
+            os.replace(self._get_station_ids_path() + '.tmp', self._get_station_ids_path())
+            self._last_reported = np.concatenate((self._last_reported,
+                                                  np.full(len(new_station_ids), -1, dtype=np.int64)))
+        return np.array([self.station_codes[station_id] for station_id in station_ids], dtype=np.int32)
+
+    def append(self, df_status):
+        """
+        Add the stations' status which was not saved yet.
+
+        Args:
+            df_status: Pandas Dataframe with stations' status from the station status feed
+
+        Returns:
+            number_of_rows: number of added rows
+        """
+        with self._lock, lock_directory(self.path):
+            # the stations and rows added by other processes sharing the history
+            self._load_station_codes()
+            self._load_last_reported()
+            codes = self._get_codes(df_status['station_id'].astype(str).tolist())
+            last_reported = np.nan_to_num(df_status['last_reported'].to_numpy(dtype=np.float64)).astype(np.int64)
+            rows = np.flatnonzero(last_reported > self._last_reported[codes])
+            if len(rows) == 0:
+                return 0
+
+            columns = {'station_code': codes[rows], 'last_reported': last_reported[rows].astype(np.uint32)}
+            for column, feed_column, dtype in HISTORY_COLUMNS:
+                if feed_column in df_status:
+                    values = df_status[feed_column].to_numpy()[rows]
+                    columns[column] = np.nan_to_num(values.astype(np.float64)).astype(dtype)
+                else:
+                    columns[column] = np.zeros(len(rows), dtype=dtype)
+
+            # the rows are added to the day of the report
+            days = np.array([get_day(timestamp) for timestamp in columns['last_reported'].tolist()])
+            for day in np.unique(days).tolist():
+                self._append_to_day(day, {column: values[days == day] for column, values in columns.items()})
+
+            self._last_reported[codes[rows]] = last_reported[rows]
+            self._compact_finished_days()
+            return len(rows)
+
+    def _append_to_day(self, day, columns):
+        os.makedirs(os.path.join(self.path, day), exist_ok=True)
+        with lock_directory(os.path.join(self.path, day)):
+            # new rows break the order of a compacted day - it is compacted again later
+            if os.path.exists(self._get_offsets_path(day)):
+                os.remove(self._get_offsets_path(day))
+            # the rows of an interrupted batch are removed, so the rows of all columns stay aligned
+            length = self._get_day_length(day)
+            for column, values in columns.items():
+                with open(self._get_column_path(day, column), 'ab') as file:
+                    file.truncate(length * values.itemsize)
+                    file.write(values.tobytes())
+            self._day_lengths[day] = length + len(columns['station_code'])
+
+    def _compact_finished_days(self):
+        today = get_day(time.time())
+        for day in self.get_days():
+            if day < today and not os.path.exists(self._get_offsets_path(day)):
+                self._compact_day(day)
+
+    def _compact_day(self, day):
+        with lock_directory(os.path.join(self.path, day)):
+            length = self._get_day_length(day)
+            codes = read_column(self._get_column_path(day, 'station_code'), np.int32, length=length)
+            last_reported = read_column(self._get_column_path(day, 'last_reported'), np.uint32, length=length)
+            order = np.lexsort((last_reported, codes))
+
+            # all sorted columns are written before any of them replaces the original one
+            for column, dtype in DAY_COLUMNS:
+                path = self._get_column_path(day, column)
+                values = read_column(path, dtype, length=length)[order]
+                with open(path + '.tmp', 'wb') as file:
+                    file.write(values.tobytes())
+            for column, _ in DAY_COLUMNS:
+                os.replace(self._get_column_path(day, column) + '.tmp', self._get_column_path(day, column))
+
+            # rows of the station with code c are between offsets[c] and offsets[c + 1]
+            offsets = np.searchsorted(codes[order], np.arange(len(self.station_codes) + 1)).astype(np.int64)
+            np.save(self._get_offsets_path(day), offsets)
+
+    def get_station_history(self, station_id, start, end):
+        """
+        Get the history of one station. Only the days between start and end are read,
+        and in the compacted days only the rows of the station.
+
+        Args:
+            station_id: identification number of the station
+            start: POSIX timestamp - the first report to return
+            end: POSIX timestamp - the reports before this time are returned
+
+        Returns:
+            df_history: Pandas Dataframe with the time of the report (last_reported) and the columns
+                        from HISTORY_COLUMNS, sorted by last_reported
+        """
+        dtypes = dict([KEY_COLUMNS[1]] + [(column, dtype) for column, _, dtype in HISTORY_COLUMNS])
+        columns = {column: [] for column in dtypes}
+        code = self.station_codes.get(str(station_id))
+
+        first_day = get_day(max(start, 0))
+        last_day = get_day(max(end, 0))
+        with self._lock:
+            for day in self.get_days() if code is not None else []:
+                if not first_day <= day <= last_day:
+                    continue
+                with lock_directory(os.path.join(self.path, day), shared=True):
+                    self._read_station_rows(day, code, start, end, dtypes, columns)
+
+        df_history = pd.DataFrame({column: np.concatenate(values) if values else np.empty(0, dtype=dtypes[column])
+                                   for column, values in columns.items()})
+        return df_history.sort_values('last_reported', ignore_index=True)
+
+    def _read_station_rows(self, day, code, start, end, dtypes, columns):
+        # only the rows written to all columns are read, see the description of the class
+        length = self._get_day_length(day)
+        if os.path.exists(self._get_offsets_path(day)):
+            offsets = np.load(self._get_offsets_path(day), mmap_mode='r')
+            if code + 1 >= len(offsets):
+                return
+            rows = slice(int(offsets[code]), int(offsets[code + 1]))
+        else:
+            rows = np.flatnonzero(read_column(self._get_column_path(day, 'station_code'), np.int32,
+                                              length=length) == code)
+
+        last_reported = read_column(self._get_column_path(day, 'last_reported'), np.uint32, rows, length)
+        selected = (last_reported >= start) & (last_reported < end)
+        for column, dtype in dtypes.items():
+            values = last_reported if column == 'last_reported' else \
+                read_column(self._get_column_path(day, column), dtype, rows, length)
+            columns[column].append(values[selected])
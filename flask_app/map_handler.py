@@ -1,94 +1,136 @@
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
 import folium
+import numpy as np
 from jinja2 import Template
 from folium.map import Marker
-from directions_to_stations_handler import get_routes_between_source_location_and_station
-
-
-def create_popup_for_station(station, source_latitude, source_longitude):
+from folium.plugins import FastMarkerCluster, MarkerCluster
+from directions_to_stations_handler import (get_color_based_on_iteration, get_opacity_based_on_iteration,
+                                             get_route_coordinates_to_nearest_stations, get_routes_to_nearest_stations,
+                                             get_weight_based_on_iteration)
+from distance_calculator import haversine_distances
+from metrics import span
+
+# location of the center of the base map - Toronto
+BASE_MAP_LOCATION = [43.7, -79.4]
+# maximum number of base maps kept in memory, one for each bike-share system
+BASE_MAP_CACHE_SIZE = 16
+# columns with the status of the station shown in the popup of the base map
+STATUS_COLUMNS_IN_POPUP = ['num_bikes_available', 'num_bikes_available_types_mechanical',
+                           'num_bikes_available_types_ebike', 'num_docks_available']
+
+# ways of adding the stations to the map:
+# 'markers' - one marker with a popup for each station
+# 'cluster' - the same markers grouped in clusters (MarkerCluster)
+# 'fast_cluster' - clusters with markers created by the browser from arrays with the stations' data (FastMarkerCluster)
+MARKER_MODES = ('markers', 'cluster', 'fast_cluster')
+# columns of the station sent to the browser in the 'fast_cluster' mode, the order is used by FAST_CLUSTER_CALLBACK
+FAST_CLUSTER_COLUMNS = ['lat', 'lon', 'station_id', 'address', 'num_bikes_available',
+                        'num_bikes_available_types_mechanical', 'num_bikes_available_types_ebike',
+                        'num_docks_available']
+# JavaScript function creating the marker and the popup of one station in the 'fast_cluster' mode,
+# the popup has the same content as the one rendered by render_station_popup
+FAST_CLUSTER_CALLBACK = """function (row) {
+    var names = ['Address', 'Bikes available', 'Bikes available - mechanical', 'Bikes available - ebike',
+                 'Docks available'];
+    var cell = '<td class="popupRow" style="background-color: #4ce8fd;"><span>';
+    var rows = '';
+    for (var i = 0; i < names.length; i++) {
+        rows += '<tr>' + cell + names[i] + '</span></td>' + cell + row[i + 3] + '</span></td></tr>';
+    }
+    var arguments_list = row[0] + ', ' + row[1] + ', source_location[0], source_location[1]';
+    rows += '<tr>' + cell + 'Directions</span></td>' + cell
+          + '<button onclick="redirect_to_directions(' + arguments_list + ', 1)">Cycling</button> '
+          + '<button onclick="redirect_to_directions(' + arguments_list + ', 2)">Walking</button></span></td></tr>';
+    var popup = '<h1 class="tableTitle"> Station: ' + row[2] + '</h1><table id="popupTable"><thead><tr>'
+              + '<th id="RefNoHeader" class="tableHeader">Information</th>'
+              + '<th id="OfferTypeHeader" class="tableHeader">Value</th>'
+              + '</tr></thead><tbody>' + rows + '</tbody></table>';
+
+    var icon = L.AwesomeMarkers.icon({icon: 'bicycle', prefix: 'fa', markerColor: 'blue', iconColor: 'white'});
+    return L.marker(new L.LatLng(row[0], row[1]), {icon: icon}).bindPopup(popup, {maxWidth: 400});
+}"""
+
+# columns of the station shown in the popup, in the order of arguments of render_station_popup
+POPUP_COLUMNS = ['station_id', 'lat', 'lon', 'address', 'num_bikes_available', 'num_bikes_available_types_mechanical',
+                 'num_bikes_available_types_ebike', 'num_docks_available']
+# names of the rows of the popup table
+POPUP_ROW_NAMES = ['Address', 'Bikes available', 'Bikes available - mechanical', 'Bikes available - ebike',
+                   'Docks available']
+# maximum number of popups kept in memory - enough for every station of a few snapshots
+POPUP_CACHE_SIZE = 8192
+# popup of one station, the direction buttons read the source location from the source_location variable of the map,
+# so the popup depends only on the station
+STATION_POPUP_TEMPLATE = Template("""\
+<h1 class="tableTitle"> Station: {{ station_id }}</h1>
+<table id="popupTable">
+    <thead>
+        <tr>
+            <th id="RefNoHeader" class="tableHeader">Information</th>
+            <th id="OfferTypeHeader" class="tableHeader">Value</th>
+        </tr>
+    </thead>
+    <tbody>
+    {%- for name, value in rows %}
+        <tr><td class="popupRow" style="background-color: {{ color }};"><span>{{ name }}</span></td>\
+<td class="popupRow" style="background-color: {{ color }};"><span>{{ value }}</span></td></tr>
+    {%- endfor %}
+        <tr><td class="popupRow" style="background-color: {{ color }};"><span>Directions</span></td>\
+<td class="popupRow" style="background-color: {{ color }};"><span>\
+<button onclick="redirect_to_directions({{ latitude }}, {{ longitude }}, source_location[0], source_location[1], 1)">Cycling</button> \
+<button onclick="redirect_to_directions({{ latitude }}, {{ longitude }}, source_location[0], source_location[1], 2)">Walking</button>\
+</span></td></tr>
+    </tbody>
+</table>""")
+
+# the last base map of each system, identified by the url of its status, together with the spatial index
+# of the stations it was built for - the least recently used map is removed above BASE_MAP_CACHE_SIZE maps
+_base_maps = OrderedDict()
+_base_maps_lock = threading.Lock()
+
+
+@lru_cache(maxsize=POPUP_CACHE_SIZE)
+def render_station_popup(station_id, latitude, longitude, address, num_bikes_available,
+                         num_bikes_available_types_mechanical, num_bikes_available_types_ebike, num_docks_available):
     """
-    Create a popup information to the marker representing one station.
+    Render the HTML code of the popup of one station.
+    The result is memoized, so the popups of stations whose information and status have not changed
+    are rendered only once.
 
     Args:
-        station: row in the Dataframe containing information and status of one station
-        source_latitude: source location - latitude
-        source_longitude: source location - longitude
+        station_id: identification number of the station
+        latitude: location of the station - latitude
+        longitude: location of the station - longitude
+        address: address of the station
+        num_bikes_available: number of available bikes
+        num_bikes_available_types_mechanical: number of available mechanical bikes
+        num_bikes_available_types_ebike: number of available ebikes
+        num_docks_available: number of available docks
 
     Returns:
-         popup: html popup code
-    """
-    table_html = """
-    <table id="popupTable">
-            <thead>
-                  <tr>
-                    <th id="RefNoHeader" class="tableHeader">Information</th>
-                    <th id="OfferTypeHeader" class="tableHeader">Value</th>
-                  </tr>
-            </thead>
-                <tbody>               
-    """
-    color = '#4ce8fd'
-    values = ['address', 'num_bikes_available',
-              'num_bikes_available_types_mechanical', 'num_bikes_available_types_ebike',
-              'num_docks_available']
-    values_names = ['Address', 'Bikes available',
-                    'Bikes available - mechanical', 'Bikes available - ebike',
-                    'Docks available']
-    for index, value in enumerate(values):
-        row = "<tr>"
-        row += '<td class="popupRow" style="background-color: {};"><span>{}</span></td>'.format(color, values_names[index])
-        row += '<td class="popupRow" style="background-color: {};"><span>{}</span></td>'.format(color, station[value])
-        row += "</tr>"
-        table_html += row
-
-    table_html = add_buttons_with_directions(source_latitude, source_longitude, station, table_html)
-
-    table_html += """ </tbody> </table>"""
-
-    popup_html_code = """<!DOCTYPE html>
-        <html>
-        <head>
-        </head>
-        <body>
-            <h1 class="tableTitle"> Station: """ + str(station['station_id']) + """</h1>""" + table_html + """
-        </body>
-        </html>
-        """
-    popup = folium.Popup(folium.Html(popup_html_code, script=True, width=400))
-    return popup
+        popup_html_code: HTML code of the popup
+    """
+    values = [address, num_bikes_available, num_bikes_available_types_mechanical, num_bikes_available_types_ebike,
+              num_docks_available]
+    return STATION_POPUP_TEMPLATE.render(station_id=station_id, latitude=latitude, longitude=longitude,
+                                         rows=zip(POPUP_ROW_NAMES, values), color='#4ce8fd')
 
 
-def add_buttons_with_directions(source_latitude, source_longitude, station, table_html):
+def create_station_popups(df_stations):
     """
-    Add buttons which redirect to Google Maps and show the directions from source location to destination location.
-    Two buttons are added - Walking and Cycling button.
+    Create the popups of all stations.
+
     Args:
-        source_latitude: source location - latitude
-        source_longitude: source location - longitude
-        station: row in the Dataframe containing information and status of one station
-        table_html: code representing HTML table with station's details
+        df_stations: Pandas Dataframe containing the stations' information and status
 
     Returns:
-        table_html: updated HTML code of table with station's details
+        popups: list with HTML code of the popup of each station
     """
-    dest_latitude, dest_longitude = station['lat'], station['lon']
-
-    # create html code for buttons
-    cycling_travel_mode = '1'
-    cycling_button = '<button onclick="redirect_to_directions({}, {}, {}, {}, {})">Cycling</button>' \
-        .format(dest_latitude, dest_longitude, source_latitude, source_longitude, cycling_travel_mode)
-
-    walk_travel_mode = '2'
-    walk_button = '<button onclick="redirect_to_directions({}, {}, {}, {}, {})">Walking</button>' \
-        .format(dest_latitude, dest_longitude, source_latitude, source_longitude, walk_travel_mode)
-
-    # add new row in table
-    row = "<tr>"
-    row += '<td class="popupRow" style="background-color: #4ce8fd;"><span>Directions</span></button></td>'
-    row += '<td class="popupRow" style="background-color: #4ce8fd;"><span>{} {}</span></td>'.format(cycling_button, walk_button)
-    row += "</tr>"
-
-    table_html += row
-    return table_html
+    columns = [df_stations[column].tolist() for column in POPUP_COLUMNS]
+    return [render_station_popup(*values) for values in zip(*columns)]
 
 
 def add_styles_to_map(folium_map):
@@ -133,6 +175,50 @@ def add_styles_to_map(folium_map):
     return folium_map
 
 
+class SourceLocationMarker(Marker):
+    """
+    Draggable marker of the source location.
+    A click on the marker copies its location to the search form. The map also gets the functions
+    used by the marker and by the direction buttons in the popups of the stations.
+
+    The template is compiled once, when the module is imported, and it is used only by this class,
+    so the other markers and maps created at the same time are not affected.
+    """
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            function copy_location_to_form_fields(e) {
+                var point = e.latlng;
+
+                var input_field_lat = document.getElementById("lat");
+                input_field_lat.value = point['lat'].toFixed(6);
+
+                var input_field_lon = document.getElementById("lon");
+                input_field_lon.value = point['lng'].toFixed(6);
+            }
+
+            function redirect_to_directions(dest_latitude, dest_longitude, source_latitude, source_longitude, travel_mode) {
+                url= 'https://www.google.com/maps/dir/' + dest_latitude + ',' + dest_longitude + '/' + source_latitude + ',' + source_longitude + '/data=!3m1!4b1!4m2!4m1!3e' + travel_mode + '?entry=ttu';
+                window.open(url, '_blank');
+            }
+
+            var {{ this.get_name() }} = L.marker(
+                {{ this.location|tojson }},
+                {{ this.options|tojson }}
+            ).addTo({{ this._parent.get_name() }}).on('click', copy_location_to_form_fields);
+        {% endmacro %}
+        """)
+
+    def __init__(self, location, popup=None, icon=None):
+        """
+        Args:
+            location: [latitude, longitude] of the source location
+            popup: optional folium Popup of the marker
+            icon: optional folium Icon of the marker
+        """
+        super().__init__(location=location, popup=popup, icon=icon, draggable=True)
+        self._name = 'SourceLocationMarker'
+
+
 def add_marker_with_source_location(map_with_stations, source_latitude, source_longitude):
     """
     Add marker with source location to the Folium map which contains the information about stations.
@@ -145,42 +231,6 @@ def add_marker_with_source_location(map_with_stations, source_latitude, source_l
     Returns:
         map_with_stations: Folium map with marker of the source location
     """
-    # Modify Marker template to include the onClick event
-    click_template = """{% macro script(this, kwargs) %}
-            var {{ this.get_name() }} = L.marker(
-                {{ this.location|tojson }},
-                {{ this.options|tojson }}
-            ).addTo({{ this._parent.get_name() }}).on('click', copy_location_to_form_fields);
-        {% endmacro %}"""
-
-    # Change template to custom template
-    Marker._template = Template(click_template)
-
-    # Create the onClick listener function as a branca element and add to the map html
-    click_js = """
-                    function copy_location_to_form_fields(e) {
-                        var point = e.latlng; 
-                        
-                        var value_lat = point['lat'];
-                        var input_field_lat = document.getElementById("lat");
-                        input_field_lat.value = value_lat.toFixed(6);
-                        
-                        var value_lon = point['lng'];
-                        var input_field_lon = document.getElementById("lon");
-                        input_field_lon.value = value_lon.toFixed(6);
-                    }    
-                      
-                    function redirect_to_directions(dest_latitude, dest_longitude, source_latitude, source_longitude, travel_mode) {                
-                        url= 'https://www.google.com/maps/dir/' + dest_latitude + ',' + dest_longitude + '/' + source_latitude + ',' + source_longitude + '/data=!3m1!4b1!4m2!4m1!3e' + travel_mode + '?entry=ttu';
-                        window.open(url, '_blank');
-                    }                   
-                    """
-
-    e = folium.Element(click_js)
-    html = map_with_stations.get_root()
-    html.script.get_root().render()
-    html.script._children[e.get_name()] = e
-
     popup_html_code = """
                         <p id="marker_source_location"
                         style="font-size:1.3em; text-align:center;font-weight: bolder;margin-left: auto; margin-right: auto;">
@@ -189,16 +239,58 @@ def add_marker_with_source_location(map_with_stations, source_latitude, source_l
                       """
     popup = folium.Popup(folium.Html(popup_html_code, script=True, width=130))
 
-    # Add marker (click on map an alert will display with latlng values)
-    folium.Marker(location=[source_latitude, source_longitude],
-                  popup=popup,
-                  icon=folium.Icon(color="red", icon='crosshairs', prefix='fa'),
-                  draggable=True).add_to(map_with_stations)
+    # click on the marker copies its location to the search form
+    SourceLocationMarker(location=[source_latitude, source_longitude],
+                         popup=popup,
+                         icon=folium.Icon(color="red", icon='crosshairs', prefix='fa')).add_to(map_with_stations)
 
     return map_with_stations
 
 
-def create_map_with_stations(df_stations, nearest_neighbors, source_latitude, source_longitude):
+def get_nearest_station_ranks(nearest_neighbors):
+    """
+    Map the nearest stations to their positions in the list of the nearest stations.
+
+    Args:
+        nearest_neighbors: list of station which are the nearest to the source location
+
+    Returns:
+        ranks: dictionary with the rank of each station (0 for the nearest one), the keys are the identification
+               numbers of stations
+    """
+    return {nearest_neighbor['station_id']: rank for rank, nearest_neighbor in enumerate(nearest_neighbors)}
+
+
+def select_stations_within_radius(df_stations, nearest_neighbors, source_latitude, source_longitude, radius,
+                                  spatial_index=None):
+    """
+    Select the stations within the radius from the source location. The nearest stations are always selected.
+
+    Args:
+        df_stations: Pandas Dataframe containing the stations' information and status
+        nearest_neighbors: list of station which are the nearest to the source location
+        source_latitude: source location - latitude
+        source_longitude: source location - longitude
+        radius: radius around the source location (in kilometers)
+        spatial_index: optional StationIndex built from the locations of the stations in df_stations
+
+    Returns:
+        df_stations: Pandas Dataframe with the selected stations
+    """
+    if spatial_index is not None and len(spatial_index) == len(df_stations):
+        positions, _ = spatial_index.query_radius(source_latitude, source_longitude, radius)
+        within_radius = np.zeros(len(df_stations), dtype=bool)
+        within_radius[positions] = True
+    else:
+        within_radius = haversine_distances(source_latitude, source_longitude,
+                                            df_stations['lat'].to_numpy(), df_stations['lon'].to_numpy()) <= radius
+
+    within_radius |= df_stations['station_id'].isin(get_nearest_station_ranks(nearest_neighbors)).to_numpy()
+    return df_stations[within_radius]
+
+
+def create_map_with_stations(df_stations, nearest_neighbors, source_latitude, source_longitude,
+                             marker_mode='markers', radius=None, spatial_index=None, routes=None):
     """
     Create a map with stations and the marker of user.
     The K nearest stations to the user's position are in a different color than other stations.
@@ -208,38 +300,207 @@ def create_map_with_stations(df_stations, nearest_neighbors, source_latitude, so
         nearest_neighbors: list of station which are the nearest to the source location
         source_latitude: source location - latitude
         source_longitude: source location - longitude
+        marker_mode: way of adding the stations to the map, one of MARKER_MODES
+        radius: optional radius around the source location (in kilometers), only the stations within it are shown
+        spatial_index: optional StationIndex of df_stations, used to select the stations within the radius
+        routes: optional list with Folium Polyline for each station in nearest_neighbors, e.g. from
+                get_routes_to_nearest_stations_async, None to request the routes here
+
+    Returns:
+        map_as_html: the map rendered to HTML
     """
+    if marker_mode not in MARKER_MODES:
+        raise ValueError('marker_mode must be one of {}, got {!r}'.format(MARKER_MODES, marker_mode))
+
     map_with_stations = folium.Map(
         width='70%', height='60%',
         location=[source_latitude, source_longitude],  # 43.7, -79.4
         zoom_start=14)
 
-    for index, station in df_stations.iterrows():
-        popup = create_popup_for_station(station, source_latitude, source_longitude)
+    if radius is not None:
+        df_stations = select_stations_within_radius(df_stations, nearest_neighbors, source_latitude, source_longitude,
+                                                    radius, spatial_index)
+
+    # request all routes at once - a route which could not be found is skipped
+    if routes is None:
+        with span('routes'):
+            routes = get_routes_to_nearest_stations(source_latitude, source_longitude, nearest_neighbors)
+
+    for route in routes:
+        if route is not None:
+            route.add_to(map_with_stations)
+
+    with span('map_build'):
+        # the nearest stations are always added directly to the map, so they are never hidden in a cluster
+        stations_layer = map_with_stations
+        if marker_mode == 'cluster':
+            stations_layer = MarkerCluster(name='Stations').add_to(map_with_stations)
+
+        nearest_station_ranks = get_nearest_station_ranks(nearest_neighbors)
+        is_nearest = df_stations['station_id'].isin(nearest_station_ranks).to_numpy()
+
+        if marker_mode == 'fast_cluster':
+            # the markers of other stations are created by the browser
+            df_clustered = df_stations[~is_nearest]
+            columns = [df_clustered[column].tolist() for column in FAST_CLUSTER_COLUMNS]
+            FastMarkerCluster([list(row) for row in zip(*columns)], callback=FAST_CLUSTER_CALLBACK,
+                              name='Stations').add_to(map_with_stations)
+            df_stations = df_stations[is_nearest]
+            is_nearest = np.ones(len(df_stations), dtype=bool)
+
+        # the popups read the source location from this variable
+        map_with_stations.get_root().script.add_child(
+            folium.Element('var source_location = {};'.format(json.dumps([source_latitude, source_longitude]))))
+
+        for latitude, longitude, popup_html_code, nearest in zip(df_stations['lat'].tolist(),
+                                                                 df_stations['lon'].tolist(),
+                                                                 create_station_popups(df_stations),
+                                                                 is_nearest.tolist()):
+            popup = folium.Popup(folium.Html(popup_html_code, script=True, width=400))
+
+            # if the station is nearby, set the color to green
+            # otherwise set color to blue
+            color = 'green' if nearest else 'blue'
+            folium.Marker(location=[latitude, longitude], popup=popup,
+                          icon=folium.Icon(color=color, icon='bicycle', prefix='fa')) \
+                .add_to(map_with_stations if nearest else stations_layer)
+
+        map_with_stations = add_marker_with_source_location(map_with_stations, source_latitude, source_longitude)
 
-        latitude, longitude = station['lat'], station['lon']
+    # TODO: add filters to select specific types of markers and routes that are visible
+    # map_with_stations.add_child(folium.LayerControl())
 
-        # if the station is nearby, set the color to green
-        # otherwise set color to blue
-        color = 'blue'
-        for iteration, nearest_neighbor in enumerate(nearest_neighbors):
-            if nearest_neighbor['station_id'] == station['station_id']:
-                color = 'green'
-                path_visualisation = get_routes_between_source_location_and_station(source_latitude, source_longitude, station, iteration,
-                                                                                    len(nearest_neighbors))
-                path_visualisation.add_to(map_with_stations)
+    with span('map_render'):
+        map_as_html = map_with_stations.get_root().render()
+        map_as_html = add_styles_to_map(map_as_html)
+    return map_as_html
 
-        folium.Marker(location=[latitude, longitude], popup=popup,
-                      icon=folium.Icon(color=color, icon='bicycle', prefix='fa')).add_to(map_with_stations)
 
-    map_with_stations = add_marker_with_source_location(map_with_stations, source_latitude, source_longitude)
+def create_stations_geojson(df_stations):
+    """
+    Create GeoJSON with the locations of the stations.
 
-    # TODO: add filters to select specific types of markers and routes that are visible
-    # map_with_stations.add_child(folium.LayerControl())
+    Args:
+        df_stations: Pandas Dataframe containing the stations' information and status
+
+    Returns:
+        stations: GeoJSON FeatureCollection with one point for each station
+    """
+    features = [{'type': 'Feature',
+                 'geometry': {'type': 'Point', 'coordinates': [longitude, latitude]},
+                 'properties': {'station_id': station_id, 'address': address}}
+                for station_id, latitude, longitude, address in zip(df_stations['station_id'].tolist(),
+                                                                    df_stations['lat'].tolist(),
+                                                                    df_stations['lon'].tolist(),
+                                                                    df_stations['address'].tolist())]
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def create_base_map(df_stations, script_url, status_url, overlay_url):
+    """
+    Create a map with markers of all stations, which does not depend on the search.
+    The status of the stations and the search results are downloaded by the browser from status_url and overlay_url.
+
+    Args:
+        df_stations: Pandas Dataframe containing the stations' information and status
+        script_url: url of the JavaScript file with functions of the map (stations_map_functions.js)
+        status_url: url returning the current status of the stations, see create_stations_status
+        overlay_url: url returning the search results after appending the token, see create_stations_overlay
+
+    Returns:
+        map_as_html: the map rendered to HTML
+    """
+    base_map = folium.Map(width='100%', height='100%', location=BASE_MAP_LOCATION, zoom_start=12)
+
+    html = base_map.get_root()
+    html.header.add_child(folium.JavascriptLink(script_url))
+    script = "initialise_stations_map({}, {}, {}, {});".format(base_map.get_name(),
+                                                               json.dumps(create_stations_geojson(df_stations)),
+                                                               json.dumps(status_url), json.dumps(overlay_url))
+    html.script.add_child(folium.Element(script))
 
-    map_as_html = map_with_stations.get_root().render()
-    map_as_html = add_styles_to_map(map_as_html)
+    map_as_html = html.render()
+    return add_styles_to_map(map_as_html)
 
-    # save the map in file
-    with open('templates/stations_map.html', "w", encoding='utf-8') as file:
-        file.write(map_as_html)
+
+def get_base_map(df_stations, spatial_index, script_url, status_url, overlay_url):
+    """
+    Get the base map, create it again only if the stations have changed.
+    The spatial index of the snapshot is rebuilt only when the stations change, so it identifies the version of stations.
+    One map is kept for each status_url, so the maps of several bike-share systems do not replace each other.
+
+    Args:
+        df_stations: Pandas Dataframe containing the stations' information and status
+        spatial_index: StationIndex of the snapshot containing df_stations
+        script_url: url of the JavaScript file with functions of the map (stations_map_functions.js)
+        status_url: url returning the current status of the stations
+        overlay_url: url returning the search results after appending the token
+
+    Returns:
+        map_as_html: the map rendered to HTML
+    """
+    with _base_maps_lock:
+        cached_spatial_index, map_as_html = _base_maps.get(status_url, (None, None))
+        if cached_spatial_index is spatial_index:
+            _base_maps.move_to_end(status_url)
+            return map_as_html
+
+    map_as_html = create_base_map(df_stations, script_url, status_url, overlay_url)
+    with _base_maps_lock:
+        _base_maps[status_url] = (spatial_index, map_as_html)
+        _base_maps.move_to_end(status_url)
+        while len(_base_maps) > BASE_MAP_CACHE_SIZE:
+            _base_maps.popitem(last=False)
+    return map_as_html
+
+
+def create_stations_status(df_stations):
+    """
+    Create the status of the stations shown in the popups of the base map.
+
+    Args:
+        df_stations: Pandas Dataframe containing the stations' information and status
+
+    Returns:
+        status: dictionary with the values of STATUS_COLUMNS_IN_POPUP for each station, the keys are the identification
+                numbers of stations
+    """
+    columns = [df_stations[column].tolist() for column in STATUS_COLUMNS_IN_POPUP]
+    return {station_id: values for station_id, *values in zip(df_stations['station_id'].tolist(), *columns)}
+
+
+def create_stations_overlay(nearest_neighbors, source_latitude, source_longitude, routes=None):
+    """
+    Create GeoJSON with the search results - the nearest stations, routes to them and the source location.
+
+    Args:
+        nearest_neighbors: list of station which are the nearest to the source location
+        source_latitude: source location - latitude
+        source_longitude: source location - longitude
+        routes: optional list with [longitude, latitude] pairs along the route to each station, e.g. from
+                get_route_coordinates_to_nearest_stations_async, None to request the routes here
+
+    Returns:
+        overlay: GeoJSON FeatureCollection with the search results and the source location as [latitude, longitude]
+    """
+    features = [{'type': 'Feature',
+                 'geometry': {'type': 'Point', 'coordinates': [source_longitude, source_latitude]},
+                 'properties': {'kind': 'source'}}]
+
+    if routes is None:
+        with span('routes'):
+            routes = get_route_coordinates_to_nearest_stations(source_latitude, source_longitude, nearest_neighbors)
+    for iteration, (station, route) in enumerate(zip(nearest_neighbors, routes)):
+        station_id = str(station['station_id'])
+        features.append({'type': 'Feature',
+                         'geometry': {'type': 'Point', 'coordinates': [float(station['lon']), float(station['lat'])]},
+                         'properties': {'kind': 'station', 'station_id': station_id, 'address': station['address']}})
+        if route is not None:
+            style = {'color': get_color_based_on_iteration(iteration, len(nearest_neighbors)),
+                     'weight': get_weight_based_on_iteration(iteration, len(nearest_neighbors)),
+                     'opacity': get_opacity_based_on_iteration(iteration, len(nearest_neighbors))}
+            features.append({'type': 'Feature',
+                             'geometry': {'type': 'LineString', 'coordinates': route},
+                             'properties': {'kind': 'route', 'station_id': station_id, 'style': style}})
+
+    return {'type': 'FeatureCollection', 'features': features, 'source': [source_latitude, source_longitude]}
@@ -0,0 +1,61 @@
+import secrets
+import threading
+from collections import OrderedDict
+
+# maximum number of maps kept in memory
+MAP_STORE_SIZE = 20
+
+
+class MapStore:
+    """
+    Bounded in-memory store of the maps generated for the users - rendered to HTML or as GeoJSON overlays.
+    Each map gets a random token, which is passed in the url of the page displaying it.
+    When the store is full, the least recently used map is removed.
+    """
+
+    def __init__(self, size=MAP_STORE_SIZE):
+        """
+        Args:
+            size: maximum number of maps kept in memory
+        """
+        self.size = size
+        self._maps = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, map_as_html):
+        """
+        Put the map in the store.
+
+        Args:
+            map_as_html: Folium map rendered to HTML, or the GeoJSON overlay
+
+        Returns:
+            token: token identifying the map
+        """
+        token = secrets.token_urlsafe(16)
+        with self._lock:
+            self._maps[token] = map_as_html
+            while len(self._maps) > self.size:
+                self._maps.popitem(last=False)
+        return token
+
+    def get(self, token):
+        """
+        Get the map from the store.
+
+        Args:
+            token: token identifying the map
+
+        Returns:
+            map_as_html: Folium map rendered to HTML or the GeoJSON overlay, None if there is no map with this token
+        """
+        with self._lock:
+            map_as_html = self._maps.get(token)
+            if map_as_html is not None:
+                self._maps.move_to_end(token)
+            return map_as_html
+
+
+stations_map_store = MapStore()
+directions_map_store = MapStore()
+stations_overlay_store = MapStore(size=1000)
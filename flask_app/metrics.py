@@ -0,0 +1,151 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# upper bounds of the buckets of the latency histograms (in seconds)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# spans of the request handled in the current thread or task, None outside of a request
+_request_spans = ContextVar('request_spans', default=None)
+
+
+class Histogram:
+    """
+    Latency histograms in the Prometheus format, one for each value of a label.
+    Recording a value takes a lock and a binary search, so the histograms can be kept on in production.
+    """
+
+    def __init__(self, name, description, label, buckets=LATENCY_BUCKETS):
+        """
+        Args:
+            name: name of the metric, e.g. 'bikes_stage_duration_seconds'
+            description: description shown in the HELP line
+            label: name of the label separating the histograms, e.g. 'stage'
+            buckets: sorted upper bounds of the buckets
+        """
+        self.name = name
+        self.description = description
+        self.label = label
+        self.buckets = tuple(buckets)
+        # label value -> [counts of the buckets (the last one is +Inf), sum of values]
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        """
+        Record one value.
+
+        Args:
+            label_value: value of the label, e.g. 'knn'
+            value: recorded value (in seconds)
+        """
+        bucket = bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self._histograms.get(label_value)
+            if histogram is None:
+                histogram = self._histograms[label_value] = [[0] * (len(self.buckets) + 1), 0.0]
+            histogram[0][bucket] += 1
+            histogram[1] += value
+
+    def render(self):
+        """
+        Render the histograms in the Prometheus text format.
+
+        Returns:
+            lines: list of lines of the exposition
+        """
+        with self._lock:
+            histograms = {label_value: (list(counts), total)
+                          for label_value, (counts, total) in self._histograms.items()}
+
+        lines = ['# HELP {} {}'.format(self.name, self.description), '# TYPE {} histogram'.format(self.name)]
+        for label_value, (counts, total) in sorted(histograms.items()):
+            labels = '{}="{}"'.format(self.label, label_value)
+            cumulative_count = 0
+            for upper_bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative_count += count
+                lines.append('{}_bucket{{{},le="{}"}} {}'.format(self.name, labels, upper_bound, cumulative_count))
+            lines.append('{}_sum{{{}}} {}'.format(self.name, labels, total))
+            lines.append('{}_count{{{}}} {}'.format(self.name, labels, cumulative_count))
+        return lines
+
+
+# duration of the stages of the hot paths, e.g. feed fetch, k-NN search, route calls and map render
+stage_durations = Histogram('bikes_stage_duration_seconds', 'Duration of one stage of handling the data.', 'stage')
+# duration of the whole requests, by the endpoint
+request_durations = Histogram('bikes_request_duration_seconds', 'Duration of the requests.', 'endpoint')
+
+
+def record_span(stage, duration):
+    """
+    Record the duration of one stage in its histogram and, during a request, in the spans of the request.
+
+    Args:
+        stage: name of the stage, e.g. 'knn'
+        duration: duration of the stage (in seconds)
+    """
+    stage_durations.observe(stage, duration)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((stage, duration))
+
+
+@contextmanager
+def span(stage):
+    """
+    Measure the duration of the code in the with block as one stage, see record_span.
+
+    Args:
+        stage: name of the stage, e.g. 'knn'
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(stage, time.perf_counter() - start)
+
+
+def start_request_spans():
+    """
+    Start collecting the spans of the request handled in the current context.
+    """
+    _request_spans.set([])
+
+
+def finish_request_spans():
+    """
+    Stop collecting the spans of the current request.
+
+    Returns:
+        spans: list of (stage, duration) in the order the stages finished, empty outside of a request
+    """
+    spans = _request_spans.get()
+    _request_spans.set(None)
+    return spans or []
+
+
+def get_server_timing(spans, total_duration):
+    """
+    Create the value of the Server-Timing header. Durations of the stages repeated in the request are added up.
+
+    Args:
+        spans: list of (stage, duration) from finish_request_spans
+        total_duration: duration of the whole request (in seconds)
+
+    Returns:
+        header: value of the header, e.g. 'knn;dur=0.412, map_render;dur=140.310, total;dur=152.004'
+    """
+    durations = {}
+    for stage, duration in spans:
+        durations[stage] = durations.get(stage, 0.0) + duration
+    durations['total'] = total_duration
+    return ', '.join('{};dur={:.3f}'.format(stage, duration * 1000) for stage, duration in durations.items())
+
+
+def render_metrics():
+    """
+    Render all metrics in the Prometheus text format, served by /metrics.
+    """
+    return '\n'.join(stage_durations.render() + request_durations.render()) + '\n'
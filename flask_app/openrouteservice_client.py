@@ -0,0 +1,250 @@
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import openrouteservice
+import requests
+from openrouteservice.exceptions import ApiError, HTTPError, Timeout
+from requests.adapters import HTTPAdapter
+
+from metrics import span
+from openrouteservice_api_key import api_key
+from route_cache import RouteCache, get_route_key
+
+# address of the openrouteservice API - can be changed to a local server, e.g. during tests
+ORS_BASE_URL = 'https://api.openrouteservice.org'
+# maximum time to wait for one response (in seconds)
+ORS_TIMEOUT = 10
+# maximum number of requests sent at the same time for one search
+ORS_MAX_WORKERS = 8
+# maximum number of open connections kept by the shared client for all searches together
+ORS_MAX_CONNECTIONS = 32
+# time without requests after the API reported that the query limit was reached (in seconds)
+ORS_RATE_LIMIT_COOLDOWN = 60
+# features avoided by all routes
+AVOID_FEATURES = ["steps"]
+# errors of one call which do not stop the other calls, see call_concurrently
+CALL_ERRORS = (ApiError, HTTPError, Timeout, requests.RequestException, KeyError, IndexError)
+
+_client = None
+_client_lock = threading.Lock()
+_rate_limited_until = 0.0
+
+# routes shared by all requests, see RouteCache
+route_cache = RouteCache()
+
+
+def get_client():
+    """
+    Get the openrouteservice client shared by all requests.
+    The client keeps a pool of open connections to the API, so consecutive requests do not connect again.
+
+    Returns:
+        client: openrouteservice Client
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                client = openrouteservice.Client(key=api_key, base_url=ORS_BASE_URL, timeout=ORS_TIMEOUT,
+                                                 retry_over_query_limit=False)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=ORS_MAX_CONNECTIONS)
+                client._session.mount('https://', adapter)
+                client._session.mount('http://', adapter)
+                _client = client
+    return _client
+
+
+def send_request(method_name, **kwargs):
+    """
+    Send a request with the shared client, unless the query limit of the API was reached recently.
+
+    Args:
+        method_name: name of the method of openrouteservice Client, e.g. 'directions'
+        kwargs: arguments of the method
+
+    Returns:
+        response: JSON returned by the API
+
+    Raises:
+        ApiError: if the API returned an error or the query limit was reached recently
+        HTTPError: if the API returned an error without a JSON body, e.g. from a proxy
+        Timeout: if the API did not respond in time
+    """
+    global _rate_limited_until
+    if time.time() < _rate_limited_until:
+        raise ApiError(429, 'Query limit reached, requests are paused')
+
+    try:
+        return getattr(get_client(), method_name)(**kwargs)
+    except ApiError as error:
+        if error.status == 429:
+            _rate_limited_until = time.time() + ORS_RATE_LIMIT_COOLDOWN
+        raise
+
+
+def get_directions(coordinates, profile):
+    """
+    Get the route connecting the locations from openrouteservice.
+
+    Args:
+        coordinates: list of [longitude, latitude] pairs
+        profile: profile used by openrouteservice client during searching the route
+
+    Returns:
+        route: GeoJSON with the route
+
+    Raises:
+        ApiError: if the API returned an error or the query limit was reached recently
+        HTTPError: if the API returned an error without a JSON body, e.g. from a proxy
+        Timeout: if the API did not respond in time
+    """
+    return send_request('directions',
+                        coordinates=coordinates,
+                        profile=profile,
+                        format='geojson',
+                        options={"avoid_features": AVOID_FEATURES},
+                        validate=False)
+
+
+def get_route_coordinates(source_coordinates, destination_coordinates, profile):
+    """
+    Get the coordinates of the route connecting two locations.
+    The route is requested from openrouteservice only if it is not in the route cache.
+
+    Args:
+        source_coordinates: [longitude, latitude] pair of the source location
+        destination_coordinates: [longitude, latitude] pair of the destination location
+        profile: profile used by openrouteservice client during searching the route
+
+    Returns:
+        route_coordinates: list of [longitude, latitude] pairs along the route
+
+    Raises:
+        ApiError: if the API returned an error or the query limit was reached recently
+        HTTPError: if the API returned an error without a JSON body, e.g. from a proxy
+        Timeout: if the API did not respond in time
+    """
+    key = get_route_key(profile, source_coordinates, destination_coordinates, AVOID_FEATURES)
+    route_coordinates = route_cache.get(key)
+    if route_coordinates is None:
+        with span('route_call'):
+            route = get_directions([source_coordinates, destination_coordinates], profile)
+        route_coordinates = route['features'][0]['geometry']['coordinates']
+        route_cache.put(key, route_coordinates)
+    return route_coordinates
+
+
+def get_duration_matrix(sources_coordinates, destinations_coordinates, profile):
+    """
+    Get the travel times from each source to each destination with one request to the matrix endpoint.
+
+    Args:
+        sources_coordinates: list of [longitude, latitude] pairs of the sources
+        destinations_coordinates: list of [longitude, latitude] pairs of the destinations
+        profile: profile used by openrouteservice client during searching the routes
+
+    Returns:
+        durations: list with one row for each source and the travel time (in seconds) to each destination in the row,
+                   None if the destination is unreachable
+
+    Raises:
+        ApiError: if the API returned an error or the query limit was reached recently
+        HTTPError: if the API returned an error without a JSON body, e.g. from a proxy
+        Timeout: if the API did not respond in time
+    """
+    number_of_sources = len(sources_coordinates)
+    with span('matrix_call'):
+        matrix = send_request('distance_matrix',
+                              locations=list(sources_coordinates) + list(destinations_coordinates),
+                              sources=list(range(number_of_sources)),
+                              destinations=list(range(number_of_sources,
+                                                      number_of_sources + len(destinations_coordinates))),
+                              profile=profile,
+                              metrics=['duration'],
+                              validate=False)
+    return matrix['durations']
+
+
+def get_durations(source_coordinates, destinations_coordinates, profile):
+    """
+    Get the travel times from the source location to many destinations with one request to the matrix endpoint.
+
+    Args:
+        source_coordinates: [longitude, latitude] pair of the source location
+        destinations_coordinates: list of [longitude, latitude] pairs of the destinations
+        profile: profile used by openrouteservice client during searching the routes
+
+    Returns:
+        durations: list with the travel time (in seconds) to each destination, None if the destination is unreachable
+
+    Raises:
+        ApiError: if the API returned an error or the query limit was reached recently
+        HTTPError: if the API returned an error without a JSON body, e.g. from a proxy
+        Timeout: if the API did not respond in time
+    """
+    return get_duration_matrix([source_coordinates], destinations_coordinates, profile)[0]
+
+
+def call_concurrently(function, list_of_arguments):
+    """
+    Call the function for each set of arguments at the same time, at most ORS_MAX_WORKERS calls at once.
+    Each caller has its own threads, so the calls of one search never wait for the calls of other searches.
+    A call which failed because of the API does not stop the other calls.
+
+    Args:
+        function: function sending requests to openrouteservice
+        list_of_arguments: list of tuples with arguments of each call
+
+    Returns:
+        results: list with the result of each call in the same order as the arguments, None if the call failed
+    """
+    if not list_of_arguments:
+        return []
+
+    results = []
+    with ThreadPoolExecutor(max_workers=min(ORS_MAX_WORKERS, len(list_of_arguments)),
+                            thread_name_prefix='openrouteservice') as executor:
+        # each call runs in a copy of the caller's context, so its spans are added to the caller's request
+        futures = [executor.submit(contextvars.copy_context().run, function, *arguments)
+                   for arguments in list_of_arguments]
+        for future in futures:
+            try:
+                results.append(future.result())
+            except CALL_ERRORS as error:
+                print("Failed to get the route. Error:", error)
+                results.append(None)
+    return results
+
+
+async def run_concurrently(function, list_of_arguments):
+    """
+    Asynchronous version of call_concurrently, e.g. for an async view. The calls run in the threads of
+    the caller's event loop, at most ORS_MAX_WORKERS calls at once, with the same shared client and route cache.
+
+    Args:
+        function: function sending requests to openrouteservice, e.g. get_route_coordinates
+        list_of_arguments: list of tuples with arguments of each call
+
+    Returns:
+        results: list with the result of each call in the same order as the arguments, None if the call failed
+    """
+    semaphore = asyncio.Semaphore(ORS_MAX_WORKERS)
+
+    async def call(arguments):
+        async with semaphore:
+            # asyncio.to_thread runs the call in a copy of the caller's context, so its spans are added to the request
+            return await asyncio.to_thread(function, *arguments)
+
+    results = []
+    for result in await asyncio.gather(*[call(arguments) for arguments in list_of_arguments],
+                                       return_exceptions=True):
+        if isinstance(result, CALL_ERRORS):
+            print("Failed to get the route. Error:", result)
+            result = None
+        elif isinstance(result, BaseException):
+            raise result
+        results.append(result)
+    return results
@@ -0,0 +1,182 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# file of the on-disk tier of the cache
+ROUTE_CACHE_PATH = 'route_cache.db'
+# number of seconds a route is kept in cache
+ROUTE_CACHE_TTL = 7 * 24 * 3600
+# maximum number of routes kept in memory
+ROUTE_CACHE_MEMORY_SIZE = 1024
+# maximum number of routes kept on disk
+ROUTE_CACHE_DISK_SIZE = 100000
+# the expired routes and the routes above the size limit are removed from disk after this number of new routes
+ROUTE_CACHE_EVICTION_INTERVAL = 100
+# number of decimal places of the coordinates in the key - 4 places snap the locations to about 10 meters
+ROUTE_CACHE_PRECISION = 4
+
+
+def get_route_key(profile, source_coordinates, destination_coordinates, avoid_features, precision=ROUTE_CACHE_PRECISION):
+    """
+    Create the key of a route in the cache.
+
+    Args:
+        profile: profile used by openrouteservice client during searching the route
+        source_coordinates: [longitude, latitude] pair of the source location
+        destination_coordinates: [longitude, latitude] pair of the destination location
+        avoid_features: list of features avoided by the route
+        precision: number of decimal places of the coordinates
+
+    Returns:
+        key: text identifying the route
+    """
+    source = ','.join('{:.{}f}'.format(value, precision) for value in source_coordinates)
+    destination = ','.join('{:.{}f}'.format(value, precision) for value in destination_coordinates)
+    return '{}|{}|{}|{}'.format(profile, source, destination, ','.join(sorted(avoid_features)))
+
+
+class RouteCache:
+    """
+    Two-tier cache of routes: a LRU dictionary in memory backed by a SQLite database on disk.
+    A route found only on disk is copied to memory. Both tiers have a size limit, and routes older
+    than ttl seconds are treated as missing.
+
+    The tiers have separate locks, so the routes in memory are never waiting for the disk. The disk is cleaned
+    up every eviction_interval new routes, so it can hold up to disk_size + eviction_interval routes.
+    Errors of the database, e.g. a locked or damaged file, never fail the request - only the memory tier is used.
+    """
+
+    def __init__(self, path=ROUTE_CACHE_PATH, ttl=ROUTE_CACHE_TTL, memory_size=ROUTE_CACHE_MEMORY_SIZE,
+                 disk_size=ROUTE_CACHE_DISK_SIZE, eviction_interval=ROUTE_CACHE_EVICTION_INTERVAL):
+        """
+        Args:
+            path: file of the SQLite database, None to keep the routes only in memory
+            ttl: number of seconds a route is kept in cache
+            memory_size: maximum number of routes kept in memory
+            disk_size: maximum number of routes kept on disk
+            eviction_interval: number of new routes on disk between two removals of the old routes
+        """
+        self.path = path
+        self.ttl = ttl
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.eviction_interval = eviction_interval
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._connection = None
+        self._puts_since_eviction = 0
+        # the lock of the memory tier and its counters, and the lock of the connection to the database
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+
+    def _get_connection(self):
+        if self._connection is None:
+            # the connection is kept only when the database is ready, otherwise it is opened again by the next call
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            try:
+                connection.execute('PRAGMA journal_mode=WAL')
+                connection.execute('CREATE TABLE IF NOT EXISTS routes '
+                                   '(key TEXT PRIMARY KEY, route TEXT NOT NULL, created_at REAL NOT NULL)')
+                connection.execute('CREATE INDEX IF NOT EXISTS routes_created_at ON routes (created_at)')
+            except sqlite3.Error:
+                connection.close()
+                raise
+            self._connection = connection
+        return self._connection
+
+    def get(self, key):
+        """
+        Get the route from cache.
+
+        Args:
+            key: key of the route, see get_route_key
+
+        Returns:
+            route: the cached route, None if it is not in cache
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                route, created_at = entry
+                if now - created_at < self.ttl:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return route
+                del self._memory[key]
+
+        if self.path is not None:
+            try:
+                with self._disk_lock:
+                    row = self._get_connection().execute('SELECT route, created_at FROM routes '
+                                                         'WHERE key = ? AND created_at > ?',
+                                                         (key, now - self.ttl)).fetchone()
+            except sqlite3.Error as error:
+                # a locked or damaged database is treated as a miss, the route is requested again
+                print("Failed to read the route cache. Error:", error)
+                row = None
+            if row is not None:
+                route, created_at = json.loads(row[0]), row[1]
+                with self._lock:
+                    self._put_in_memory(key, route, created_at)
+                    self.disk_hits += 1
+                return route
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, route):
+        """
+        Put the route in cache.
+
+        Args:
+            key: key of the route, see get_route_key
+            route: route which can be converted to JSON
+        """
+        created_at = time.time()
+        with self._lock:
+            self._put_in_memory(key, route, created_at)
+        if self.path is None:
+            return
+
+        route_as_json = json.dumps(route)
+        try:
+            with self._disk_lock:
+                connection = self._get_connection()
+                with connection:
+                    connection.execute('INSERT OR REPLACE INTO routes (key, route, created_at) VALUES (?, ?, ?)',
+                                       (key, route_as_json, created_at))
+                    self._puts_since_eviction += 1
+                    if self._puts_since_eviction >= self.eviction_interval:
+                        self._puts_since_eviction = 0
+                        # remove expired routes and the oldest ones above the size limit
+                        connection.execute('DELETE FROM routes WHERE created_at <= ?', (created_at - self.ttl,))
+                        connection.execute('DELETE FROM routes WHERE key IN (SELECT key FROM routes '
+                                           'ORDER BY created_at LIMIT max((SELECT COUNT(*) FROM routes) - ?, 0))',
+                                           (self.disk_size,))
+        except sqlite3.Error as error:
+            # the route is still kept in memory
+            print("Failed to write the route cache. Error:", error)
+
+    def _put_in_memory(self, key, route, created_at):
+        self._memory[key] = (route, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get_statistics(self):
+        """
+        Get the counters of the cache.
+
+        Returns:
+            statistics: dictionary with the number of hits in memory, hits on disk, misses and routes in memory
+        """
+        return {'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'routes_in_memory': len(self._memory)}
@@ -0,0 +1,185 @@
+from math import ceil, sin
+
+import numpy as np
+
+from distance_calculator import EARTH_RADIUS, haversine_distances, select_k_smallest
+
+# length of the edge of one cell of the grid (in kilometers)
+CELL_SIZE = 0.5
+# below this number of stations a vectorized scan of all stations is faster than visiting the cells
+FULL_SCAN_LIMIT = 8000
+
+
+def to_unit_vectors(latitudes, longitudes):
+    """
+    Convert locations to points on the unit sphere.
+    The straight-line (chord) distance between two points grows with the haversine distance,
+    so both distances give the same order of the nearest points.
+
+    Args:
+        latitudes: array with latitudes of the locations
+        longitudes: array with longitudes of the locations
+
+    Returns:
+        points: array of shape (number of locations, 3) with the coordinates of the points
+    """
+    latitudes = np.radians(np.asarray(latitudes, dtype=np.float64))
+    longitudes = np.radians(np.asarray(longitudes, dtype=np.float64))
+    cos_latitudes = np.cos(latitudes)
+    return np.column_stack((cos_latitudes * np.cos(longitudes), cos_latitudes * np.sin(longitudes), np.sin(latitudes)))
+
+
+def get_shell_offsets(ring):
+    """
+    Get offsets of the cells lying exactly `ring` cells away (in any axis) from the central cell.
+
+    Args:
+        ring: distance from the central cell counted in cells
+
+    Returns:
+        offsets: array of shape (number of cells, 3) with offsets of the cells
+    """
+    steps = np.arange(-ring, ring + 1)
+    offsets = np.stack(np.meshgrid(steps, steps, steps, indexing='ij'), axis=-1).reshape(-1, 3)
+    return offsets[np.abs(offsets).max(axis=1) == ring]
+
+
+class StationIndex:
+    """
+    Grid index of the stations' locations.
+
+    The stations are converted to points on the unit sphere and put in buckets - cubic cells of the grid.
+    A query visits the cells around the source location ring by ring and stops as soon as no station
+    in the cells not visited yet can be closer than the ones already found.
+    """
+
+    def __init__(self, latitudes, longitudes, cell_size=CELL_SIZE):
+        """
+        Args:
+            latitudes: array with latitudes of the stations
+            longitudes: array with longitudes of the stations
+            cell_size: length of the edge of one cell (in kilometers)
+        """
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.points = to_unit_vectors(self.latitudes, self.longitudes)
+        self.cell_size = cell_size / EARTH_RADIUS
+
+        cells = np.floor(self.points / self.cell_size).astype(np.int64)
+        # positions of the stations grouped by cell, each bucket is a slice of this array
+        self.order = np.lexsort((cells[:, 2], cells[:, 1], cells[:, 0]))
+        sorted_cells = cells[self.order]
+        starts = np.flatnonzero(np.any(np.diff(sorted_cells, axis=0) != 0, axis=1)) + 1
+        starts = np.concatenate(([0], starts)).astype(np.int64)
+        ends = np.append(starts[1:], len(self.order))
+        self.buckets = {tuple(sorted_cells[start]): (start, end)
+                        for start, end in zip(starts.tolist(), ends.tolist())}
+        self._shell_offsets = {}
+
+    def __len__(self):
+        return len(self.order)
+
+    def _get_cell(self, point):
+        return np.floor(point / self.cell_size).astype(np.int64)
+
+    def _get_positions_in_shell(self, cell, ring):
+        offsets = self._shell_offsets.get(ring)
+        if offsets is None:
+            offsets = get_shell_offsets(ring)
+            self._shell_offsets[ring] = offsets
+
+        slices = []
+        for neighbor_cell in map(tuple, (offsets + cell).tolist()):
+            bucket = self.buckets.get(neighbor_cell)
+            if bucket is not None:
+                slices.append(self.order[bucket[0]:bucket[1]])
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(slices)
+
+    def _get_max_ring(self):
+        if len(self.order) <= FULL_SCAN_LIMIT:
+            return -1
+        # when the cube of visited cells gets bigger than the number of buckets, a full scan is cheaper
+        return max(int(ceil(len(self.buckets) ** (1 / 3) / 2)), 1)
+
+    def _get_result(self, source_latitude, source_longitude, positions, k=None):
+        # sort the candidates by the haversine distance, equal distances keep the order of positions
+        positions = np.sort(positions)
+        distances = haversine_distances(source_latitude, source_longitude,
+                                        self.latitudes[positions], self.longitudes[positions])
+        selected = select_k_smallest(distances, len(positions) if k is None else k)
+        return positions[selected], distances[selected]
+
+    def query_nearest(self, source_latitude, source_longitude, k, mask=None):
+        """
+        Find the K nearest stations to the source location.
+
+        Args:
+            source_latitude: source location - latitude
+            source_longitude: source location - longitude
+            k: number of stations to find
+            mask: optional boolean array, only the stations with True value are considered
+
+        Returns:
+            positions: positions of the K nearest stations sorted by distance
+            distances: array with the distance (in kilometers) to each of the nearest stations
+        """
+        k = min(k, len(self.order))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        point = to_unit_vectors([source_latitude], [source_longitude])[0]
+        cell = self._get_cell(point)
+
+        candidates = []
+        number_of_candidates = 0
+        for ring in range(self._get_max_ring() + 1):
+            positions = self._get_positions_in_shell(cell, ring)
+            if mask is not None:
+                positions = positions[mask[positions]]
+            candidates.append(positions)
+            number_of_candidates += len(positions)
+
+            if number_of_candidates >= k:
+                positions = np.concatenate(candidates)
+                chord_distances = np.linalg.norm(self.points[positions] - point, axis=1)
+                kth_distance = np.partition(chord_distances, k - 1)[k - 1]
+                # stations in cells which were not visited are at least `ring` cells away
+                if kth_distance <= ring * self.cell_size:
+                    return self._get_result(source_latitude, source_longitude, positions, k)
+
+        # not enough stations around the source location - check all of them
+        positions = np.arange(len(self.order)) if mask is None else np.flatnonzero(mask)
+        return self._get_result(source_latitude, source_longitude, positions, k)
+
+    def query_radius(self, source_latitude, source_longitude, radius, mask=None):
+        """
+        Find all stations within the radius from the source location.
+
+        Args:
+            source_latitude: source location - latitude
+            source_longitude: source location - longitude
+            radius: radius of the search (in kilometers)
+            mask: optional boolean array, only the stations with True value are considered
+
+        Returns:
+            positions: positions of the stations sorted by distance
+            distances: array with the distance (in kilometers) to each of the stations
+        """
+        point = to_unit_vectors([source_latitude], [source_longitude])[0]
+        chord_radius = 2 * sin(min(radius / EARTH_RADIUS, np.pi) / 2)
+        max_ring = int(ceil(chord_radius / self.cell_size))
+
+        if 0 <= max_ring <= self._get_max_ring():
+            cell = self._get_cell(point)
+            positions = np.concatenate([self._get_positions_in_shell(cell, ring) for ring in range(max_ring + 1)])
+        else:
+            positions = np.arange(len(self.order))
+        if mask is not None:
+            positions = positions[mask[positions]]
+
+        chord_distances = np.linalg.norm(self.points[positions] - point, axis=1)
+        positions = positions[chord_distances <= chord_radius]
+        positions, distances = self._get_result(source_latitude, source_longitude, positions)
+        within_radius = distances <= radius
+        return positions[within_radius], distances[within_radius]
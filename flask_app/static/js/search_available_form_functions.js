@@ -52,8 +52,9 @@ function isKValue(value) {
     return true;
 }
 
-function check_if_location_is_in_toronto(lat, lon) {
-    /* Check if the location (latitude and longitude) is located within a given area - Toronto city.
+function check_if_location_is_in_service_area(lat, lon) {
+    /* Check if the location (latitude and longitude) is located within a given area - Toronto city
+    * or the area of one of the other bike-share systems served by the application (service_areas set by the page).
     *
     * Args:
     *   lat: location latitude
@@ -71,10 +72,18 @@ function check_if_location_is_in_toronto(lat, lon) {
 
     if (upper_left_lat >= lat && lat >= lower_right_lat && upper_left_lon <= lon && lon <= lower_right_lon) {
         return true;
-    } else {
-        alert("Error - the desired point is not in the area of Toronto!");
-        return false; // Prevent form submission
     }
+
+    // Each area is [minimum latitude, minimum longitude, maximum latitude, maximum longitude].
+    let areas = typeof service_areas === 'undefined' ? [] : service_areas;
+    for (const [min_lat, min_lon, max_lat, max_lon] of areas) {
+        if (min_lat <= lat && lat <= max_lat && min_lon <= lon && lon <= max_lon) {
+            return true;
+        }
+    }
+
+    alert("Error - the desired point is not in the area of any bike-share system!");
+    return false; // Prevent form submission
 }
 
 function validateFormStations() {
@@ -93,7 +102,7 @@ function validateFormStations() {
 
 
     if (lat_check === true && lon_check === true && k_value_check === true) {
-            return check_if_location_is_in_toronto(lat, lon);
+            return check_if_location_is_in_service_area(lat, lon);
     }
     return false;
 }
@@ -0,0 +1,156 @@
+var stations_status = {};
+var source_location = null;
+
+function copy_location_to_form_fields(e) {
+    /* Copy the location of the clicked marker to the search form of the page containing the map.
+    *
+    * Args:
+    *   e: Leaflet click event
+    * */
+    var point = e.latlng;
+    var form_document = window.parent.document;
+
+    var input_field_lat = form_document.getElementById("lat");
+    input_field_lat.value = point['lat'].toFixed(6);
+
+    var input_field_lon = form_document.getElementById("lon");
+    input_field_lon.value = point['lng'].toFixed(6);
+}
+
+function redirect_to_directions(dest_latitude, dest_longitude, source_latitude, source_longitude, travel_mode) {
+    /* Open Google Maps with directions between two locations.
+    * */
+    url= 'https://www.google.com/maps/dir/' + dest_latitude + ',' + dest_longitude + '/' + source_latitude + ',' + source_longitude + '/data=!3m1!4b1!4m2!4m1!3e' + travel_mode + '?entry=ttu';
+    window.open(url, '_blank');
+}
+
+function get_source_location() {
+    /* Get the source location - from the search results or from the search form.
+    *
+    * Returns:
+    *   [latitude, longitude] of the source location
+    * */
+    if (source_location !== null) {
+        return source_location;
+    }
+    var form_document = window.parent.document;
+    return [form_document.getElementById("lat").value, form_document.getElementById("lon").value];
+}
+
+function create_station_popup(feature) {
+    /* Create the HTML table with the information and status of one station.
+    *
+    * Args:
+    *   feature: GeoJSON feature of the station
+    *
+    * Returns:
+    *   HTML code of the popup
+    * */
+    var station_id = feature.properties.station_id;
+    // the status is in the order of STATUS_COLUMNS_IN_POPUP in map_handler.py
+    var status = stations_status[station_id] || [];
+    var values = [['Address', feature.properties.address],
+                  ['Bikes available', status[0]],
+                  ['Bikes available - mechanical', status[1]],
+                  ['Bikes available - ebike', status[2]],
+                  ['Docks available', status[3]]];
+
+    var rows = '';
+    for (var i = 0; i < values.length; i++) {
+        var value = values[i][1] === undefined ? '-' : values[i][1];
+        rows += '<tr><td class="popupRow" style="background-color: #4ce8fd;"><span>' + values[i][0] + '</span></td>'
+              + '<td class="popupRow" style="background-color: #4ce8fd;"><span>' + value + '</span></td></tr>';
+    }
+
+    var station = feature.geometry.coordinates;
+    var source = get_source_location();
+    var arguments_list = station[1] + ', ' + station[0] + ', ' + source[0] + ', ' + source[1];
+    rows += '<tr><td class="popupRow" style="background-color: #4ce8fd;"><span>Directions</span></td>'
+          + '<td class="popupRow" style="background-color: #4ce8fd;"><span>'
+          + '<button onclick="redirect_to_directions(' + arguments_list + ', 1)">Cycling</button> '
+          + '<button onclick="redirect_to_directions(' + arguments_list + ', 2)">Walking</button>'
+          + '</span></td></tr>';
+
+    return '<h1 class="tableTitle"> Station: ' + station_id + '</h1>'
+         + '<table id="popupTable"><thead><tr>'
+         + '<th class="tableHeader">Information</th><th class="tableHeader">Value</th>'
+         + '</tr></thead><tbody>' + rows + '</tbody></table>';
+}
+
+function create_station_marker(latlng, color) {
+    /* Create a marker of one station.
+    * */
+    var icon = L.AwesomeMarkers.icon({icon: 'bicycle', prefix: 'fa', markerColor: color, iconColor: 'white'});
+    return L.marker(latlng, {icon: icon});
+}
+
+function add_stations_to_map(map, stations, status_url) {
+    /* Add markers of all stations to the map. The status of stations is downloaded separately.
+    *
+    * Args:
+    *   map: Leaflet map
+    *   stations: GeoJSON with locations of the stations
+    *   status_url: url returning the current status of the stations
+    * */
+    fetch(status_url)
+        .then(function (response) { return response.json(); })
+        .then(function (status) { stations_status = status; });
+
+    L.geoJSON(stations, {
+        pointToLayer: function (feature, latlng) { return create_station_marker(latlng, 'blue'); },
+        onEachFeature: function (feature, layer) {
+            layer.bindPopup(function () { return create_station_popup(feature); }, {maxWidth: 400});
+        }
+    }).addTo(map);
+}
+
+function add_search_results_to_map(map, overlay_url) {
+    /* Add the nearest stations, routes to them and the source location to the map.
+    *
+    * Args:
+    *   map: Leaflet map
+    *   overlay_url: url returning the GeoJSON with the search results
+    * */
+    fetch(overlay_url)
+        .then(function (response) { return response.ok ? response.json() : null; })
+        .then(function (overlay) {
+            if (overlay === null) {
+                return;
+            }
+            source_location = overlay.source;
+            map.setView(overlay.source, 14);
+
+            L.geoJSON(overlay, {
+                style: function (feature) { return feature.properties.style; },
+                pointToLayer: function (feature, latlng) {
+                    if (feature.properties.kind === 'source') {
+                        var icon = L.AwesomeMarkers.icon({icon: 'crosshairs', prefix: 'fa', markerColor: 'red', iconColor: 'white'});
+                        return L.marker(latlng, {icon: icon, draggable: true}).on('click', copy_location_to_form_fields);
+                    }
+                    return create_station_marker(latlng, 'green').setZIndexOffset(1000);
+                },
+                onEachFeature: function (feature, layer) {
+                    if (feature.properties.kind === 'source') {
+                        layer.bindPopup('<p id="marker_source_location">User location set!</p>');
+                    } else if (feature.properties.kind === 'route') {
+                        layer.bindTooltip('Click for details');
+                        layer.bindPopup('Route to station: ' + feature.properties.station_id);
+                    } else {
+                        layer.bindPopup(function () { return create_station_popup(feature); }, {maxWidth: 400});
+                    }
+                }
+            }).addTo(map);
+        });
+}
+
+function initialise_stations_map(map, stations, status_url, overlay_url) {
+    /* Add the stations to the map and, if the page was opened for a search, the search results.
+    * The search is identified by the token in the fragment of the url.
+    * */
+    add_stations_to_map(map, stations, status_url);
+
+    var token = window.location.hash.substring(1);
+    if (token !== '') {
+        add_search_results_to_map(map, overlay_url + token);
+    }
+}
@@ -0,0 +1,149 @@
+import time
+
+import pandas as pd
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert
+
+from get_data import StationSnapshot
+from spatial_index import StationIndex
+from station_store import get_availability_from_frame
+
+db = SQLAlchemy()
+
+# columns of the stations' snapshot kept in the database - (column of the Station model, column of the Dataframe)
+STATION_COLUMNS = [('station_id', 'station_id'),
+                   ('latitude', 'lat'),
+                   ('longitude', 'lon'),
+                   ('address', 'address'),
+                   ('capacity', 'capacity'),
+                   ('is_charging_station_x', 'is_charging_station_x'),
+                   ('nearby_distance', 'nearby_distance'),
+                   ('num_bikes_available', 'num_bikes_available'),
+                   ('num_bikes_disabled', 'num_bikes_disabled'),
+                   ('num_docks_available', 'num_docks_available'),
+                   ('num_docks_disabled', 'num_docks_disabled'),
+                   ('is_charging_station_y', 'is_charging_station_y'),
+                   ('is_renting', 'is_renting'),
+                   ('is_returning', 'is_returning'),
+                   ('num_bikes_available_types_mechanical', 'num_bikes_available_types_mechanical'),
+                   ('num_bikes_available_types_ebike', 'num_bikes_available_types_ebike')]
+
+
+class Station(db.Model):
+    """
+    Information and status of one station from the last saved snapshot.
+    """
+    __tablename__ = 'station_snapshot'
+
+    station_id = db.Column(db.String(32), primary_key=True)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    address = db.Column(db.String(100))
+    capacity = db.Column(db.Integer)
+    is_charging_station_x = db.Column(db.Boolean)
+    nearby_distance = db.Column(db.Float)
+    num_bikes_available = db.Column(db.Integer)
+    num_bikes_disabled = db.Column(db.Integer)
+    num_docks_available = db.Column(db.Integer)
+    num_docks_disabled = db.Column(db.Integer)
+    is_charging_station_y = db.Column(db.Boolean)
+    is_renting = db.Column(db.Integer)
+    is_returning = db.Column(db.Integer)
+    num_bikes_available_types_mechanical = db.Column(db.Integer)
+    num_bikes_available_types_ebike = db.Column(db.Integer)
+
+    def __repr__(self):
+        return '<Station {}>'.format(self.station_id)
+
+
+class SnapshotVersion(db.Model):
+    """
+    Versions of the feeds the saved snapshot was built from. The table has a single row.
+    """
+    __tablename__ = 'snapshot_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    information_last_updated = db.Column(db.Integer, nullable=False)
+    status_last_updated = db.Column(db.Integer, nullable=False)
+    saved_at = db.Column(db.Float, nullable=False)
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # readers are not blocked by the writer, and a commit does not wait for the data to reach the disk
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
+
+def init_station_database(app):
+    """
+    Connect the database to the application and create the tables.
+
+    Args:
+        app: Flask application with SQLALCHEMY_DATABASE_URI in its config
+    """
+    db.init_app(app)
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect', set_sqlite_pragmas)
+        db.create_all()
+
+
+def save_snapshot(snapshot):
+    """
+    Replace the saved snapshot with the given one. The stations are upserted in bulk in one transaction,
+    and the stations which are not in the snapshot any more are deleted. Requires the application context.
+
+    Args:
+        snapshot: StationSnapshot to save
+    """
+    df_stations = snapshot.stations
+    columns = [df_stations[frame_column].tolist() for _, frame_column in STATION_COLUMNS]
+    model_columns = [model_column for model_column, _ in STATION_COLUMNS]
+    rows = [dict(zip(model_columns, values)) for values in zip(*columns)]
+
+    statement = insert(Station)
+    statement = statement.on_conflict_do_update(
+        index_elements=[Station.station_id],
+        set_={model_column: statement.excluded[model_column] for model_column in model_columns[1:]})
+
+    try:
+        if rows:
+            db.session.execute(statement, rows)
+        db.session.execute(db.delete(Station).where(Station.station_id.not_in(df_stations['station_id'].tolist())))
+        db.session.merge(SnapshotVersion(id=1,
+                                         information_last_updated=snapshot.information_last_updated,
+                                         status_last_updated=snapshot.status_last_updated,
+                                         saved_at=time.time()))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def load_snapshot():
+    """
+    Load the saved snapshot, e.g. to serve the requests when the application starts and the feeds are not
+    downloaded yet. Requires the application context.
+
+    Returns:
+        snapshot: the saved StationSnapshot, None if no snapshot was saved yet
+    """
+    version = db.session.get(SnapshotVersion, 1)
+    if version is None:
+        return None
+
+    stations = db.session.execute(db.select(*[getattr(Station, model_column)
+                                              for model_column, _ in STATION_COLUMNS])).all()
+    df_stations = pd.DataFrame(stations, columns=[frame_column for _, frame_column in STATION_COLUMNS])
+    if df_stations.empty:
+        return None
+
+    return StationSnapshot(stations=df_stations,
+                           information_last_updated=version.information_last_updated,
+                           status_last_updated=version.status_last_updated,
+                           created_at=version.saved_at,
+                           spatial_index=StationIndex(df_stations['lat'].to_numpy(), df_stations['lon'].to_numpy()),
+                           availability=get_availability_from_frame(df_stations))
@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+
+# columns taken from the station information feed - (column in the store, column in the feed)
+INFORMATION_COLUMNS = [('lat', 'lat'),
+                       ('lon', 'lon'),
+                       ('address', 'address'),
+                       ('capacity', 'capacity'),
+                       ('is_charging_station_x', 'is_charging_station'),
+                       ('nearby_distance', 'nearby_distance')]
+
+# columns taken from the station status feed - (column in the store, column in the feed, type of values)
+STATUS_COLUMNS = [('num_bikes_available', 'num_bikes_available', np.uint16),
+                  ('num_bikes_disabled', 'num_bikes_disabled', np.uint16),
+                  ('num_docks_available', 'num_docks_available', np.uint16),
+                  ('num_docks_disabled', 'num_docks_disabled', np.uint16),
+                  ('is_charging_station_y', 'is_charging_station', np.bool_),
+                  ('is_renting', 'is_renting', np.int8),
+                  ('is_returning', 'is_returning', np.int8),
+                  ('num_bikes_available_types_mechanical', 'num_bikes_available_types.mechanical', np.uint16),
+                  ('num_bikes_available_types_ebike', 'num_bikes_available_types.ebike', np.uint16)]
+
+
+# availability bitmaps - (name of the bitmap, column in the store which must not be equal to 0)
+AVAILABILITY_BITMAPS = [('has_bike', 'num_bikes_available'),
+                        ('has_dock', 'num_docks_available'),
+                        ('renting', 'is_renting'),
+                        ('returning', 'is_returning'),
+                        ('has_ebike', 'num_bikes_available_types_ebike')]
+
+# bitmaps of stations which fit the type of search - (type of search, bitmaps which must be set)
+SEARCH_TYPE_BITMAPS = [('bikes', ('has_bike', 'renting')),
+                       ('docks', ('has_dock', 'returning'))]
+
+
+class StationStore:
+    """
+    Columnar store of the stations' information and status keyed by station_id.
+
+    The station information is parsed once, when the store is created. The arrays for the status
+    are allocated up front for every station, and each new version of the station status only
+    overwrites the rows of the stations whose last_reported value has changed.
+    The availability bitmaps (see AVAILABILITY_BITMAPS) are updated together with the status.
+    A station missing from the station status is out of service until it is reported again.
+    """
+
+    def __init__(self, df_information):
+        """
+        Args:
+            df_information: Pandas Dataframe with stations' information
+        """
+        self.station_ids = df_information['station_id'].to_numpy()
+        self.position_by_id = {station_id: position for position, station_id in enumerate(self.station_ids)}
+        self.information = {column: df_information[feed_column].to_numpy()
+                            for column, feed_column in INFORMATION_COLUMNS}
+
+        number_of_stations = len(self.station_ids)
+        self.status = {column: np.zeros(number_of_stations, dtype=dtype) for column, _, dtype in STATUS_COLUMNS}
+        self.availability = {name: np.zeros(number_of_stations, dtype=np.bool_) for name, _ in AVAILABILITY_BITMAPS}
+        self.last_reported = np.full(number_of_stations, -1, dtype=np.int64)
+        # stations present in the station status which are installed and not at the end of life
+        self.in_service = np.zeros(number_of_stations, dtype=np.bool_)
+
+    def apply_status(self, df_status):
+        """
+        Update the status of the stations reported since the previous version of the station status.
+        The stations missing from the station status are taken out of service.
+
+        Args:
+            df_status: Pandas Dataframe with stations' status
+
+        Returns:
+            positions: positions in the store of the updated stations, including the stations taken out of service
+        """
+        positions = df_status['station_id'].map(self.position_by_id)
+        known_stations = positions.notna().to_numpy()
+        positions = positions.to_numpy()[known_stations].astype(np.int64)
+
+        # a station which is reported again gets its status from the feed, even with the same last_reported
+        missing = np.ones(len(self.station_ids), dtype=np.bool_)
+        missing[positions] = False
+        removed_positions = np.flatnonzero(missing & (self.last_reported != -1))
+        self.in_service[removed_positions] = False
+        self.last_reported[removed_positions] = -1
+
+        last_reported = df_status['last_reported'].to_numpy()[known_stations].astype(np.int64)
+        changed = last_reported != self.last_reported[positions]
+        rows = np.flatnonzero(known_stations)[changed]
+        positions = positions[changed]
+        if len(positions) == 0:
+            return removed_positions
+
+        for column, feed_column, dtype in STATUS_COLUMNS:
+            if feed_column in df_status:
+                values = df_status[feed_column].to_numpy()[rows]
+                if dtype is not np.bool_:
+                    values = np.nan_to_num(values.astype(np.float64)).astype(dtype)
+                self.status[column][positions] = values
+            else:
+                self.status[column][positions] = 0
+
+        for name, column in AVAILABILITY_BITMAPS:
+            self.availability[name][positions] = self.status[column][positions] != 0
+
+        self.last_reported[positions] = last_reported[changed]
+
+        in_service = np.ones(len(rows), dtype=np.bool_)
+        if 'status' in df_status:
+            in_service &= df_status['status'].to_numpy()[rows] != 'END_OF_LIFE'
+        if 'is_installed' in df_status:
+            in_service &= df_status['is_installed'].to_numpy()[rows] != 0
+        self.in_service[positions] = in_service
+        return np.concatenate((positions, removed_positions))
+
+    def to_frame(self):
+        """
+        Build a Pandas Dataframe with the stations in service.
+        The values are copied, so later updates of the store do not change the returned Dataframe.
+
+        Returns:
+            df_stations: Pandas dataframe with stations' information and status
+        """
+        positions = np.flatnonzero(self.in_service)
+        columns = {'station_id': self.station_ids[positions]}
+        for column, _ in INFORMATION_COLUMNS:
+            columns[column] = self.information[column][positions]
+        for column, _, _ in STATUS_COLUMNS:
+            columns[column] = self.status[column][positions]
+        return pd.DataFrame(columns)
+
+    def get_availability(self):
+        """
+        Get the availability bitmaps of the stations in service, in the same order as the rows returned by to_frame.
+        Besides the bitmaps from AVAILABILITY_BITMAPS, there is one bitmap for each type of search.
+
+        Returns:
+            availability: dictionary with boolean arrays - True for the stations with the given feature
+        """
+        positions = np.flatnonzero(self.in_service)
+        availability = {name: bitmap[positions] for name, bitmap in self.availability.items()}
+        for search_for_type, names in SEARCH_TYPE_BITMAPS:
+            availability[search_for_type] = np.logical_and.reduce([availability[name] for name in names])
+        return availability
+
+
+def get_availability_from_frame(df_stations):
+    """
+    Calculate the availability bitmaps of the stations, e.g. for a snapshot which was not built by a StationStore.
+
+    Args:
+        df_stations: Pandas Dataframe with stations' information and status
+
+    Returns:
+        availability: dictionary with boolean arrays in the same format as StationStore.get_availability
+    """
+    availability = {name: df_stations[column].to_numpy() != 0 for name, column in AVAILABILITY_BITMAPS}
+    for search_for_type, names in SEARCH_TYPE_BITMAPS:
+        availability[search_for_type] = np.logical_and.reduce([availability[name] for name in names])
+    return availability
@@ -0,0 +1,337 @@
+import time
+
+import numpy as np
+import requests
+
+from feed_parser import loads
+from feed_refresher import FEED_REFRESH_INTERVAL, FEED_REFRESH_MAX_BACKOFF, FeedRefresher
+from get_data import FEED_REQUEST_TIMEOUT, StationSnapshotCache
+
+# margin around the stations of a system within which the locations are served by it (in degrees, about 2 km)
+BOUNDS_MARGIN = 0.02
+# preferred language of the feeds - before version 3 of GBFS, gbfs.json lists the feeds separately for each language
+FEED_LANGUAGE = 'en'
+
+
+def get_feed_urls(discovery, language=FEED_LANGUAGE):
+    """
+    Get the urls of the feeds listed in the gbfs.json auto-discovery file.
+
+    Args:
+        discovery: dictionary with the auto-discovery file
+        language: preferred language of the feeds, the first listed language is used if it is missing
+
+    Returns:
+        feed_urls: dictionary with the url of each feed by its name, e.g. 'station_status'
+    """
+    data = discovery['data']
+    if 'feeds' in data:
+        feeds = data['feeds']
+    else:
+        feeds = (data.get(language) or next(iter(data.values())))['feeds']
+    return {feed['name']: feed['url'] for feed in feeds}
+
+
+def discover_feeds(discovery_url, language=FEED_LANGUAGE):
+    """
+    Download the gbfs.json auto-discovery file of a system.
+
+    Args:
+        discovery_url: url of the auto-discovery file
+        language: preferred language of the feeds
+
+    Returns:
+        feed_urls: dictionary with the url of each feed by its name, see get_feed_urls
+
+    Raises:
+        requests.RequestException: if the file could not be downloaded
+        KeyError, ValueError: if the file is not a valid auto-discovery file
+    """
+    response = requests.get(discovery_url, timeout=FEED_REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return get_feed_urls(loads(response.content), language)
+
+
+def get_area(bounds):
+    """
+    Get the area of the bounding box (in square degrees), used only to compare the bounding boxes.
+    """
+    min_latitude, min_longitude, max_latitude, max_longitude = bounds
+    return (max_latitude - min_latitude) * (max_longitude - min_longitude)
+
+
+class BikeShareSystem:
+    """
+    One bike-share system with its own snapshot cache and spatial index, refreshed by its own thread,
+    so a slow or failing system never delays the queries of the other systems.
+    """
+
+    def __init__(self, system_id, discovery_url=None, snapshot_cache=None):
+        """
+        Args:
+            system_id: identifier of the system, e.g. 'toronto'
+            discovery_url: url of the gbfs.json auto-discovery file, None if the urls of the feeds are already known
+            snapshot_cache: optional StationSnapshotCache of the system, its urls are used until the feeds
+                            are discovered
+        """
+        self.system_id = system_id
+        self.discovery_url = discovery_url
+        self.snapshot_cache = snapshot_cache or StationSnapshotCache(None, None)
+        self.feeds_discovered = discovery_url is None
+        self.feed_refresher = None
+        # the last snapshot together with the bounds of its stations
+        self._bounds = (None, None)
+
+    def discover_feeds(self):
+        """
+        Set the urls of the station information and station status feeds from the auto-discovery file.
+        """
+        feed_urls = discover_feeds(self.discovery_url)
+        self.snapshot_cache.information.url = feed_urls['station_information']
+        self.snapshot_cache.status.url = feed_urls['station_status']
+        self.feeds_discovered = True
+
+    def has_feed_urls(self):
+        """
+        Check if the urls of both feeds are known, from the auto-discovery file or set in advance.
+        """
+        return self.snapshot_cache.information.url is not None and self.snapshot_cache.status.url is not None
+
+    def get_snapshot(self):
+        """
+        Get the current snapshot of the system, see StationSnapshotCache.get_snapshot.
+
+        Returns:
+            snapshot: the current StationSnapshot, None if the stations are not known yet - the feeds were
+                      not discovered or could not be downloaded, and there is no earlier snapshot
+        """
+        if not self.has_feed_urls():
+            return self.snapshot_cache.get_last_snapshot()
+        try:
+            return self.snapshot_cache.get_snapshot()
+        except (requests.RequestException, RuntimeError, KeyError, ValueError) as error:
+            print("Failed to get the stations of {}. Error:".format(self.system_id), error)
+            return None
+
+    def get_bounds(self):
+        """
+        Get the bounding box of the stations in the last snapshot, without waiting for the feeds.
+
+        Returns:
+            bounds: (minimum latitude, minimum longitude, maximum latitude, maximum longitude),
+                    None if the system has no stations yet
+        """
+        snapshot = self.snapshot_cache.get_last_snapshot()
+        if snapshot is None:
+            return None
+        cached_snapshot, bounds = self._bounds
+        if cached_snapshot is not snapshot:
+            latitudes = snapshot.spatial_index.latitudes
+            longitudes = snapshot.spatial_index.longitudes
+            bounds = None
+            if np.isfinite(latitudes).any():
+                bounds = (float(np.nanmin(latitudes)), float(np.nanmin(longitudes)),
+                          float(np.nanmax(latitudes)), float(np.nanmax(longitudes)))
+            self._bounds = (snapshot, bounds)
+        return bounds
+
+    def start(self, interval=FEED_REFRESH_INTERVAL, max_backoff=FEED_REFRESH_MAX_BACKOFF):
+        """
+        Start refreshing the snapshot of the system in the background.
+
+        Args:
+            interval: number of seconds between two downloads of the station status
+            max_backoff: maximum number of seconds between two attempts after failures
+
+        Returns:
+            feed_refresher: the started SystemFeedRefresher
+        """
+        self.feed_refresher = SystemFeedRefresher(self, interval, max_backoff)
+        self.feed_refresher.start()
+        return self.feed_refresher
+
+
+class SystemFeedRefresher(FeedRefresher):
+    """
+    FeedRefresher of one system, which first finds the feeds in the auto-discovery file.
+    A failed discovery is retried with the same backoff as a failed download, also while the station status
+    is downloaded from the urls set in advance.
+    """
+
+    def __init__(self, system, interval=FEED_REFRESH_INTERVAL, max_backoff=FEED_REFRESH_MAX_BACKOFF):
+        """
+        Args:
+            system: BikeShareSystem refreshed by the thread
+            interval: number of seconds between two downloads of the station status
+            max_backoff: maximum number of seconds between two attempts after failures
+        """
+        super().__init__(system.snapshot_cache, interval, max_backoff)
+        self.name = 'feed-refresher-' + system.system_id
+        self.system = system
+        self.discovery_failures = 0
+        # time (of time.monotonic) of the next attempt to discover the feeds
+        self._next_discovery = 0.0
+
+    def get_discovery_delay(self):
+        """
+        Calculate the number of seconds to wait before the next attempt to discover the feeds.
+
+        Returns:
+            delay: the interval, multiplied by 2 for every consecutive failure and limited by max_backoff
+        """
+        return min(self.interval * 2 ** self.discovery_failures, self.max_backoff)
+
+    def refresh(self):
+        """
+        Discover the feeds if they were not found yet, then download the station status once.
+        """
+        if not self.system.feeds_discovered and time.monotonic() >= self._next_discovery:
+            try:
+                self.system.discover_feeds()
+                self.discovery_failures = 0
+            except (requests.RequestException, KeyError, ValueError) as error:
+                print("Failed to discover the feeds of {}. Error:".format(self.system.system_id), error)
+                self.discovery_failures += 1
+                self._next_discovery = time.monotonic() + self.get_discovery_delay()
+                if not self.system.has_feed_urls():
+                    self.consecutive_failures += 1
+                    return
+        if self.system.has_feed_urls():
+            super().refresh()
+
+
+class SystemRegistry:
+    """
+    Bike-share systems served by the application. Each query is routed to the system whose stations
+    surround the location, using only the bounding boxes of the last snapshots.
+    """
+
+    def __init__(self, margin=BOUNDS_MARGIN):
+        """
+        Args:
+            margin: margin around the stations of a system within which the locations are served by it (in degrees)
+        """
+        self.margin = margin
+        self.systems = {}
+        self.default_system_id = None
+
+    def add_system(self, system_id, discovery_url=None, snapshot_cache=None, default=False):
+        """
+        Add a system to the registry. The first added system is the default one, unless another is chosen.
+
+        Args:
+            system_id: identifier of the system, e.g. 'toronto'
+            discovery_url: url of the gbfs.json auto-discovery file, None if the urls of the feeds are already known
+            snapshot_cache: optional StationSnapshotCache of the system
+            default: True to serve the locations outside of all systems by this system
+
+        Returns:
+            system: the added BikeShareSystem
+        """
+        system = BikeShareSystem(system_id, discovery_url, snapshot_cache)
+        self.systems[system_id] = system
+        if default or self.default_system_id is None:
+            self.default_system_id = system_id
+        return system
+
+    def get_system(self, system_id=None):
+        """
+        Get a system by its identifier.
+
+        Args:
+            system_id: identifier of the system, None for the default system
+
+        Returns:
+            system: the BikeShareSystem
+
+        Raises:
+            KeyError: if there is no such system
+        """
+        return self.systems[self.default_system_id if system_id is None else system_id]
+
+    def _get_bounds(self):
+        # systems with stations, ordered from the largest bounding box, so the smaller ones are checked last and win
+        systems_with_bounds = [(system, system.get_bounds()) for system in self.systems.values()]
+        return sorted([(system, bounds) for system, bounds in systems_with_bounds if bounds is not None],
+                      key=lambda item: get_area(item[1]), reverse=True)
+
+    def find_system(self, latitude, longitude):
+        """
+        Find the system serving the location. When the bounding boxes overlap, the smallest one is chosen.
+
+        Args:
+            latitude: latitude of the location
+            longitude: longitude of the location
+
+        Returns:
+            system: the BikeShareSystem with the location in its bounding box, the default one if there is none
+        """
+        found_system = self.get_system()
+        for system, (min_latitude, min_longitude, max_latitude, max_longitude) in self._get_bounds():
+            if (min_latitude - self.margin <= latitude <= max_latitude + self.margin
+                    and min_longitude - self.margin <= longitude <= max_longitude + self.margin):
+                found_system = system
+        return found_system
+
+    def find_systems(self, latitudes, longitudes):
+        """
+        Find the system serving each of many locations at once, see find_system.
+
+        Args:
+            latitudes: array with latitudes of the locations
+            longitudes: array with longitudes of the locations
+
+        Returns:
+            systems: list of the systems
+            positions: array with the position in systems of the system serving each location
+        """
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        systems = list(self.systems.values())
+        positions = np.full(len(latitudes), systems.index(self.get_system()), dtype=np.int64)
+        for system, (min_latitude, min_longitude, max_latitude, max_longitude) in self._get_bounds():
+            inside = ((latitudes >= min_latitude - self.margin) & (latitudes <= max_latitude + self.margin)
+                      & (longitudes >= min_longitude - self.margin) & (longitudes <= max_longitude + self.margin))
+            positions[inside] = systems.index(system)
+        return systems, positions
+
+    def get_service_areas(self):
+        """
+        Get the areas where the locations are served by one of the systems.
+
+        Returns:
+            areas: list of [minimum latitude, minimum longitude, maximum latitude, maximum longitude] for each system
+                   with stations, including the margin
+        """
+        return [[min_latitude - self.margin, min_longitude - self.margin,
+                 max_latitude + self.margin, max_longitude + self.margin]
+                for _, (min_latitude, min_longitude, max_latitude, max_longitude) in self._get_bounds()]
+
+    def get_snapshot(self, latitude, longitude):
+        """
+        Get the snapshot of the system serving the location.
+
+        Args:
+            latitude: latitude of the location
+            longitude: longitude of the location
+
+        Returns:
+            snapshot: StationSnapshot of the system, see find_system, None if its stations are not known yet
+        """
+        return self.find_system(latitude, longitude).get_snapshot()
+
+    def start(self, interval=FEED_REFRESH_INTERVAL, max_backoff=FEED_REFRESH_MAX_BACKOFF):
+        """
+        Start refreshing all systems in the background. Each system has its own thread,
+        so the feeds of the systems are downloaded in parallel.
+
+        Args:
+            interval: number of seconds between two downloads of the station status
+            max_backoff: maximum number of seconds between two attempts after failures
+        """
+        for system in self.systems.values():
+            system.start(interval, max_backoff)
+
+
+# systems served by the application, added when the application starts
+system_registry = SystemRegistry()
@@ -0,0 +1,84 @@
+import os
+import sys
+
+import pytest
+
+# the modules of the application import each other by name, as when app.py is run from flask_app/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openrouteservice_client  # noqa: E402
+from benchmarks.fixtures import load_feeds  # noqa: E402
+from benchmarks.stub_servers import get_url, start_feed_server, start_openrouteservice_server  # noqa: E402
+from route_cache import RouteCache  # noqa: E402
+
+# number of stations in the synthetic feeds served to the tests
+NUMBER_OF_STATIONS = 50
+
+
+@pytest.fixture
+def feeds():
+    """
+    Bodies of the synthetic feeds served by feed_server, changing them changes the responses of the server.
+    """
+    return load_feeds(NUMBER_OF_STATIONS)
+
+
+@pytest.fixture
+def feed_server(feeds):
+    """
+    Local server with the feeds, e.g. the station status at /station_status.
+    """
+    server = start_feed_server(feeds)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def feed_url(feed_server):
+    return get_url(feed_server)
+
+
+def start_openrouteservice(monkeypatch, latency):
+    # the shared client is created again for the stub, and the routes are cached only in memory
+    server = start_openrouteservice_server(latency)
+    monkeypatch.setattr(openrouteservice_client, 'ORS_BASE_URL', get_url(server))
+    monkeypatch.setattr(openrouteservice_client, '_client', None)
+    monkeypatch.setattr(openrouteservice_client, '_rate_limited_until', 0.0)
+    monkeypatch.setattr(openrouteservice_client, 'route_cache', RouteCache(None))
+    return server
+
+
+@pytest.fixture
+def openrouteservice_server(monkeypatch):
+    """
+    Stub of openrouteservice used by openrouteservice_client, each response is delayed by 0.2 seconds.
+    """
+    server = start_openrouteservice(monkeypatch, latency=0.2)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope='session')
+def application(tmp_path_factory):
+    """
+    The Flask application, with its history in a temporary directory and without the background work.
+    """
+    working_directory = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('application'))
+    import app
+    app._background_work_started = True
+    yield app.app
+    os.chdir(working_directory)
+
+
+@pytest.fixture
+def client(application, monkeypatch, feed_url):
+    """
+    Test client of the application, the stations of the default system are downloaded from feed_server.
+    """
+    from get_data import station_snapshot_cache
+    monkeypatch.setattr(station_snapshot_cache.information, 'url', feed_url + '/station_information')
+    monkeypatch.setattr(station_snapshot_cache.status, 'url', feed_url + '/station_status')
+    return application.test_client()
@@ -0,0 +1,7 @@
+def test_base_map_urls_include_application_root(client):
+    response = client.get('/stations_base_map', base_url='http://localhost/bikes')
+
+    assert response.status_code == 200
+    map_as_html = response.get_data(as_text=True)
+    assert '"/bikes/api/stations_overlay/"' in map_as_html
+    assert '"/bikes/api/stations_status?system=toronto"' in map_as_html
@@ -0,0 +1,102 @@
+import time
+
+import pytest
+
+import get_data
+from feed_refresher import FeedRefresher
+from feed_parser import STATION_STATUS_FIELDS
+from get_data import FeedCache, StationSnapshotCache
+
+
+def create_snapshot_cache(feed_url):
+    return StationSnapshotCache(feed_url + '/station_information', feed_url + '/station_status')
+
+
+def test_refresh_builds_snapshot(feed_url):
+    snapshot_cache = create_snapshot_cache(feed_url)
+    feed_refresher = FeedRefresher(snapshot_cache, interval=10, max_backoff=60)
+
+    feed_refresher.refresh()
+
+    assert feed_refresher.consecutive_failures == 0
+    assert len(snapshot_cache.get_last_snapshot().stations) > 0
+    assert feed_refresher.get_stale_age() is not None
+
+
+def test_backoff_doubles_delay_up_to_maximum(feed_url):
+    snapshot_cache = StationSnapshotCache(feed_url + '/station_information', feed_url + '/missing_status')
+    feed_refresher = FeedRefresher(snapshot_cache, interval=10, max_backoff=60)
+
+    delays = []
+    for _ in range(4):
+        feed_refresher.refresh()
+        delays.append(feed_refresher.get_delay())
+
+    assert feed_refresher.consecutive_failures == 4
+    assert delays == [20, 40, 60, 60]
+
+
+def test_success_resets_backoff(feeds, feed_url):
+    snapshot_cache = create_snapshot_cache(feed_url)
+    feed_refresher = FeedRefresher(snapshot_cache, interval=10, max_backoff=60)
+    status = feeds.pop('/station_status')
+    feed_refresher.refresh()
+    assert feed_refresher.get_delay() == 20
+
+    feeds['/station_status'] = status
+    feed_refresher.refresh()
+
+    assert feed_refresher.consecutive_failures == 0
+    assert feed_refresher.get_delay() == 10
+
+
+def test_failed_refresh_keeps_last_snapshot(feeds, feed_url):
+    snapshot_cache = create_snapshot_cache(feed_url)
+    feed_refresher = FeedRefresher(snapshot_cache, interval=10, max_backoff=60)
+    feed_refresher.refresh()
+    snapshot = snapshot_cache.get_last_snapshot()
+
+    del feeds['/station_status']
+    feed_refresher.refresh()
+
+    assert feed_refresher.consecutive_failures == 1
+    assert snapshot_cache.get_last_snapshot() is snapshot
+    snapshot_cache.refreshed_in_background = True
+    assert snapshot_cache.get_snapshot() is snapshot
+
+
+def test_thread_refreshes_in_background(feed_url):
+    snapshot_cache = create_snapshot_cache(feed_url)
+    feed_refresher = FeedRefresher(snapshot_cache, interval=0.05, max_backoff=1)
+    feed_refresher.start()
+    try:
+        deadline = time.time() + 10
+        while snapshot_cache.get_last_snapshot() is None and time.time() < deadline:
+            time.sleep(0.01)
+        assert snapshot_cache.get_last_snapshot() is not None
+        assert snapshot_cache.refreshed_in_background
+    finally:
+        feed_refresher.stop()
+        feed_refresher.join(timeout=5)
+    assert not feed_refresher.is_alive()
+    assert not snapshot_cache.refreshed_in_background
+
+
+def test_failed_first_download_is_retried_after_delay(monkeypatch, feeds, feed_url):
+    monkeypatch.setattr(get_data, 'FEED_RETRY_DELAY', 0.2)
+    downloads = []
+    get_feed_from_url = get_data.get_feed_from_url
+    monkeypatch.setattr(get_data, 'get_feed_from_url',
+                        lambda *arguments: downloads.append(arguments) or get_feed_from_url(*arguments))
+    feed_cache = FeedCache(feed_url + '/station_status', STATION_STATUS_FIELDS)
+    status = feeds.pop('/station_status')
+
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            feed_cache.get()
+    assert len(downloads) == 1
+
+    feeds['/station_status'] = status
+    time.sleep(0.25)
+    assert len(feed_cache.get().stations) > 0
+    assert len(downloads) == 2
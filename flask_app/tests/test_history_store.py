@@ -0,0 +1,73 @@
+import os
+
+import pandas as pd
+
+from history_store import HistoryStore, get_day
+
+DAY = 24 * 3600
+# a day long before the tests run, so its rows are compacted by the next batch
+START = 1_600_000_000 - 1_600_000_000 % DAY
+
+
+def create_status(reports):
+    return pd.DataFrame({'station_id': [station_id for station_id, _, _ in reports],
+                         'last_reported': [last_reported for _, last_reported, _ in reports],
+                         'num_bikes_available': [bikes for _, _, bikes in reports],
+                         'num_docks_available': [10 - bikes for _, _, bikes in reports]})
+
+
+def test_reports_are_saved_once(tmp_path):
+    history_store = HistoryStore(str(tmp_path))
+
+    assert history_store.append(create_status([('7000', START + 60, 1), ('7001', START + 60, 2)])) == 2
+    assert history_store.append(create_status([('7000', START + 60, 1), ('7001', START + 120, 3)])) == 1
+
+    assert history_store.get_station_history('7001', START, START + DAY)['last_reported'].tolist() == \
+        [START + 60, START + 120]
+
+
+def test_reports_from_older_days_are_not_saved_again_after_restart(tmp_path):
+    history_store = HistoryStore(str(tmp_path))
+    # the last report of station 7000 is in the oldest of four days
+    history_store.append(create_status([('7000', START + 60, 1), ('7001', START + 60, 2)]))
+    for day in range(1, 4):
+        history_store.append(create_status([('7001', START + day * DAY + 60, 2)]))
+
+    restarted_history_store = HistoryStore(str(tmp_path))
+
+    assert restarted_history_store.append(create_status([('7000', START + 60, 1),
+                                                         ('7001', START + 3 * DAY + 60, 2)])) == 0
+    df_history = restarted_history_store.get_station_history('7000', START, START + 4 * DAY)
+    assert df_history['last_reported'].tolist() == [START + 60]
+    # the compacted day was not reopened
+    assert os.path.exists(os.path.join(str(tmp_path), get_day(START), 'offsets.npy'))
+
+
+def test_finished_days_are_compacted(tmp_path):
+    history_store = HistoryStore(str(tmp_path))
+    # the rows of the stations are interleaved in the order of the reports
+    for minute in range(1, 4):
+        history_store.append(create_status([('7000', START + minute * 60, minute), ('7001', START + minute * 60, 0)]))
+
+    # the next batch is in another day, so the first day has ended and is compacted
+    history_store.append(create_status([('7000', START + DAY + 60, 5)]))
+
+    assert os.path.exists(os.path.join(str(tmp_path), get_day(START), 'offsets.npy'))
+    df_history = history_store.get_station_history('7000', START, START + 2 * DAY)
+    assert df_history['last_reported'].tolist() == [START + 60, START + 120, START + 180, START + DAY + 60]
+    assert df_history['num_bikes_available'].tolist() == [1, 2, 3, 5]
+    assert df_history['num_docks_available'].tolist() == [9, 8, 7, 5]
+
+
+def test_station_history_is_limited_to_range(tmp_path):
+    history_store = HistoryStore(str(tmp_path))
+    for day in range(3):
+        history_store.append(create_status([('7000', START + day * DAY + 60, day), ('7001', START + day * DAY, 1)]))
+    history_store.append(create_status([('7000', START + 2 * DAY + 120, 4)]))
+
+    # the start is included and the end is excluded, also within a day which is not compacted
+    df_history = history_store.get_station_history('7000', START + DAY + 60, START + 2 * DAY + 120)
+
+    assert df_history['last_reported'].tolist() == [START + DAY + 60, START + 2 * DAY + 60]
+    assert history_store.get_station_history('7000', START + 3 * DAY, START + 4 * DAY).empty
+    assert history_store.get_station_history('9999', START, START + 3 * DAY).empty
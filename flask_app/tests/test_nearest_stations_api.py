@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+
+def post_origins(client, **body):
+    return client.post('/api/nearest_stations', data=json.dumps(body), content_type='application/json')
+
+
+def test_nearest_stations_are_streamed_for_each_origin(client):
+    response = post_origins(client, origins=[[43.65, -79.38], {'lat': 43.66, 'lon': -79.39}], k=3, search_for='Docks')
+
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line['origin'] for line in lines] == [[43.65, -79.38], [43.66, -79.39]]
+    for line in lines:
+        assert len(line['stations']) == 3
+        assert all(station['num_docks_available'] > 0 for station in line['stations'])
+        distances = [station['distance'] for station in line['stations']]
+        assert distances == sorted(distances)
+
+
+@pytest.mark.parametrize('search_for', ['bike', 'stations', ''])
+def test_unknown_search_type_is_rejected(client, search_for):
+    response = post_origins(client, origins=[[43.65, -79.38]], search_for=search_for)
+
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('origin', [[91, -79.38], [43.65, -181], [float('nan'), -79.38], [43.65, float('inf')]])
+def test_invalid_origin_is_rejected(client, origin):
+    response = post_origins(client, origins=[origin])
+
+    assert response.status_code == 400
@@ -0,0 +1,100 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from openrouteservice.exceptions import ApiError
+
+import openrouteservice_client
+from directions_to_stations_handler import (get_route_coordinates_to_nearest_stations,
+                                            get_route_coordinates_to_nearest_stations_async)
+from openrouteservice_client import (ORS_MAX_WORKERS, call_concurrently, get_client, get_route_coordinates,
+                                    run_concurrently)
+
+SOURCE = [-79.38, 43.65]
+
+
+def create_stations(number_of_stations):
+    return [{'station_id': str(number), 'lat': 43.65 + 0.001 * (number + 1), 'lon': -79.38}
+            for number in range(number_of_stations)]
+
+
+def test_route_is_requested_once_and_cached(openrouteservice_server):
+    route = get_route_coordinates(SOURCE, [-79.37, 43.66], 'foot-walking')
+
+    assert route[0] == pytest.approx(SOURCE)
+    assert route[-1] == pytest.approx([-79.37, 43.66])
+    assert get_route_coordinates(SOURCE, [-79.37, 43.66], 'foot-walking') == route
+    statistics = openrouteservice_client.route_cache.get_statistics()
+    assert (statistics['misses'], statistics['memory_hits']) == (1, 1)
+
+
+def test_routes_are_requested_concurrently(openrouteservice_server):
+    stations = create_stations(5)
+
+    start = time.perf_counter()
+    routes = get_route_coordinates_to_nearest_stations(SOURCE[1], SOURCE[0], stations)
+    duration = time.perf_counter() - start
+
+    # each response of the stub takes 0.2 seconds - one after another the 5 routes would take 1 second
+    assert duration < 0.6
+    assert [route[-1] for route in routes] == [pytest.approx([station['lon'], station['lat']])
+                                               for station in stations]
+
+
+def test_searches_do_not_wait_for_each_other(openrouteservice_server):
+    stations = create_stations(2 * ORS_MAX_WORKERS)
+
+    def search(first_station):
+        return get_route_coordinates_to_nearest_stations(SOURCE[1], SOURCE[0],
+                                                         stations[first_station:first_station + ORS_MAX_WORKERS])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = list(executor.map(search, [0, ORS_MAX_WORKERS]))
+    duration = time.perf_counter() - start
+
+    # in one pool shared by both searches, the routes of the second search would wait for the first 0.2 seconds
+    assert duration < 0.35
+    assert all(route is not None for routes in results for route in routes)
+
+
+def test_routes_are_awaited_concurrently(openrouteservice_server):
+    stations = create_stations(5)
+
+    start = time.perf_counter()
+    routes = asyncio.run(get_route_coordinates_to_nearest_stations_async(SOURCE[1], SOURCE[0], stations))
+    duration = time.perf_counter() - start
+
+    assert duration < 0.6
+    assert [route[-1] for route in routes] == [pytest.approx([station['lon'], station['lat']])
+                                               for station in stations]
+
+
+def test_client_is_shared(openrouteservice_server):
+    assert get_client() is get_client()
+
+
+def test_failed_call_does_not_stop_other_calls():
+    def get_number(number):
+        if number == 2:
+            raise ApiError(500, 'route not found')
+        return number
+
+    assert call_concurrently(get_number, [(number,) for number in range(4)]) == [0, 1, None, 3]
+    assert asyncio.run(run_concurrently(get_number, [(number,) for number in range(4)])) == [0, 1, None, 3]
+
+
+def test_unreachable_api_drops_routes(monkeypatch, openrouteservice_server):
+    monkeypatch.setattr(openrouteservice_client, 'ORS_BASE_URL', openrouteservice_client.ORS_BASE_URL + '/missing')
+    monkeypatch.setattr(openrouteservice_client, '_client', None)
+
+    assert get_route_coordinates_to_nearest_stations(SOURCE[1], SOURCE[0], create_stations(3)) == [None] * 3
+
+
+def test_requests_are_paused_after_query_limit(monkeypatch, openrouteservice_server):
+    monkeypatch.setattr(openrouteservice_client, '_rate_limited_until', time.time() + 60)
+
+    with pytest.raises(ApiError) as error:
+        get_route_coordinates(SOURCE, [-79.37, 43.66], 'foot-walking')
+    assert error.value.status == 429
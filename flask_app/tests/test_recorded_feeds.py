@@ -0,0 +1,22 @@
+import pytest
+
+from benchmarks.fixtures import load_feeds
+from benchmarks.stub_servers import get_url, start_feed_server
+from get_data import StationSnapshotCache
+
+
+def test_recorded_feeds_build_snapshot():
+    feed_server = start_feed_server(load_feeds('recorded'))
+    try:
+        url = get_url(feed_server)
+        snapshot = StationSnapshotCache(url + '/station_information', url + '/station_status').get_snapshot()
+    finally:
+        feed_server.shutdown()
+        feed_server.server_close()
+
+    assert len(snapshot.stations) == 665
+
+
+def test_missing_recorded_feeds_fail(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        load_feeds('recorded', str(tmp_path))
@@ -0,0 +1,34 @@
+from route_cache import RouteCache
+
+ROUTE = [[-79.38, 43.65], [-79.37, 43.66]]
+
+
+def test_route_is_read_from_disk_after_restart(tmp_path):
+    path = str(tmp_path / 'route_cache.db')
+    RouteCache(path).put('route', ROUTE)
+
+    route_cache = RouteCache(path)
+
+    assert route_cache.get('route') == ROUTE
+    assert route_cache.get('route') == ROUTE
+    statistics = route_cache.get_statistics()
+    assert (statistics['disk_hits'], statistics['memory_hits']) == (1, 1)
+
+
+def test_damaged_database_falls_back_to_memory(tmp_path):
+    path = tmp_path / 'route_cache.db'
+    path.write_bytes(b'not a SQLite database' * 100)
+    route_cache = RouteCache(str(path))
+
+    assert route_cache.get('route') is None
+    route_cache.put('route', ROUTE)
+
+    assert route_cache.get('route') == ROUTE
+    assert route_cache.get_statistics()['misses'] == 1
+
+
+def test_expired_route_is_missing(tmp_path):
+    route_cache = RouteCache(str(tmp_path / 'route_cache.db'), ttl=0)
+    route_cache.put('route', ROUTE)
+
+    assert route_cache.get('route') is None
@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+import spatial_index
+from distance_calculator import haversine_distances, select_k_smallest
+from spatial_index import StationIndex
+
+# stations in clusters around Toronto, so some cells of the grid are crowded and most are empty
+CLUSTER_CENTERS = [(43.65, -79.38), (43.70, -79.42), (43.78, -79.25)]
+SOURCES = [(43.65, -79.38), (43.66, -79.40), (43.72, -79.30), (43.60, -79.50),
+           # far from all stations, the cells around the source are empty
+           (45.42, -75.70), (-33.87, 151.21)]
+
+
+def create_stations(number_of_stations, seed=0):
+    generator = np.random.default_rng(seed)
+    centers = np.array(CLUSTER_CENTERS)[generator.integers(0, len(CLUSTER_CENTERS), number_of_stations)]
+    latitudes = centers[:, 0] + generator.normal(0, 0.01, number_of_stations)
+    longitudes = centers[:, 1] + generator.normal(0, 0.01, number_of_stations)
+    # a few stations share the same location, so some distances are equal
+    latitudes[-5:], longitudes[-5:] = latitudes[0], longitudes[0]
+    return latitudes, longitudes
+
+
+def find_nearest_by_brute_force(latitudes, longitudes, source_latitude, source_longitude, k, mask=None):
+    positions = np.arange(len(latitudes)) if mask is None else np.flatnonzero(mask)
+    distances = haversine_distances(source_latitude, source_longitude, latitudes[positions], longitudes[positions])
+    selected = select_k_smallest(distances, k)
+    return positions[selected], distances[selected]
+
+
+def find_within_radius_by_brute_force(latitudes, longitudes, source_latitude, source_longitude, radius, mask=None):
+    positions, distances = find_nearest_by_brute_force(latitudes, longitudes, source_latitude, source_longitude,
+                                                       len(latitudes), mask)
+    within_radius = distances <= radius
+    return positions[within_radius], distances[within_radius]
+
+
+@pytest.fixture(params=['grid', 'full_scan'])
+def scan_mode(request, monkeypatch):
+    # with a limit of 0 stations the grid is used even for small datasets
+    if request.param == 'grid':
+        monkeypatch.setattr(spatial_index, 'FULL_SCAN_LIMIT', 0)
+    return request.param
+
+
+@pytest.mark.parametrize('cell_size', [0.1, 0.5])
+@pytest.mark.parametrize('k', [1, 5, 50])
+@pytest.mark.parametrize('source', SOURCES)
+def test_query_nearest_matches_brute_force(scan_mode, source, k, cell_size):
+    latitudes, longitudes = create_stations(2000)
+    index = StationIndex(latitudes, longitudes, cell_size)
+
+    positions, distances = index.query_nearest(*source, k)
+
+    expected_positions, expected_distances = find_nearest_by_brute_force(latitudes, longitudes, *source, k)
+    np.testing.assert_array_equal(positions, expected_positions)
+    np.testing.assert_allclose(distances, expected_distances)
+
+
+@pytest.mark.parametrize('source', SOURCES)
+def test_query_nearest_with_mask_matches_brute_force(scan_mode, source):
+    latitudes, longitudes = create_stations(2000)
+    index = StationIndex(latitudes, longitudes)
+    # only a few stations are available, so the query has to visit many rings
+    mask = np.random.default_rng(1).random(len(latitudes)) < 0.02
+
+    positions, distances = index.query_nearest(*source, 5, mask)
+
+    expected_positions, expected_distances = find_nearest_by_brute_force(latitudes, longitudes, *source, 5, mask)
+    np.testing.assert_array_equal(positions, expected_positions)
+    np.testing.assert_allclose(distances, expected_distances)
+
+
+def test_query_nearest_with_fewer_stations_than_k(scan_mode):
+    latitudes, longitudes = create_stations(20)
+    index = StationIndex(latitudes, longitudes)
+    mask = np.zeros(len(latitudes), dtype=bool)
+    mask[[3, 7]] = True
+
+    positions, _ = index.query_nearest(43.65, -79.38, 5, mask)
+    assert sorted(positions.tolist()) == [3, 7]
+    assert len(index.query_nearest(43.65, -79.38, 5, np.zeros(len(latitudes), dtype=bool))[0]) == 0
+    assert len(index.query_nearest(43.65, -79.38, 0)[0]) == 0
+
+
+@pytest.mark.parametrize('radius', [0.1, 1.0, 5.0, 50.0])
+@pytest.mark.parametrize('source', SOURCES[:4])
+def test_query_radius_matches_brute_force(scan_mode, source, radius):
+    latitudes, longitudes = create_stations(2000)
+    index = StationIndex(latitudes, longitudes)
+    mask = np.random.default_rng(2).random(len(latitudes)) < 0.5
+
+    for query_mask in [None, mask]:
+        positions, distances = index.query_radius(*source, radius, query_mask)
+
+        expected_positions, expected_distances = find_within_radius_by_brute_force(latitudes, longitudes, *source,
+                                                                                   radius, query_mask)
+        np.testing.assert_array_equal(positions, expected_positions)
+        np.testing.assert_allclose(distances, expected_distances)
+
+
+def test_query_radius_far_from_stations_is_empty(scan_mode):
+    latitudes, longitudes = create_stations(2000)
+    index = StationIndex(latitudes, longitudes)
+
+    positions, distances = index.query_radius(45.42, -75.70, 10.0)
+
+    assert len(positions) == 0
+    assert len(distances) == 0
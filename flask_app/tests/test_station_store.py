@@ -0,0 +1,124 @@
+import copy
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic_feeds import create_station_information_feed, create_station_status_feed, to_bytes
+from feed_parser import STATION_INFORMATION_FIELDS, STATION_STATUS_FIELDS, parse_feed
+from station_store import INFORMATION_COLUMNS, STATUS_COLUMNS, StationStore, get_availability_from_frame
+
+NUMBER_OF_STATIONS = 30
+
+
+def parse(feed, fields):
+    df, _, _ = parse_feed(to_bytes(feed), fields)
+    return df
+
+
+def merge_feeds(information_feed, status_feed):
+    # the stations as merged before the store - an inner merge of both feeds without the stations out of service
+    df_information = parse(information_feed, STATION_INFORMATION_FIELDS)
+    df_status = parse(status_feed, STATION_STATUS_FIELDS)
+    df = pd.merge(df_information, df_status, on='station_id')
+    df = df[(df['status'] != 'END_OF_LIFE') & (df['is_installed'] != 0)]
+    return df.rename(columns={'num_bikes_available_types.mechanical': 'num_bikes_available_types_mechanical',
+                              'num_bikes_available_types.ebike': 'num_bikes_available_types_ebike'})
+
+
+def assert_store_matches_merge(store, information_feed, status_feed):
+    df_stations = store.to_frame()
+    df_expected = merge_feeds(information_feed, status_feed)
+
+    assert df_stations['station_id'].tolist() == df_expected['station_id'].tolist()
+    for column in [column for column, _ in INFORMATION_COLUMNS] + [column for column, _, _ in STATUS_COLUMNS]:
+        np.testing.assert_array_equal(df_stations[column].to_numpy(), df_expected[column].to_numpy(), err_msg=column)
+
+    availability = store.get_availability()
+    expected_availability = get_availability_from_frame(df_expected)
+    assert availability.keys() == expected_availability.keys()
+    for name, bitmap in expected_availability.items():
+        np.testing.assert_array_equal(availability[name], bitmap, err_msg=name)
+
+
+@pytest.fixture
+def feeds():
+    return create_station_information_feed(NUMBER_OF_STATIONS), create_station_status_feed(NUMBER_OF_STATIONS)
+
+
+@pytest.fixture
+def store(feeds):
+    information_feed, status_feed = feeds
+    store = StationStore(parse(information_feed, STATION_INFORMATION_FIELDS))
+    store.apply_status(parse(status_feed, STATION_STATUS_FIELDS))
+    return store
+
+
+def report(status_feed, position, **values):
+    station = status_feed['data']['stations'][position]
+    station.update(values)
+    station['last_reported'] += 60
+
+
+def test_first_status_matches_merge(feeds, store):
+    assert_store_matches_merge(store, *feeds)
+
+
+def test_only_reported_stations_are_updated(feeds, store):
+    information_feed, status_feed = feeds
+    status_feed = copy.deepcopy(status_feed)
+    report(status_feed, 3, num_bikes_available=0, num_bikes_available_types={'mechanical': 0, 'ebike': 0})
+    report(status_feed, 8, num_docks_available=0, is_returning=0)
+
+    positions = store.apply_status(parse(status_feed, STATION_STATUS_FIELDS))
+
+    assert sorted(positions.tolist()) == [3, 8]
+    assert_store_matches_merge(store, information_feed, status_feed)
+    # the same version of the station status changes nothing
+    assert len(store.apply_status(parse(status_feed, STATION_STATUS_FIELDS))) == 0
+
+
+def test_station_missing_from_status_is_out_of_service(feeds, store):
+    information_feed, status_feed = feeds
+    status_without_station = copy.deepcopy(status_feed)
+    removed_station = status_without_station['data']['stations'].pop(5)
+
+    positions = store.apply_status(parse(status_without_station, STATION_STATUS_FIELDS))
+
+    assert positions.tolist() == [5]
+    assert removed_station['station_id'] not in store.to_frame()['station_id'].tolist()
+    assert_store_matches_merge(store, information_feed, status_without_station)
+
+    # the station is back in service as soon as it is reported again, even with the same last_reported
+    positions = store.apply_status(parse(status_feed, STATION_STATUS_FIELDS))
+    assert positions.tolist() == [5]
+    assert_store_matches_merge(store, information_feed, status_feed)
+
+
+@pytest.mark.parametrize('values', [{'status': 'END_OF_LIFE'}, {'is_installed': 0}])
+def test_station_out_of_service_is_hidden(feeds, store, values):
+    information_feed, status_feed = feeds
+    status_feed = copy.deepcopy(status_feed)
+    report(status_feed, 2, **values)
+
+    store.apply_status(parse(status_feed, STATION_STATUS_FIELDS))
+
+    assert len(store.to_frame()) == NUMBER_OF_STATIONS - 1
+    assert_store_matches_merge(store, information_feed, status_feed)
+
+
+def test_availability_bitmaps(feeds, store):
+    information_feed, status_feed = feeds
+    status_feed = copy.deepcopy(status_feed)
+    report(status_feed, 0, num_bikes_available=4, is_renting=0)
+    report(status_feed, 1, num_docks_available=0, is_returning=1)
+    report(status_feed, 2, num_bikes_available=2, num_bikes_available_types={'mechanical': 0, 'ebike': 2})
+
+    store.apply_status(parse(status_feed, STATION_STATUS_FIELDS))
+    availability = store.get_availability()
+
+    # a station with bikes which is not renting is not found by the search for bikes
+    assert availability['has_bike'][0] and not availability['renting'][0] and not availability['bikes'][0]
+    assert not availability['has_dock'][1] and not availability['docks'][1]
+    assert availability['has_ebike'][2] and availability['bikes'][2]
+    assert_store_matches_merge(store, information_feed, status_feed)
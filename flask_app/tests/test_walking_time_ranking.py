@@ -0,0 +1,57 @@
+import openrouteservice_client
+from benchmarks.synthetic_stations import create_synthetic_stations
+from directions_to_stations_handler import find_nearest_stations_by_walking_time
+
+SOURCE_LATITUDE, SOURCE_LONGITUDE = 43.65, -79.38
+
+
+def create_stations():
+    # by haversine distance the order is A, B, C - the stub of openrouteservice estimates the walking time from
+    # the distance along the streets (latitude and longitude added up), so station B is the fastest one
+    df_stations = create_synthetic_stations(3)
+    df_stations['station_id'] = ['A', 'B', 'C']
+    df_stations['lat'] = [SOURCE_LATITUDE + 0.007, SOURCE_LATITUDE + 0.0095, SOURCE_LATITUDE - 0.02]
+    df_stations['lon'] = [SOURCE_LONGITUDE + 0.007, SOURCE_LONGITUDE, SOURCE_LONGITUDE]
+    df_stations['num_bikes_available'] = 5
+    df_stations['is_renting'] = 1
+    return df_stations
+
+
+def count_requests(monkeypatch):
+    requests = []
+    send_request = openrouteservice_client.send_request
+
+    def send_counted_request(method_name, **kwargs):
+        requests.append(method_name)
+        return send_request(method_name, **kwargs)
+
+    monkeypatch.setattr(openrouteservice_client, 'send_request', send_counted_request)
+    return requests
+
+
+def test_candidates_are_ranked_by_walking_time(monkeypatch, openrouteservice_server):
+    requests = count_requests(monkeypatch)
+
+    nearest_stations = find_nearest_stations_by_walking_time(SOURCE_LATITUDE, SOURCE_LONGITUDE, create_stations(), 2,
+                                                             'Bikes', number_of_candidates=3)
+
+    assert [station['station_id'] for station in nearest_stations] == ['B', 'A']
+    # all candidates are ranked with a single request to the matrix endpoint
+    assert requests == ['distance_matrix']
+
+
+def test_only_top_candidates_by_distance_are_ranked(openrouteservice_server):
+    nearest_stations = find_nearest_stations_by_walking_time(SOURCE_LATITUDE, SOURCE_LONGITUDE, create_stations(), 1,
+                                                             'Bikes', number_of_candidates=1)
+
+    assert [station['station_id'] for station in nearest_stations] == ['A']
+
+
+def test_failed_matrix_request_keeps_distance_order(monkeypatch, openrouteservice_server):
+    monkeypatch.setattr(openrouteservice_client, 'ORS_BASE_URL', openrouteservice_client.ORS_BASE_URL + '/missing')
+    monkeypatch.setattr(openrouteservice_client, '_client', None)
+
+    nearest_stations = find_nearest_stations_by_walking_time(SOURCE_LATITUDE, SOURCE_LONGITUDE, create_stations(), 2,
+                                                             'Bikes', number_of_candidates=3)
+
+    assert [station['station_id'] for station in nearest_stations] == ['A', 'B']
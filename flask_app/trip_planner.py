@@ -0,0 +1,145 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from distance_calculator import find_nearest_stations, haversine_distances
+from openrouteservice_client import call_concurrently, get_duration_matrix
+
+# number of stations with bikes near the source and stations with docks near the destination which are combined
+TRIP_CANDIDATES = 10
+# average speeds used to estimate the duration of the legs (in kilometers per hour)
+WALKING_SPEED = 5.0
+CYCLING_SPEED = 15.0
+
+
+@dataclass(frozen=True)
+class Trip:
+    """
+    Trip from the source to the destination with a bike rented at one station and returned at another one.
+
+    Attributes:
+        station_with_bike: row in the Dataframe with the station where the bike is rented
+        station_with_dock: row in the Dataframe with the station where the bike is returned
+        duration: estimated duration of the whole trip (in seconds)
+        durations: estimated duration of each leg - walking, cycling and walking (in seconds)
+    """
+    station_with_bike: pd.Series
+    station_with_dock: pd.Series
+    duration: float
+    durations: tuple
+
+
+def estimate_durations(distances, speed):
+    """
+    Estimate the travel times from the distances.
+
+    Args:
+        distances: array with distances (in kilometers)
+        speed: average speed (in kilometers per hour)
+
+    Returns:
+        durations: array with travel times (in seconds)
+    """
+    return distances / speed * 3600
+
+
+def replace_estimates_with_durations(estimates, durations):
+    """
+    Use the travel times from openrouteservice instead of the estimates, where they are known.
+
+    Args:
+        estimates: array with the estimated travel times
+        durations: list of rows with travel times from the matrix endpoint, None if the request failed
+
+    Returns:
+        durations: array with the travel times
+    """
+    if durations is None:
+        return estimates
+    durations = np.array([[np.nan if duration is None else duration for duration in row] for row in durations],
+                         dtype=np.float64).reshape(estimates.shape)
+    return np.where(np.isnan(durations), estimates, durations)
+
+
+def get_trip_costs(walking_to_bike, cycling, walking_from_dock, station_with_bike_ids, station_with_dock_ids):
+    """
+    Calculate the duration of every combination of the station with bike and the station with dock.
+
+    Args:
+        walking_to_bike: array of shape (M,) with travel times from the source to each station with bike
+        cycling: array of shape (M, N) with travel times from each station with bike to each station with dock
+        walking_from_dock: array of shape (N,) with travel times from each station with dock to the destination
+        station_with_bike_ids: identification numbers of the stations with bike
+        station_with_dock_ids: identification numbers of the stations with dock
+
+    Returns:
+        costs: array of shape (M, N) with the duration of each trip, the bike can not be returned where it was rented
+    """
+    costs = walking_to_bike[:, np.newaxis] + cycling + walking_from_dock[np.newaxis, :]
+    same_station = np.asarray(station_with_bike_ids)[:, np.newaxis] == np.asarray(station_with_dock_ids)[np.newaxis, :]
+    if not same_station.all():
+        costs = np.where(same_station, np.inf, costs)
+    return costs
+
+
+def plan_trip(source_latitude, source_longitude, destination_latitude, destination_longitude, df_stations,
+              spatial_index=None, availability=None, number_of_candidates=TRIP_CANDIDATES, use_durations=False):
+    """
+    Find the fastest trip using the M stations with bikes nearest to the source and the M stations with docks
+    nearest to the destination. All M x M combinations are scored at once with travel times estimated from
+    haversine distances or, if use_durations is set, with the travel times from the openrouteservice matrix endpoint.
+
+    Args:
+        source_latitude: source location - latitude
+        source_longitude: source location - longitude
+        destination_latitude: destination location - latitude
+        destination_longitude: destination location - longitude
+        df_stations: Pandas Dataframe containing the stations' information and status
+        spatial_index: optional StationIndex built from df_stations
+        availability: optional availability bitmaps of df_stations
+        number_of_candidates: number M of candidates for each of the two stations
+        use_durations: True to score the trips with the travel times from openrouteservice - 3 requests
+                       to the matrix endpoint, the estimates are kept for travel times which could not be found
+
+    Returns:
+        trip: the fastest Trip
+    """
+    stations_with_bike, distances_to_bike = find_nearest_stations(source_latitude, source_longitude, df_stations,
+                                                                  number_of_candidates, 'bikes',
+                                                                  spatial_index, availability)
+    stations_with_dock, distances_from_dock = find_nearest_stations(destination_latitude, destination_longitude,
+                                                                    df_stations, number_of_candidates, 'docks',
+                                                                    spatial_index, availability)
+
+    bike_latitudes, bike_longitudes = stations_with_bike['lat'].to_numpy(), stations_with_bike['lon'].to_numpy()
+    dock_latitudes, dock_longitudes = stations_with_dock['lat'].to_numpy(), stations_with_dock['lon'].to_numpy()
+    cycling_distances = haversine_distances(bike_latitudes[:, np.newaxis], bike_longitudes[:, np.newaxis],
+                                            dock_latitudes[np.newaxis, :], dock_longitudes[np.newaxis, :])
+
+    walking_to_bike = estimate_durations(distances_to_bike, WALKING_SPEED)
+    cycling = estimate_durations(cycling_distances, CYCLING_SPEED)
+    walking_from_dock = estimate_durations(distances_from_dock, WALKING_SPEED)
+
+    if use_durations:
+        bike_coordinates = np.column_stack((bike_longitudes, bike_latitudes)).tolist()
+        dock_coordinates = np.column_stack((dock_longitudes, dock_latitudes)).tolist()
+        matrices = call_concurrently(get_duration_matrix,
+                                     [([[source_longitude, source_latitude]], bike_coordinates, 'foot-walking'),
+                                      (bike_coordinates, dock_coordinates, 'cycling-regular'),
+                                      (dock_coordinates, [[destination_longitude, destination_latitude]],
+                                       'foot-walking')])
+        walking_to_bike = replace_estimates_with_durations(walking_to_bike, matrices[0])
+        cycling = replace_estimates_with_durations(cycling, matrices[1])
+        walking_from_dock = replace_estimates_with_durations(walking_from_dock, matrices[2])
+
+    costs = get_trip_costs(walking_to_bike, cycling, walking_from_dock,
+                           stations_with_bike['station_id'].to_numpy(), stations_with_dock['station_id'].to_numpy())
+    bike_position, dock_position = np.unravel_index(np.argmin(costs), costs.shape)
+
+    durations = (float(walking_to_bike[bike_position]), float(cycling[bike_position, dock_position]),
+                 float(walking_from_dock[dock_position]))
+    return Trip(station_with_bike=stations_with_bike.iloc[bike_position],
+                station_with_dock=stations_with_dock.iloc[dock_position],
+                duration=sum(durations),
+                durations=durations)